@@ -19,6 +19,10 @@
 
 
 import Gio from 'gi://Gio';
+import GLib from 'gi://GLib';
+
+// Milliseconds between WindowChanged signals for a window being moved or resized
+const WINDOW_CHANGE_INTERVAL = 200;
 
 const MR_DBUS_IFACE = `
 <node>
@@ -26,6 +30,9 @@ const MR_DBUS_IFACE = `
       <method name="List">
          <arg type="s" direction="out" name="win" />
       </method>
+      <method name="GetActiveWindow">
+         <arg type="s" direction="out" name="win" />
+      </method>
       <method name="Details">
          <arg type="u" direction="in" name="winid" />
          <arg type="s" direction="out" name="win" />
@@ -84,6 +91,15 @@ const MR_DBUS_IFACE = `
       <method name="CheckVersion">
             <arg type="s" direction="out" name="version" />
       </method>
+      <signal name="ActiveWindowChanged">
+            <arg type="s" name="win" />
+      </signal>
+      <signal name="WindowChanged">
+            <arg type="s" name="win" />
+      </signal>
+      <signal name="WindowClosed">
+            <arg type="u" name="winid" />
+      </signal>
    </interface>
 </node>`;
 
@@ -92,47 +108,140 @@ export default class Extension {
     enable() {
         this._dbus = Gio.DBusExportedObject.wrapJSObject(MR_DBUS_IFACE, this);
         this._dbus.export(Gio.DBus.session, '/org/gnome/Shell/Extensions/AutoKey');
+
+        // Tell AutoKey about focus and title changes, so that it can cache the active window
+        this._focusWindow = null;
+        this._titleChangedId = 0;
+        this._focusChangedId = global.display.connect('notify::focus-window', () => this._onFocusChanged());
+        this._onFocusChanged();
+
+        // Tell AutoKey about all window changes, so that it can keep its window list without calling List()
+        this._windowSignals = new Map();
+        this._pendingChanges = new Map();
+        this._windowCreatedId = global.display.connect('window-created', (display, win) => this._watchWindow(win));
+        this._workspaceChangedId = global.workspace_manager.connect('active-workspace-changed',
+            () => this._windowSignals.forEach((ids, win) => this._emitWindowChanged(win)));
+        global.get_window_actors().forEach(w => this._watchWindow(w.meta_window));
     }
 
     disable() {
+        global.display.disconnect(this._focusChangedId);
+        this._disconnectFocusWindow();
+        global.display.disconnect(this._windowCreatedId);
+        global.workspace_manager.disconnect(this._workspaceChangedId);
+        this._windowSignals.forEach((ids, win) => ids.forEach(id => win.disconnect(id)));
+        this._windowSignals.clear();
+        this._pendingChanges.forEach(id => GLib.source_remove(id));
+        this._pendingChanges.clear();
         this._dbus.flush();
         this._dbus.unexport();
         delete this._dbus;
     }
 
+    _onFocusChanged() {
+        this._disconnectFocusWindow();
+        this._focusWindow = global.display.get_focus_window();
+        if (this._focusWindow)
+            this._titleChangedId = this._focusWindow.connect('notify::title', () => this._emitActiveWindowChanged());
+        this._emitActiveWindowChanged();
+    }
+
+    _disconnectFocusWindow() {
+        if (this._focusWindow && this._titleChangedId)
+            this._focusWindow.disconnect(this._titleChangedId);
+        this._focusWindow = null;
+        this._titleChangedId = 0;
+    }
+
+    _emitActiveWindowChanged() {
+        this._dbus.emit_signal('ActiveWindowChanged', new GLib.Variant('(s)', [this.GetActiveWindow()]));
+    }
+
+    _watchWindow(win) {
+        const emitChanged = () => this._emitWindowChanged(win);
+        const queueChanged = () => this._queueWindowChanged(win);
+        this._windowSignals.set(win, [
+            win.connect('shown', emitChanged),
+            win.connect('notify::title', emitChanged),
+            win.connect('position-changed', queueChanged),
+            win.connect('size-changed', queueChanged),
+            win.connect('workspace-changed', emitChanged),
+            win.connect('unmanaged', () => {
+                this._windowSignals.get(win).forEach(id => win.disconnect(id));
+                this._windowSignals.delete(win);
+                this._cancelWindowChanged(win);
+                this._dbus.emit_signal('WindowClosed', new GLib.Variant('(u)', [win.get_id()]));
+            }),
+        ]);
+    }
+
+    _queueWindowChanged(win) {
+        // Moving or resizing a window changes its geometry on every frame, so report the changes in intervals
+        if (this._pendingChanges.has(win))
+            return;
+        this._pendingChanges.set(win, GLib.timeout_add(GLib.PRIORITY_DEFAULT, WINDOW_CHANGE_INTERVAL, () => {
+            this._pendingChanges.delete(win);
+            this._emitWindowChanged(win);
+            return GLib.SOURCE_REMOVE;
+        }));
+    }
+
+    _cancelWindowChanged(win) {
+        if (this._pendingChanges.has(win)) {
+            GLib.source_remove(this._pendingChanges.get(win));
+            this._pendingChanges.delete(win);
+        }
+    }
+
+    _emitWindowChanged(win) {
+        // Windows are described through their actor, which does not exist before the window is shown
+        let actor = win.get_compositor_private();
+        if (actor)
+            this._dbus.emit_signal('WindowChanged', new GLib.Variant('(s)', [JSON.stringify(this._describe_window(actor))]));
+    }
+
     _get_window_by_wid(winid) {
         let win = global.get_window_actors().find(w => w.meta_window.get_id() == winid);
         return win;
     }
 
+    _describe_window(w) {
+        let workspaceManager = global.workspace_manager;
+        return {
+            wm_class: w.meta_window.get_wm_class(),
+            wm_class_instance: w.meta_window.get_wm_class_instance(),
+            wm_title: w.meta_window.get_title(),
+            workspace: w.meta_window.get_workspace().index(),
+            desktop: w.meta_window.get_monitor(),
+            pid: w.meta_window.get_pid(),
+            id: w.meta_window.get_id(),
+            frame_type: w.meta_window.get_frame_type(),
+            window_type: w.meta_window.get_window_type(),
+            width: w.get_width(),
+            height: w.get_height(),
+            x: w.get_x(),
+            y: w.get_y(),
+            focus: w.meta_window.has_focus(),
+            in_current_workspace: w.meta_window.located_on_workspace(workspaceManager.get_active_workspace()),
+        };
+    }
+
     List() {
         let win = global.get_window_actors();
 
-        let workspaceManager = global.workspace_manager;
-
         var winJsonArr = [];
-        win.forEach(function (w) {
-            winJsonArr.push({
-                wm_class: w.meta_window.get_wm_class(),
-                wm_class_instance: w.meta_window.get_wm_class_instance(),
-                wm_title: w.meta_window.get_title(),
-                workspace: w.meta_window.get_workspace().index(),
-                desktop: w.meta_window.get_monitor(),
-                pid: w.meta_window.get_pid(),
-                id: w.meta_window.get_id(),
-                frame_type: w.meta_window.get_frame_type(),
-                window_type: w.meta_window.get_window_type(),
-                width: w.get_width(),
-                height: w.get_height(),
-                x: w.get_x(),
-                y: w.get_y(),
-                focus: w.meta_window.has_focus(),
-                in_current_workspace: w.meta_window.located_on_workspace(workspaceManager.get_active_workspace()),
-            });
+        win.forEach(w => {
+            winJsonArr.push(this._describe_window(w));
         });
         return JSON.stringify(winJsonArr);
     }
 
+    GetActiveWindow() {
+        // Same format as the entries returned by List(), or an empty object if no window has the focus
+        let w = global.get_window_actors().find(w => w.meta_window.has_focus());
+        return JSON.stringify(w ? this._describe_window(w) : {});
+    }
+
     Details(winid) {
         let w = this._get_window_by_wid(winid);
         let workspaceManager = global.workspace_manager;
@@ -288,7 +397,7 @@ export default class Extension {
     }
 
     CheckVersion() {
-        return '0.1';
+        return '0.3';
     }
 }
 
@@ -144,8 +144,16 @@ def checkRequirements():
 #     configManager.configHotkey.set_closure(app.show_configure_async)
 
 
+def invalidate_script_code(configManager, path):
+    script_runner = configManager.app.service.scriptRunner
+    # The script runner is missing if the service failed to start
+    if script_runner is not None:
+        script_runner.code_cache.invalidate(path)
+
+
 def path_created_or_modified(configManager, configWindow, path):
     time.sleep(0.5)
+    invalidate_script_code(configManager, path)
     changed = configManager.path_created_or_modified(path)
     set_file_watched(configManager.app.monitor, path, True)
     if changed and configWindow is not None:
@@ -162,6 +170,7 @@ def set_file_watched(appmonitor, path, watch):
 
 def path_removed(configManager, configWindow, path):
     time.sleep(0.5)
+    invalidate_script_code(configManager, path)
     changed = configManager.path_removed(path)
     set_file_watched(configManager.app.monitor, path, False)
     if changed and configWindow is not None:
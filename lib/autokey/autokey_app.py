@@ -256,6 +256,8 @@ class AutokeyApplication:
         os.makedirs(common.DATA_DIR, exist_ok=True)
         # Create run directory (for lock file)
         os.makedirs(common.RUN_DIR, exist_ok=True)
+        # Create cache directory (for compiled scripts)
+        os.makedirs(common.CACHE_DIR, exist_ok=True)
 
     @staticmethod
     def create_lock_file():
@@ -0,0 +1,134 @@
+# Copyright (C) 2024 AutoKey contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Cache of the compiled code of user scripts, so that scripts do not have to be compiled on every run.
+"""
+
+import collections
+import glob
+import hashlib
+import importlib.util
+import marshal
+import os
+import sys
+import threading
+import types
+import typing
+
+logger = __import__("autokey.logger").logger.get_logger(__name__)
+
+
+class CodeCache:
+    """
+    Compiles script source code, reusing the code objects of previous compilations.
+
+    Entries are keyed by the script name, which is the path for scripts stored in files, and a hash of the source
+    code. The most recently used code objects are kept in memory, and all are written to the given directory in the
+    format of the Python bytecode cache, so that they survive restarts. Only the latest code of each script is kept
+    on disk. Files written by other Python versions are ignored.
+    """
+
+    # Number of code objects kept in memory
+    MAX_ENTRIES = 64
+
+    def __init__(self, directory: typing.Optional[str]=None):
+        self.directory = directory
+        self._entries = collections.OrderedDict()  # type: typing.MutableMapping[typing.Tuple[str, str], types.CodeType]
+        self._lock = threading.Lock()
+
+    def compile(self, source: str, name: str) -> types.CodeType:
+        """Return the code object for the given source, compiling it only if it is not cached yet."""
+        key = (name, hashlib.sha1(source.encode("utf-8", "surrogatepass")).hexdigest())
+        with self._lock:
+            try:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            except KeyError:
+                pass
+        code = self._load(key)
+        if code is None:
+            code = compile(source, name, 'exec')
+            self._save(key, code)
+        with self._lock:
+            self._entries[key] = code
+            if len(self._entries) > self.MAX_ENTRIES:
+                self._entries.popitem(last=False)
+        return code
+
+    def invalidate(self, name: str):
+        """Remove all cached code of the script with the given name, e.g. because the file was changed or removed."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == name]:
+                del self._entries[key]
+        self._remove_files(name)
+
+    def _remove_files(self, name: str, keep: typing.Optional[str]=None):
+        """Remove the cache files of the script with the given name, except the one at the given path."""
+        if self.directory is None:
+            return
+        for path in glob.glob(os.path.join(self.directory, self._file_prefix(name) + ".*.pyc")):
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _file_prefix(name: str) -> str:
+        return hashlib.sha1(name.encode("utf-8", "surrogatepass")).hexdigest()
+
+    def _get_path(self, key: typing.Tuple[str, str]) -> str:
+        name, source_hash = key
+        return os.path.join(
+            self.directory,
+            "{}.{}.{}.pyc".format(self._file_prefix(name), source_hash, sys.implementation.cache_tag))
+
+    def _load(self, key: typing.Tuple[str, str]) -> typing.Optional[types.CodeType]:
+        if self.directory is None:
+            return None
+        try:
+            with open(self._get_path(key), "rb") as cache_file:
+                data = cache_file.read()
+        except OSError:
+            return None
+        magic = importlib.util.MAGIC_NUMBER
+        if not data.startswith(magic):
+            return None
+        try:
+            code = marshal.loads(data[len(magic):])
+        except (EOFError, ValueError, TypeError):
+            logger.warning("Ignoring corrupted script cache file for {}".format(key[0]))
+            return None
+        return code if isinstance(code, types.CodeType) else None
+
+    def _save(self, key: typing.Tuple[str, str], code: types.CodeType):
+        if self.directory is None:
+            return
+        path = self._get_path(key)
+        temp_path = "{}.{}.tmp".format(path, os.getpid())
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temp_path, "wb") as cache_file:
+                cache_file.write(importlib.util.MAGIC_NUMBER)
+                cache_file.write(marshal.dumps(code))
+            # Replace atomically, so that concurrent runs never read a partially written file
+            os.replace(temp_path, path)
+        except OSError:
+            logger.warning("Unable to write the script cache file for {}".format(key[0]), exc_info=True)
+            return
+        # The code of previous versions of the script is not needed anymore
+        self._remove_files(key[0], keep=path)
@@ -28,6 +28,7 @@ SESSION_TYPE = os.environ.get("XDG_SESSION_TYPE")
 CONFIG_DIR = os.path.join(XDG_CONFIG_HOME, "autokey")
 RUN_DIR = os.path.join(os.environ.get('XDG_RUNTIME_DIR', XDG_CACHE_HOME), "autokey")
 DATA_DIR = os.path.join(XDG_DATA_HOME, "autokey")
+CACHE_DIR = os.path.join(XDG_CACHE_HOME, "autokey")
 # The desktop file to start autokey during login is placed here
 AUTOSTART_DIR = os.path.join(XDG_CONFIG_HOME, "autostart")
 
@@ -28,6 +28,7 @@ import itertools
 
 import autokey.model.abstract_hotkey
 import autokey.model.folder
+from autokey.model.matching_snapshot import MatchingSnapshot
 from autokey.model.triggermode import TriggerMode
 import autokey.model.phrase
 import autokey.model.script
@@ -37,7 +38,9 @@ from autokey.configmanager.configmanager_constants import CONFIG_FILE, CONFIG_DE
     RECENT_ENTRIES_FOLDER, IS_FIRST_RUN, SERVICE_RUNNING, MENU_TAKES_FOCUS, SHOW_TRAY_ICON, SORT_BY_USAGE_COUNT, \
     PROMPT_TO_SAVE, ENABLE_QT4_WORKAROUND, UNDO_USING_BACKSPACE, WINDOW_DEFAULT_SIZE, HPANE_POSITION, COLUMN_WIDTHS, \
     SHOW_TOOLBAR, NOTIFICATION_ICON, WORKAROUND_APP_REGEX, TRIGGER_BY_INITIAL, SCRIPT_GLOBALS, INTERFACE_TYPE, \
-    DISABLED_MODIFIERS, GTK_THEME, GTK_TREE_VIEW_EXPANDED_ROWS, PATH_LAST_OPEN, KEYBOARD, MOUSE, DEVICES, DELAY
+    DISABLED_MODIFIERS, GTK_THEME, GTK_TREE_VIEW_EXPANDED_ROWS, PATH_LAST_OPEN, KEYBOARD, MOUSE, DEVICES, DELAY, \
+    SEND_RATE, TYPING_RATES, TYPING_RATE_TEST_MODE, SCRIPT_SANDBOX, MACRO_TIMEOUT, \
+    CLIPBOARD_RESTORE_TIMEOUT
 import autokey.configmanager.version_upgrading as version_upgrade
 import autokey.configmanager.predefined_user_files
 from autokey.iomediator.constants import X_RECORD_INTERFACE
@@ -223,7 +226,21 @@ class ConfigManager:
                 KEYBOARD: None,
                 MOUSE: None,
                 DEVICES: [],
-                DELAY: 0.5
+                DELAY: 0.5,
+                # Maximum number of characters per second typed by send_string(), 0 for no limit
+                SEND_RATE: 0,
+                # Characters per second learned for the applications dropping characters, by window class
+                TYPING_RATES: {},
+                # Verify typed phrases by selecting and copying them. Only for calibrating in text editor windows.
+                TYPING_RATE_TEST_MODE: False,
+                # Run scripts in separate worker processes. Script arguments and results must be picklable.
+                SCRIPT_SANDBOX: False,
+                # Seconds to wait for the script, system and file macros of a phrase, 0 to wait until they finish.
+                # Script macros may wait for the user, e.g. in a dialog, so there is no timeout by default.
+                MACRO_TIMEOUT: 0,
+                # Maximum seconds to wait for the target application to read pasted text before the previous
+                # clipboard content is restored
+                CLIPBOARD_RESTORE_TIMEOUT: 2.0
                 }
 
     def __init__(self, app):
@@ -231,6 +248,7 @@ class ConfigManager:
         Create initial default configuration
         """
         self.VERSION = self.__class__.CLASS_VERSION
+        # Serialises rebuilds of the configuration. Readers use the published matchingSnapshot instead.
         self.lock = threading.Lock()
 
         self.app = app
@@ -616,6 +634,9 @@ class ConfigManager:
             self.__sort_and_watch_folder(folder)
             self.__processFolder(folder)
         self.__reload_global_hotkeys()
+        # Publish the new configuration to the expansion service with a single reference swap
+        self.matchingSnapshot = MatchingSnapshot.build(
+            self.globalHotkeys, self.hotKeyFolders, self.hotKeys, self.allFolders, self.allItems)
         #_logger.debug("Global hotkeys: %s", self.globalHotkeys)
 
         #_logger.debug("Hotkey folders: %s", self.hotKeyFolders)
@@ -54,4 +54,10 @@ PATH_LAST_OPEN = "pathLastOpen"
 KEYBOARD= "keyboard"
 MOUSE = "mouse"
 DEVICES = "devices"
-DELAY = "uinputDelay"
\ No newline at end of file
+DELAY = "uinputDelay"
+SEND_RATE = "sendRate"
+TYPING_RATES = "typingRates"
+TYPING_RATE_TEST_MODE = "typingRateTestMode"
+SCRIPT_SANDBOX = "scriptSandbox"
+MACRO_TIMEOUT = "macroTimeout"
+CLIPBOARD_RESTORE_TIMEOUT = "clipboardRestoreTimeout"
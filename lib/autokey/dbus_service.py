@@ -49,6 +49,25 @@ class AppService(dbus.service.Object):
     def run_folder(self, name):
         self.app.service.run_folder(name)
 
+    @dbus.service.method(dbus_interface='org.autokey.Service', in_signature='', out_signature='a{sv}')
+    def get_executor_stats(self):
+        """Queue depth and wait times in seconds of the phrase and script jobs."""
+        return self.app.service.executor.get_stats()
+
+    @dbus.service.method(dbus_interface='org.autokey.Service', in_signature='', out_signature='as')
+    def get_running_scripts(self):
+        return [run.script_name for run in self.app.service.scriptRunner.supervisor.get_running()]
+
+    @dbus.service.method(dbus_interface='org.autokey.Service', in_signature='s', out_signature='i')
+    def cancel_script(self, name):
+        """Cancel all runs of the script with the given name. Returns the number of cancelled runs."""
+        return self.app.service.scriptRunner.supervisor.cancel_script(name)
+
+    @dbus.service.method(dbus_interface='org.autokey.Service', in_signature='', out_signature='a{sv}')
+    def get_script_usage(self):
+        """CPU time in seconds used by the recent runs of each script."""
+        return self.app.service.scriptRunner.get_script_usage()
+
     @dbus.service.method(dbus_interface='org.autokey.Service', in_signature='', out_signature='')
     def pause_service(self):
         self.app.pause_service()
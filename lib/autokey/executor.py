@@ -0,0 +1,213 @@
+# Copyright (C) 2024 AutoKey contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Long-lived worker threads running the phrase and script jobs triggered by the user.
+"""
+
+import collections
+import concurrent.futures
+import functools
+import threading
+import time
+import typing
+
+from autokey.model.concurrency import ConcurrencyPolicy
+
+logger = __import__("autokey.logger").logger.get_logger(__name__)
+
+Job = collections.namedtuple("Job", ["function", "args", "kwargs", "key", "submitted"])
+
+
+class Lane:
+    """
+    A FIFO queue of jobs processed by a fixed number of worker threads, which are started on the first submitted job.
+
+    Jobs submitted with a key are subject to the concurrency policy given on submission, which is applied against
+    the queued and running jobs having the same key. If warn_when_full is set, a warning is logged for jobs that have
+    to wait because all workers are busy.
+    """
+
+    def __init__(self, name: str, workers: int, warn_when_full: bool=False):
+        self.name = name
+        self.worker_count = workers
+        self.warn_when_full = warn_when_full
+        self._workers = []  # type: typing.List[threading.Thread]
+        self._jobs = collections.deque()  # type: typing.Deque[Job]
+        self._running = collections.Counter()  # type: typing.Counter[typing.Hashable]
+        self._condition = threading.Condition()
+        self._shutdown = False
+        self.completed = 0
+        self.dropped = 0
+        self.last_wait = 0.0
+        self.max_wait = 0.0
+
+    def submit(self, job: Job, policy: ConcurrencyPolicy=ConcurrencyPolicy.QUEUE) -> bool:
+        """Queue the given job. Returns False if the job was dropped because of the concurrency policy."""
+        with self._condition:
+            if self._shutdown:
+                return False
+            if job.key is not None:
+                if policy is ConcurrencyPolicy.DROP and self._is_busy(job.key):
+                    logger.debug("{}: {} is already queued or running, dropping it".format(self.name, job.key))
+                    self.dropped += 1
+                    return False
+                if policy is ConcurrencyPolicy.REPLACE:
+                    queued = len(self._jobs)
+                    self._jobs = collections.deque(queued_job for queued_job in self._jobs if queued_job.key != job.key)
+                    self.dropped += queued - len(self._jobs)
+            self._jobs.append(job)
+            if len(self._workers) < self.worker_count:
+                self._start_worker()
+            elif self.warn_when_full and sum(self._running.values()) >= self.worker_count:
+                logger.warning("{}: All {} workers are busy with {}, {} waits behind {} queued jobs".format(
+                    self.name, self.worker_count, list(self._running), job.key or job.function.__name__,
+                    len(self._jobs) - 1))
+            self._condition.notify()
+        return True
+
+    def _is_busy(self, key) -> bool:
+        return self._running[key] > 0 or any(queued_job.key == key for queued_job in self._jobs)
+
+    def _start_worker(self):
+        worker = threading.Thread(
+            target=self._work, name="{}-{}".format(self.name, len(self._workers)), daemon=True)
+        self._workers.append(worker)
+        worker.start()
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._jobs and not self._shutdown:
+                    self._condition.wait()
+                if self._shutdown:
+                    return
+                job = self._jobs.popleft()
+                self.last_wait = time.monotonic() - job.submitted
+                self.max_wait = max(self.max_wait, self.last_wait)
+                self._running[job.key] += 1
+            try:
+                job.function(*job.args, **job.kwargs)
+            except Exception:
+                logger.exception("{}: Unhandled error in job {}".format(self.name, job.function.__name__))
+            finally:
+                with self._condition:
+                    self._running[job.key] -= 1
+                    if not self._running[job.key]:
+                        del self._running[job.key]
+                    self.completed += 1
+
+    def shutdown(self):
+        """Stop the workers once their current job is done. Queued jobs are discarded."""
+        with self._condition:
+            self._shutdown = True
+            if self._jobs:
+                logger.info("{}: Discarding {} queued jobs".format(self.name, len(self._jobs)))
+                self._jobs.clear()
+            self._condition.notify_all()
+
+    def join(self, deadline: float):
+        """Wait until the given time of time.monotonic() for the workers to finish their current job."""
+        for worker in self._workers:
+            if worker is threading.current_thread():
+                continue
+            worker.join(max(0.0, deadline - time.monotonic()))
+            if worker.is_alive():
+                logger.warning("{}: {} did not finish its job before shutdown".format(self.name, worker.name))
+
+    def get_stats(self) -> typing.Dict[str, typing.Union[int, float]]:
+        with self._condition:
+            return {
+                "queued": len(self._jobs),
+                "running": sum(self._running.values()),
+                "completed": self.completed,
+                "dropped": self.dropped,
+                "last_wait": self.last_wait,
+                "max_wait": self.max_wait,
+            }
+
+
+class Executor:
+    """
+    Runs the phrase and script jobs.
+
+    Jobs producing output, like phrase expansions, run one after another in the output lane, so that they never
+    interleave. Scripts run in a lane with a bounded number of workers, so that long-running scripts neither block
+    expansions nor each other.
+    """
+
+    OUTPUT = "output"
+    SCRIPTS = "scripts"
+    MACROS = "macros"
+    SCRIPT_WORKERS = 4
+    MACRO_WORKERS = 4
+    # Seconds shutdown() waits for running jobs, like phrases being typed, to finish
+    SHUTDOWN_TIMEOUT = 5
+
+    def __init__(self):
+        self.lanes = {
+            self.OUTPUT: Lane("Phrase-thread", 1),
+            # Long-running scripts can occupy all workers, so report the triggers that have to wait for them
+            self.SCRIPTS: Lane("Script-thread", self.SCRIPT_WORKERS, warn_when_full=True),
+            self.MACROS: Lane("Macro-thread", self.MACRO_WORKERS),
+        }
+
+    def submit(self, lane: str, function: typing.Callable, *args, key=None,
+               policy: ConcurrencyPolicy=ConcurrencyPolicy.QUEUE, **kwargs) -> bool:
+        """
+        Run the function with the given arguments in the given lane. Jobs with the same key are subject to the
+        given concurrency policy.
+        """
+        job = Job(function, args, kwargs, key, time.monotonic())
+        return self.lanes[lane].submit(job, policy)
+
+    def call(self, lane: str, function: typing.Callable, *args, **kwargs) -> concurrent.futures.Future:
+        """
+        Run the function with the given arguments in the given lane, returning a future for its result. The future is
+        cancelled if the executor is shut down.
+        """
+        future = concurrent.futures.Future()
+
+        @functools.wraps(function)
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(function(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+
+        if not self.submit(lane, run):
+            future.cancel()
+        return future
+
+    def get_stats(self) -> typing.Dict[str, typing.Union[int, float]]:
+        """Returns the queue depth and job wait times of all lanes, as a flat dictionary."""
+        stats = {}
+        for lane_name, lane in self.lanes.items():
+            for name, value in lane.get_stats().items():
+                stats["{}_{}".format(lane_name, name)] = value
+        return stats
+
+    def shutdown(self, timeout: float=SHUTDOWN_TIMEOUT):
+        """
+        Discard the queued jobs and wait up to timeout seconds for the running jobs to finish. The workers are daemon
+        threads, so jobs still running afterwards, like scripts that never end, do not keep AutoKey from exiting.
+        """
+        for lane in self.lanes.values():
+            lane.shutdown()
+        deadline = time.monotonic() + timeout
+        for lane in self.lanes.values():
+            lane.join(deadline)
@@ -1,24 +1,34 @@
 
 import dbus
 import json
+import time
 from dbus.mainloop.glib import DBusGMainLoop
 
 
 from autokey.sys_interface.abstract_interface import AbstractSysInterface, AbstractMouseInterface, AbstractWindowInterface, WindowInfo
+from autokey.sys_interface.window_changes import WindowChangeNotifier
+from autokey.sys_interface.window_registry import WindowRegistry
 
 logger = __import__("autokey.logger").logger.get_logger(__name__)
 
+EXTENSION_OBJECT_PATH = '/org/gnome/Shell/Extensions/AutoKey'
+EXTENSION_INTERFACE = 'org.gnome.Shell.Extensions.AutoKey'
+# Extension versions this module can talk to. Version 0.2 added GetActiveWindow and the ActiveWindowChanged signal,
+# version 0.3 the WindowChanged and WindowClosed signals.
+SUPPORTED_EXTENSION_VERSIONS = ("0.1", "0.2", "0.3")
+
+
 class DBusInterface:
     def __init__(self):
         mainloop= DBusGMainLoop()
-        session_bus = dbus.SessionBus(mainloop=mainloop)
-        shell_obj = session_bus.get_object('org.gnome.Shell', '/org/gnome/Shell/Extensions/AutoKey')
-        self.dbus_interface = dbus.Interface(shell_obj, 'org.gnome.Shell.Extensions.AutoKey')
+        self.session_bus = dbus.SessionBus(mainloop=mainloop)
+        shell_obj = self.session_bus.get_object('org.gnome.Shell', EXTENSION_OBJECT_PATH)
+        self.dbus_interface = dbus.Interface(shell_obj, EXTENSION_INTERFACE)
 
         version = self.dbus_interface.CheckVersion()
         logger.debug("AutoKey Gnome Extension version: %s" % version)
-        if version == "0.1":
-            pass
+        if version in SUPPORTED_EXTENSION_VERSIONS:
+            self.extension_version = str(version)
         else:
             raise Exception("Incompatible version of AutoKey Gnome Extension")
 
@@ -33,10 +43,49 @@ class GnomeMouseReadInterface(DBusInterface):
         return [int(x), int(y)]
 
 class GnomeExtensionWindowInterface(DBusInterface, AbstractWindowInterface):
-    def __init__(self):
+
+    # Seconds a cached active window stays valid if the extension does not report focus changes
+    WINDOW_CACHE_TTL = 0.5
+    # Seconds it stays valid if it does, in case the main loop does not dispatch the signals
+    SIGNALLED_WINDOW_CACHE_TTL = 5
+
+    def __init__(self, registry: WindowRegistry=None):
+        # Reconnecting to D-Bus calls this again without arguments. Drop the subscriptions made using the old
+        # connection, but keep the registry and notifier, as they are used by others.
+        for signal in getattr(self, '_signals', ()):
+            signal.remove()
         super().__init__()
+        if registry is not None:
+            self.registry = registry
+        elif getattr(self, 'registry', None) is None:
+            self.registry = WindowRegistry()
+        if getattr(self, 'window_changes', None) is None:
+            self.window_changes = WindowChangeNotifier()
+        # (active window, time.monotonic() when it was fetched)
+        self._window_cache = None
+        self._focus_signal = None
+        self._signals = []
+        if self.extension_version != "0.1":
+            self._focus_signal = self._add_signal_receiver(self._on_active_window_changed, 'ActiveWindowChanged')
+        if self.extension_version not in ("0.1", "0.2"):
+            self._add_signal_receiver(self._on_window_changed, 'WindowChanged')
+            self._add_signal_receiver(self._on_window_closed, 'WindowClosed')
+            # Seeded after subscribing, so that no change is missed
+            self.registry.seed((window['id'], window) for window in json.loads(self.dbus_interface.List()))
+            self.window_changes.enable()
+        else:
+            self.registry.reset()
+
+    def _add_signal_receiver(self, handler, signal_name: str):
+        signal = self.session_bus.add_signal_receiver(
+            handler, signal_name=signal_name, dbus_interface=EXTENSION_INTERFACE, path=EXTENSION_OBJECT_PATH
+        )
+        self._signals.append(signal)
+        return signal
 
     def get_window_list(self):
+        if self.registry.seeded:
+            return self.registry.get_windows()
         return self._dbus_window_list()
 
     def get_screen_size(self):
@@ -44,7 +93,8 @@ class GnomeExtensionWindowInterface(DBusInterface, AbstractWindowInterface):
         return [int(x), int(y)]
 
     def  get_active_window(self):
-        return self._active_window()
+        # Callers need the current geometry, which is not covered by the focus change notifications
+        return self._active_window(use_cache=False)
 
     def get_window_info(self, window=None, traverse: bool=True) -> WindowInfo:
         """
@@ -53,6 +103,29 @@ class GnomeExtensionWindowInterface(DBusInterface, AbstractWindowInterface):
         window = self._active_window()
         return WindowInfo(wm_class=window['wm_class'], wm_title=window['wm_title'])
 
+    def _on_active_window_changed(self, window_json):
+        """Handler of the ActiveWindowChanged signal, which is emitted on focus and title changes."""
+        window = json.loads(window_json)
+        self._window_cache = (window if window else None, time.monotonic())
+        if self.registry.seeded:
+            # Move the focus flag in the registry
+            for other in self.registry.get_windows():
+                if other['focus'] and not (window and other['id'] == window['id']):
+                    self.registry.update(other['id'], dict(other, focus=False))
+            if window:
+                self.registry.update(window['id'], window)
+        self.window_changes.notify()
+
+    def _on_window_changed(self, window_json):
+        """Handler of the WindowChanged signal, which is emitted when a window is shown, renamed, moved or resized."""
+        window = json.loads(window_json)
+        self.registry.update(window['id'], window)
+        self.window_changes.notify()
+
+    def _on_window_closed(self, window_id):
+        self.registry.remove(int(window_id))
+        self.window_changes.notify()
+
     def get_window_class(self, window=None, traverse=True) -> str:
         """
         Returns the window class of the currently focused window.
@@ -72,8 +145,21 @@ class GnomeExtensionWindowInterface(DBusInterface, AbstractWindowInterface):
     def activate_window(self, window_id):
         self._dbus_activate_window(window_id)
 
-    def _active_window(self):
-        #TODO probably can be done more efficiently with an additional dbus method in the gnome extension
+    def _active_window(self, use_cache=True):
+        cache = self._window_cache
+        ttl = self.WINDOW_CACHE_TTL if self._focus_signal is None else self.SIGNALLED_WINDOW_CACHE_TTL
+        if use_cache and cache is not None and cache[0] is not None and time.monotonic() - cache[1] < ttl:
+            return cache[0]
+        window = self._fetch_active_window()
+        self._window_cache = (window, time.monotonic())
+        return window
+
+    def _fetch_active_window(self):
+        if self.extension_version != "0.1":
+            window = self._dbus_active_window()
+            if window:
+                return window
+            return self._empty_window()
         window_list = self._dbus_window_list()
         for window in window_list:
             if window['focus']:
@@ -87,6 +173,10 @@ class GnomeExtensionWindowInterface(DBusInterface, AbstractWindowInterface):
         # somehow.
         #
         # This seems to work to prevent the exceptions and the follow-on problems ...
+        return self._empty_window()
+
+    @staticmethod
+    def _empty_window():
         # Return an empty window object (Only really need wm_class and wm_title, but hey, why not do it all)
         empty_window = {
             'wm_class': '', 
@@ -107,6 +197,13 @@ class GnomeExtensionWindowInterface(DBusInterface, AbstractWindowInterface):
         }
         return empty_window
             
+    def _dbus_active_window(self):
+        try:
+            return json.loads(self.dbus_interface.GetActiveWindow())
+        except dbus.exceptions.DBusException as e:
+            self.__init__() #reconnect to dbus
+            return json.loads(self.dbus_interface.GetActiveWindow())
+
     def _dbus_window_list(self):
         #TODO consider how/if error handling can be implemented
         try:
@@ -97,6 +97,9 @@ class IndicatorNotifier:
         
         configureMenuItem = Gtk.ImageMenuItem(label=_("Show Main Window"))
         configureMenuItem.set_image(Gtk.Image.new_from_stock(Gtk.STOCK_PREFERENCES, Gtk.IconSize.MENU))
+
+        cancelScriptsMenuItem = Gtk.ImageMenuItem(label=_("Cancel running scripts"))
+        cancelScriptsMenuItem.set_image(Gtk.Image.new_from_stock(Gtk.STOCK_STOP, Gtk.IconSize.MENU))
         
         
         
@@ -108,6 +111,7 @@ class IndicatorNotifier:
         # Menu signals
         enableMenuItem.connect("toggled", self.on_enable_toggled)
         configureMenuItem.connect("activate", self.on_show_configure)
+        cancelScriptsMenuItem.connect("activate", self.on_cancel_scripts)
         removeMenuItem.connect("activate", self.on_remove_icon)
         quitMenuItem.connect("activate", self.on_destroy_and_exit)
         self.errorItem.connect("activate", self.on_show_error)
@@ -131,6 +135,7 @@ class IndicatorNotifier:
         self.menu.append(self.errorItem)
         self.menu.append(enableMenuItem)
         self.menu.append(configureMenuItem)
+        self.menu.append(cancelScriptsMenuItem)
         self.menu.append(removeMenuItem)
         self.menu.append(quitMenuItem)
         self.menu.show_all()
@@ -174,6 +179,9 @@ class IndicatorNotifier:
     def on_show_configure(self, widget, data=None):
         self.app.show_configure()
 
+    def on_cancel_scripts(self, widget, data=None):
+        self.app.service.scriptRunner.supervisor.cancel_all()
+
     def on_remove_icon(self, widget, data=None):
         self.indicator.set_status(AppIndicator.IndicatorStatus.PASSIVE)
         cm.ConfigManager.SETTINGS[cm_constants.SHOW_TRAY_ICON] = False
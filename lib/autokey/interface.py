@@ -22,7 +22,9 @@ A better name might be "keyboard_interface.py".
 
 #__all__ = ["XRecordInterface", "AtSpiInterface"]
 
+import collections
 import logging
+import os
 import typing
 import threading
 import select
@@ -37,6 +39,9 @@ if typing.TYPE_CHECKING:
     from autokey.iomediator.iomediator import IoMediator
 import autokey.configmanager.configmanager_constants as cm_constants
 from autokey.sys_interface.abstract_interface import AbstractSysInterface, AbstractMouseInterface, AbstractWindowInterface, WindowInfo, queue_method
+from autokey.sys_interface.ewmh import EwmhWindowManager, EwmhWindowTracker
+from autokey.sys_interface.window_changes import WindowChangeNotifier
+from autokey.sys_interface.window_registry import WindowRegistry
 
 
 # Imported to enable threading in Xlib. See module description. Not an unused import statement.
@@ -67,7 +72,7 @@ if common.USED_UI_TYPE == "GTK":
     except SyntaxError:  # pyatspi 2.26 fails when used with Python 3.7
         HAS_ATSPI = False
 
-from Xlib import X, XK, display, error
+from Xlib import X, XK, Xatom, display, error
 try:
     from Xlib.ext import record, xtest
     HAS_RECORD = True
@@ -116,63 +121,110 @@ class XWindowInterface(AbstractWindowInterface):
     Extends :class:`.AbstractWindowInterface`
     """
 
-    def __init__(self):
+    # Number of windows whose information is cached, see get_window_info()
+    MAX_CACHED_WINDOWS = 256
+
+    def __init__(self, registry: WindowRegistry):
+        self.registry = registry
         self.localDisplay = display.Display()
         # Window name atoms
         self.__NameAtom = self.localDisplay.intern_atom("_NET_WM_NAME", True)
         self.__VisibleNameAtom = self.localDisplay.intern_atom("_NET_WM_VISIBLE_NAME", True)
+        # Window management for the scripting API, using the same connection. Windows are looked up in the
+        # registry, which is kept current by the X interface.
+        self.ewmh = EwmhWindowManager(self.localDisplay, registry)
+        # Notified by the X interface about changes of the active window and the client list
+        self.window_changes = WindowChangeNotifier()
+        # Resolved window information by (window id, traverse). Each entry also holds the ids of the windows that were
+        # read to resolve it, so that it can be dropped when one of them changes. See invalidate_window_info().
+        self._info_cache = collections.OrderedDict()  # type: typing.MutableMapping[typing.Tuple[int, bool], typing.Tuple[WindowInfo, typing.FrozenSet[int]]]
+        self._info_lock = threading.Lock()
+        # Increased by every invalidation, so that results resolved meanwhile are not cached
+        self._info_generation = 0
 
     def get_window_info(self, window=None, traverse: bool=True) -> WindowInfo:
         try:
             if window is None:
                 window = self.localDisplay.get_input_focus().focus
-            return self._get_window_info(window, traverse)
+            return self._get_cached_window_info(window, traverse)
         except error.BadWindow:
             logger.warning("Got BadWindow error while requesting window information.")
             return self._create_window_info(window, "", "")
             
-    #  @dlk3 - Add missing get_window_list() method required by AbstractWindowInterface
-    #
-    #  I'm not sure if this ever gets called but this is my best guess, based off
-    #  the gnome_autokey_extension List() function for the return data structure 
-    #  and the autokey.scripting.window.get_window_list() method's use of wmctrl.
     def get_window_list(self, filter_desktop=-1):
-        try:
-            p = subprocess.run("wmctrl -lGp", shell=True, capture_output=True, check=True)
-        except:
-            logger.exception('Call to "wmctrl -lG" command failed with an exception')
-        REGEX = r"^(0x[0-9a-fA-F]{8})\s{1,}(\d*)\s{1,}(\d*)\s{1,}(\d*)\s{1,}(\d{1,})\s{1,}(\d{1,})\s{1,}(\d{1,})\s{1,}(.*?)\s{1,}(.*?)$"
-        matches = re.findall(REGEX, p.stdout.decode().strip(), re.MULTILINE)
+        """
+        Returns the managed windows in the format of the List() call of the AutoKey GNOME extension. Numbers are
+        given as strings, like C{wmctrl -lGp} prints them.
+        """
+        active = self.ewmh.get_active_window()
         winjsonarr = []
-        for match in matches:
-            if filter_desktop == -1 or match[1] == filter_desktop:
-                winjsonarr.append({
-                    'wm_class': None,
-                    'wm_class_instance': None,
-                    'wm_title': match[8],
-                    'workspace': None,
-                    'desktop': match[1],
-                    'pid': match[2],
-                    'id': match[0],
-                    'frame_type': None,
-                    'window_type': None,
-                    'width': match[5],
-                    'height': match[6],
-                    'x': match[3],
-                    'y': match[4],
-                    'focus': None,
-                    'in_current_workspace': None
+        for client in self.ewmh.get_clients():
+            if filter_desktop != -1 and str(client.desktop) != str(filter_desktop):
+                continue
+            wm_class_instance, _, wm_class = client.wm_class.partition(".")
+            winjsonarr.append({
+                'wm_class': wm_class,
+                'wm_class_instance': wm_class_instance,
+                'wm_title': client.title,
+                'workspace': None,
+                'desktop': str(client.desktop),
+                'pid': str(client.pid),
+                'id': client.hexid,
+                'frame_type': None,
+                'window_type': None,
+                'width': str(client.width),
+                'height': str(client.height),
+                'x': str(client.x),
+                'y': str(client.y),
+                'focus': client.id == active,
+                'in_current_workspace': None
             })
-        logger.debug('autokey.interface.get_window_list(filter_desktop={}) returned {}'.format(filter_desktop, json.dumps(winjsonarr, indent=4)))
         return winjsonarr
-		
+
     def get_window_title(self, window=None, traverse=True) -> str:
         return self.get_window_info(window, traverse).wm_title
 
     def get_window_class(self, window=None, traverse=True) -> str:
         return self.get_window_info(window, traverse).wm_class
     
-    def _get_window_info(self, window, traverse: bool, wm_title: str=None, wm_class: str=None) -> WindowInfo:
+    def _get_cached_window_info(self, window, traverse: bool) -> WindowInfo:
+        """
+        Returns the window information, resolving it only if it is not cached. Information is only cached if all
+        windows read to resolve it are in the window registry, because the X interface selects the property change
+        and destroy events of those windows, which invalidate the cached information.
+        """
+        if isinstance(window, int):
+            # No focus (None) or PointerRoot
+            return self._get_window_info(window, traverse)
+        key = (window.id, traverse)
+        with self._info_lock:
+            entry = self._info_cache.get(key)
+            if entry is not None:
+                self._info_cache.move_to_end(key)
+                return entry[0]
+            generation = self._info_generation
+        visited = set()  # type: typing.Set[int]
+        info = self._get_window_info(window, traverse, visited=visited)
+        if all(self.registry.get(window_id) is not None for window_id in visited):
+            with self._info_lock:
+                if generation == self._info_generation:
+                    self._info_cache[key] = (info, frozenset(visited))
+                    if len(self._info_cache) > self.MAX_CACHED_WINDOWS:
+                        self._info_cache.popitem(last=False)
+        return info
+
+    def invalidate_window_info(self, window_id: int):
+        """Drop the cached information read from the given window, e.g. because its title changed."""
+        with self._info_lock:
+            self._info_generation += 1
+            stale = [key for key, (info, visited) in self._info_cache.items() if window_id in visited]
+            for key in stale:
+                del self._info_cache[key]
+
+    def _get_window_info(self, window, traverse: bool, wm_title: str=None, wm_class: str=None,
+                         visited: typing.Set[int]=None) -> WindowInfo:
+        if visited is not None:
+            visited.add(window.id)
         new_wm_title = self._try_get_window_title(window)
         new_wm_class = self._try_get_window_class(window)
 
@@ -184,7 +236,7 @@ class XWindowInterface(AbstractWindowInterface):
         if traverse:
             # Recursive operation on the parent window
             if wm_title and wm_class:  # Both known, abort walking the tree and return the data.
-                return self._create_window_info(window, wm_title, wm_class)
+                return self._create_window_info(window, wm_title, wm_class, visited)
             else:  # At least one property is still not known. So walk the window tree up.
                 parent = window.query_tree().parent
                 # Stop traversal, if the parent is not a window. When querying the parent, at some point, an integer
@@ -192,9 +244,9 @@ class XWindowInterface(AbstractWindowInterface):
                 if isinstance(parent, int):
                     # At this point, wm_title or wm_class may still be None. The recursive call with traverse=False
                     # will replace any None with an empty string. See below.
-                    return self._get_window_info(window, False, wm_title, wm_class)
+                    return self._get_window_info(window, False, wm_title, wm_class, visited)
                 else:
-                    return self._get_window_info(parent, traverse, wm_title, wm_class)
+                    return self._get_window_info(parent, traverse, wm_title, wm_class, visited)
 
         else:
             # No recursion, so fill unknown values with empty strings.
@@ -202,9 +254,9 @@ class XWindowInterface(AbstractWindowInterface):
                 wm_title = ""
             if wm_class is None:
                 wm_class = ""
-            return self._create_window_info(window, wm_title, wm_class)
+            return self._create_window_info(window, wm_title, wm_class, visited)
 
-    def _create_window_info(self, window, wm_title: str, wm_class: str):
+    def _create_window_info(self, window, wm_title: str, wm_class: str, visited: typing.Set[int]=None):
         """
         Creates a WindowInfo object from the window title and WM_CLASS.
         Also checks for the Java XFocusProxyWindow workaround and applies it if needed:
@@ -216,7 +268,7 @@ class XWindowInterface(AbstractWindowInterface):
         if "FocusProxy" in wm_class:
             parent = window.query_tree().parent
             # Discard both the already known wm_class and window title, because both are known to be wrong.
-            return self._get_window_info(parent, False)
+            return self._get_window_info(parent, False, visited=visited)
         else:
             return WindowInfo(wm_title=wm_title, wm_class=wm_class)
 
@@ -259,6 +311,8 @@ class XInterfaceBase(threading.Thread, AbstractMouseInterface):
     """
 
     queue = queue.Queue()
+    # Number of characters typed by send_string() before flushing the events to the X server
+    SEND_BATCH_SIZE = 50
 
     def __init__(self, mediator, app):
         threading.Thread.__init__(self)
@@ -273,9 +327,11 @@ class XInterfaceBase(threading.Thread, AbstractMouseInterface):
         # Event loop
         self.eventThread = threading.Thread(target=self.__eventLoop)
 
-        # Event listener
+        # Event listener. Writing to the wakeup pipe interrupts its select() call, see __wake_listener()
         self.listenerThread = threading.Thread(target=self.__flush_events_loop)
+        self.__wakeupRead, self.__wakeupWrite = os.pipe()
 
+        self.__initDisplay()
         self.__initMappings()
 
         # Set initial lock state
@@ -396,13 +452,23 @@ class XInterfaceBase(threading.Thread, AbstractMouseInterface):
         self.__remap_characters(remapNeeded, string)
 
         focus = self.localDisplay.get_input_focus().focus
+        sendRate = cm.ConfigManager.SETTINGS[cm_constants.SEND_RATE]
+        startTime = time.monotonic()
+        # Modifiers kept pressed while typing consecutive characters that need the same modifiers
+        heldModifiers = ()
 
-        for char in string:
+        for count, char in enumerate(string, 1):
             try:
-                self.__send_keycode_for_char(char, focus)
+                heldModifiers = self.__send_keycode_for_char(char, focus, heldModifiers)
             except Exception as e:
                 logger.exception("Error sending char %r: %s", char, str(e))
 
+            if count % self.SEND_BATCH_SIZE == 0:
+                self.localDisplay.flush()
+                self.__pace_sending(count, sendRate, startTime)
+
+        self.__change_held_modifiers(heldModifiers, (), focus)
+        self.localDisplay.flush()
         self.__ignoreRemap = False
 
     @queue_method(queue)
@@ -415,6 +481,23 @@ class XInterfaceBase(threading.Thread, AbstractMouseInterface):
         logger.debug("Send special key: [%r]", keyName)
         self.__sendKeyCode(self.__lookupKeyCode(keyName))
 
+    @queue_method(queue)
+    def send_key_repeat(self, keyName, count):
+        """
+        Send a specific non-printing key count times, eg to move the cursor or erase text
+
+        :param keyName: Name of the key IE <left>, <backspace>
+        :param count: Number of key presses
+        """
+        logger.debug("Send special key %d times: [%r]", count, keyName)
+        keyCode = self.__lookupKeyCode(keyName)
+        focus = self.localDisplay.get_input_focus().focus
+        for sent in range(1, count + 1):
+            self.__sendKeyCode(keyCode, theWindow=focus)
+            if sent % self.SEND_BATCH_SIZE == 0:
+                self.localDisplay.flush()
+        self.localDisplay.flush()
+
     @queue_method(queue)
     def send_modified_key(self, keyName, modifiers):
         """
@@ -562,10 +645,13 @@ class XInterfaceBase(threading.Thread, AbstractMouseInterface):
         logger.debug("XInterfaceBase: Event thread exit marker enqueued.")
         self.shutdown = True
         logger.debug("XInterfaceBase: self.shutdown set to True. This should stop the listener thread.")
+        self.__wake_listener()
         self.listenerThread.join()
         self.eventThread.join()
         self.localDisplay.flush()
         self.localDisplay.close()
+        os.close(self.__wakeupRead)
+        os.close(self.__wakeupWrite)
         self.join()
 
     def __set_lock_keys_state(self):
@@ -587,6 +673,10 @@ class XInterfaceBase(threading.Thread, AbstractMouseInterface):
                 logger.exception("Error in X event loop thread: {}".format(e))
 
             self.queue.task_done()
+            if self.queue.empty():
+                # Requests sent by the jobs may have read X events into the Xlib event queue, where select() can't
+                # see them. Let the listener thread check for them.
+                self.__wake_listener()
 
     def __enqueue(self, method: typing.Callable, *args):
         self.queue.put_nowait((method, args))
@@ -596,11 +686,26 @@ class XInterfaceBase(threading.Thread, AbstractMouseInterface):
         self.__initMappings()
         self.__ignoreRemap = False
 
-    def __initMappings(self):
+    def __initDisplay(self):
         self.localDisplay = display.Display()
         self.rootWindow = self.localDisplay.screen().root
-        self.rootWindow.change_attributes(event_mask=X.SubstructureNotifyMask|X.StructureNotifyMask)
+        self.rootWindow.change_attributes(
+            event_mask=X.SubstructureNotifyMask|X.StructureNotifyMask|X.PropertyChangeMask)
+        self.__activeWindowAtom = self.localDisplay.get_atom("_NET_ACTIVE_WINDOW")
+        # Properties read by XWindowInterface.get_window_info()
+        self.__windowInfoAtoms = {
+            Xatom.WM_NAME, Xatom.WM_CLASS,
+            self.localDisplay.get_atom("_NET_WM_NAME"), self.localDisplay.get_atom("_NET_WM_VISIBLE_NAME")}
+        # Keeps the window registry of the IoMediator current from the events read by __flush_events()
+        self.__windowTracker = EwmhWindowTracker(self.localDisplay, self.mediator.windowRegistry)
+        # The listener thread reports window changes only if the window manager supports EWMH. Otherwise, waiting
+        # for window conditions has to poll.
+        if self.__windowTracker.start():
+            self.mediator.windowInterface.window_changes.enable()
+        else:
+            self.mediator.windowInterface.window_changes.disable()
 
+    def __initMappings(self):
         self.__build_usable_offsets()
         self.__build_modifier_mask_mapping()
 
@@ -609,6 +714,8 @@ class XInterfaceBase(threading.Thread, AbstractMouseInterface):
 
         self.__availableKeycodes = self.__get_unused_keycodes()
         self.remappedChars = {}
+        # Cache of __lookup_char() results for the current keyboard layout
+        self.__charTable = {}  # type: typing.Dict[str, typing.Tuple[typing.Optional[int], typing.Optional[typing.Tuple[Key, ...]]]]
 
         if logger.getEffectiveLevel() == logging.DEBUG:
             self.__keymap_test()
@@ -882,8 +989,8 @@ class XInterfaceBase(threading.Thread, AbstractMouseInterface):
 
     def __chars_need_remapping(self, string):
         remapNeeded = False
-        for char in string:
-            usableCode, _ = self.__get_usable_char_keycode_and_offset(char)
+        for char in set(string):
+            usableCode, _ = self.__lookup_char(char)
             if usableCode is None and char not in self.remappedChars:
                 remapNeeded = True
                 break
@@ -895,8 +1002,8 @@ class XInterfaceBase(threading.Thread, AbstractMouseInterface):
             self.remappedChars = {}
             remapChars = []
 
-            for char in string:
-                usableCode, _ = self.__get_usable_char_keycode_and_offset(char)
+            for char in dict.fromkeys(string):
+                usableCode, _ = self.__lookup_char(char)
                 if usableCode is None:
                     remapChars.append(char)
 
@@ -933,51 +1040,81 @@ class XInterfaceBase(threading.Thread, AbstractMouseInterface):
         keyCode, offset = self.__findUsableKeycode(keyCodeList)
         return keyCode, offset
 
-    def __send_keycode_for_char(self, char, focus):
+    def __lookup_char(self, char):
+        """
+        Returns the keycode and the modifiers needed to type the given character with the current keyboard layout.
+        The modifiers are C{None} if the character has to be typed as a unicode code point and both are C{None} if
+        the layout does not contain the character. Results are cached until the keyboard mapping changes.
+        """
+        try:
+            return self.__charTable[char]
+        except KeyError:
+            pass
         # Offset encodes the modifiers needed to convert the base key press
         # into the desired result symbol.
         keyCode, offset = self.__get_usable_char_keycode_and_offset(char)
-        if keyCode is not None:
-            if offset == 0:
-                if self.localDisplay.lookup_string(ord(char)) is None:
-                    # No reasonable translation of key to string found
-                    self.__sendByTypingAsUnicodePoint(char, focus)
-                else:
-                    self.__sendKeyCode(keyCode, theWindow=focus)
-            if offset == 1:
-                self.__send_keycode_with_modifiers_pressed(
-                    keyCode, [Key.SHIFT], focus)
-            if offset == 4:
-                self.__send_keycode_with_modifiers_pressed(
-                    keyCode, [Key.ALT_GR], focus)
-            if offset == 5:
-                self.__send_keycode_with_modifiers_pressed(
-                    keyCode, [Key.SHIFT, Key.ALT_GR], focus)
-        elif char in self.remappedChars:
+        if keyCode is None:
+            modifiers = None
+        elif offset == 0 and self.localDisplay.lookup_string(ord(char)) is None:
+            # No reasonable translation of key to string found
+            modifiers = None
+        else:
+            modifiers = OFFSET_MODIFIERS[offset]
+        result = self.__charTable[char] = (keyCode, modifiers)
+        return result
+
+    def __send_keycode_for_char(self, char, focus, heldModifiers=()):
+        """
+        Sends the given character, leaving the modifiers it needs pressed. Returns the modifiers held afterwards,
+        which have to be passed in for the next character and released after the last one.
+        """
+        keyCode, modifiers = self.__lookup_char(char)
+        if keyCode is None and char in self.remappedChars:
             # Symbols remapped to virtual keys.
             keyCode, offset = self.remappedChars[char]
-            if offset == 0:
-                self.__sendKeyCode(keyCode, theWindow=focus)
-            if offset == 1:
-                self.__send_keycode_with_modifiers_pressed(
-                    keyCode, [Key.SHIFT], focus)
-        else:
+            modifiers = OFFSET_MODIFIERS[offset]
+        if keyCode is None:
             logger.warning("Unable to send character %r", char)
+        elif modifiers is None:
+            heldModifiers = self.__change_held_modifiers(heldModifiers, (), focus)
+            self.__sendByTypingAsUnicodePoint(char, focus)
+        else:
+            heldModifiers = self.__change_held_modifiers(heldModifiers, modifiers, focus)
+            mask = 0
+            for modkey in modifiers: mask |= self.modMasks[modkey]
+            self.__sendKeyCode(keyCode, mask, focus)
+        return heldModifiers
+
+    def __change_held_modifiers(self, heldModifiers, modifiers, focus):
+        if heldModifiers != modifiers:
+            for modkey in heldModifiers:
+                if modkey not in modifiers:
+                    self.__sendKeyReleaseEvent(self.__lookupKeyCode(modkey), 0, focus)
+            for modkey in modifiers:
+                if modkey not in heldModifiers:
+                    self.__sendKeyPressEvent(self.__lookupKeyCode(modkey), 0, focus)
+        return modifiers
+
+    def __pace_sending(self, count, sendRate, startTime):
+        """Sleeps as long as needed to not exceed the configured number of characters per second."""
+        if sendRate > 0:
+            delay = startTime + count / sendRate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
 
     def __sendByTypingAsUnicodePoint(self, char, focus):
         # Try typing this as Unicode: <control><shift>u + hex
         ukeyCodeList = self.localDisplay.keysym_to_keycodes(ord('u'))
         ukeyCode, uOffset = self.__findUsableKeycode(ukeyCodeList)
         self.__send_keycode_with_modifiers_pressed(ukeyCode, [Key.CONTROL, Key.SHIFT], focus)
-        self.__send_char_as_hex_string(char)
-        self.__sendKeyPressEvent(self.__lookupKeyCode(Key.ENTER), 0)
+        self.__send_char_as_hex_string(char, focus)
+        self.__sendKeyPressEvent(self.__lookupKeyCode(Key.ENTER), 0, focus)
 
-    def __send_char_as_hex_string(self, char):
+    def __send_char_as_hex_string(self, char, focus=None):
         char_as_hex_string = '{:X}'.format(ord(char))
         for hex_char in char_as_hex_string:
-            hexKeyCodeList = self.localDisplay.keysym_to_keycodes(ord(hex_char))
-            hexKeyCode, hexOffset = self.__findUsableKeycode(hexKeyCodeList)
-            self.__sendKeyCode(hexKeyCode)
+            hexKeyCode, hexOffset = self.__lookup_char(hex_char)
+            self.__sendKeyCode(hexKeyCode, theWindow=focus)
 
     def __send_keycode_with_modifiers_pressed(self, keyCode, modifier_keys, focus=None):
         logger.debug("Send modified key: modifiers: %s key: %s", modifier_keys, keyCode)
@@ -1028,26 +1165,57 @@ class XInterfaceBase(threading.Thread, AbstractMouseInterface):
                 pass
         logger.debug("Left event loop.")
 
+    def __wake_listener(self):
+        try:
+            os.write(self.__wakeupWrite, b"\0")
+        except OSError:
+            # Pipe already closed during shutdown
+            pass
+
     def __flush_events(self):
-        readable, _, _ = select.select([self.localDisplay], [], [], 1)
-        time.sleep(1)
-        if self.localDisplay in readable:
-            createdWindows = []
-            destroyedWindows = []
-
-            for _ in range(self.localDisplay.pending_events()):
-                event = self.localDisplay.next_event()
+        localDisplay = self.localDisplay
+        if not localDisplay.pending_events():
+            # Block until the X server sends something or another thread wakes us up
+            readable, _, _ = select.select([localDisplay, self.__wakeupRead], [], [])
+            if self.__wakeupRead in readable:
+                os.read(self.__wakeupRead, 512)
+
+        # Windows created (and not destroyed again) in this batch, by window id
+        createdWindows = {}
+        mappingChanged = False
+        windowsChanged = False
+
+        # Drain all pending events, including those arriving while processing the batch
+        while localDisplay.pending_events():
+            for _ in range(localDisplay.pending_events()):
+                event = localDisplay.next_event()
                 if event.type == X.CreateNotify:
-                    createdWindows.append(event.window)
-                if event.type == X.DestroyNotify:
-                    destroyedWindows.append(event.window)
-                if event.type == X.MappingNotify:
+                    createdWindows[event.window.id] = event.window
+                elif event.type == X.DestroyNotify:
+                    # Coalesce Create/Destroy pairs: no need to grab hotkeys for short-lived windows
+                    createdWindows.pop(event.window.id, None)
+                elif event.type == X.MappingNotify:
                     logger.debug("X Mapping Event Detected")
-                    self.on_keys_changed()
-
-            for window in createdWindows:
-                if window not in destroyedWindows:
-                    self.__grabHotkeysForWindow(window)
+                    # Update the keysym tables of Xlib, which __initMappings() reads when rebuilding the mappings
+                    localDisplay.refresh_keyboard_mapping(event)
+                    mappingChanged = True
+                elif event.type == X.PropertyNotify and event.atom == self.__activeWindowAtom:
+                    windowsChanged = True
+                if event.type == X.DestroyNotify or \
+                        event.type == X.PropertyNotify and event.atom in self.__windowInfoAtoms:
+                    self.mediator.windowInterface.invalidate_window_info(event.window.id)
+                if self.__windowTracker.handle_event(event):
+                    windowsChanged = True
+
+        if mappingChanged:
+            self.on_keys_changed()
+
+        if windowsChanged:
+            # Wake up scripts waiting for a window, see autokey.scripting.window.Window.wait_for_focus()
+            self.mediator.windowInterface.window_changes.notify()
+
+        for window in createdWindows.values():
+            self.__grabHotkeysForWindow(window)
 
     def __decodeModifier(self, keyCode):
         """
@@ -1368,3 +1536,11 @@ XK_TO_AK_NUMLOCKED = {
            XK.XK_KP_Subtract: "-",
            XK.XK_KP_Enter: Key.ENTER
            }
+
+# Modifiers needed to type the symbol found at the given offset of a keycode mapping
+OFFSET_MODIFIERS = {
+    0: (),
+    1: (Key.SHIFT,),
+    4: (Key.ALT_GR,),
+    5: (Key.SHIFT, Key.ALT_GR)
+}
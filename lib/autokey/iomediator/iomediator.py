@@ -21,14 +21,17 @@ import os
 import autokey
 from autokey import common
 from autokey.configmanager.configmanager import ConfigManager
-from autokey.configmanager.configmanager_constants import INTERFACE_TYPE
+from autokey.configmanager.configmanager_constants import INTERFACE_TYPE, TYPING_RATES, TYPING_RATE_TEST_MODE, \
+    CLIPBOARD_RESTORE_TIMEOUT
 from autokey.gnome_interface import GnomeExtensionWindowInterface
-from autokey.sys_interface.clipboard import Clipboard
+from autokey.sys_interface.clipboard import Clipboard, XClipboard
+from autokey.sys_interface.window_registry import WindowRegistry
 from autokey.model.phrase import SendMode
 
 from autokey.model.key import Key, KEY_SPLIT_RE, MODIFIERS, HELD_MODIFIERS
 from autokey.model.button import Button
 from .constants import X_RECORD_INTERFACE
+from .typing_rate import TypingRateController
 
 CURRENT_INTERFACE = None
 
@@ -46,6 +49,16 @@ class IoMediator(threading.Thread):
     
     # List of targets interested in receiving keypress, hotkey and mouse events
     listeners = []
+    # Interval in seconds at which paced text is handed to the interface
+    PACING_INTERVAL = 0.05
+    # Seconds to wait before restoring the clipboard and the selection, if the clipboard does not report when the
+    # pasted text is read. Programmatically pressing the middle mouse button seems VERY slow, so wait rather long.
+    CLIPBOARD_RESTORE_DELAY = 0.2
+    SELECTION_RESTORE_DELAY = 1
+    # Seconds to wait for the copy of the typed text in typing rate test mode, plus the time per typed character,
+    # as the text is selected character by character
+    VERIFY_COPY_TIMEOUT = 0.5
+    VERIFY_COPY_TIMEOUT_PER_CHAR = 0.02
     
     def __init__(self, service):
         threading.Thread.__init__(self, name="KeypressHandler-thread")
@@ -69,12 +82,14 @@ class IoMediator(threading.Thread):
         elif session_type is None:
             pass
 
+        # The top-level windows, kept current by the interfaces and used for all window queries
+        self.windowRegistry = WindowRegistry()
         if self.interfaceType == "uinput":
             logger.debug("Using gnome extension window interface")
-            self.windowInterface = GnomeExtensionWindowInterface()
+            self.windowInterface = GnomeExtensionWindowInterface(self.windowRegistry)
         else:
             from autokey.interface import XWindowInterface
-            self.windowInterface = XWindowInterface()
+            self.windowInterface = XWindowInterface(self.windowRegistry)
 
 
         if self.interfaceType == "uinput":
@@ -87,12 +102,24 @@ class IoMediator(threading.Thread):
             from autokey.interface import AtSpiInterface
             self.interface = AtSpiInterface(self, self.app)
 
-        self.clipboard = Clipboard()
+        self.clipboard = self.__create_clipboard()
+        self.typingRates = TypingRateController(ConfigManager.SETTINGS[TYPING_RATES])
 
         global CURRENT_INTERFACE
         CURRENT_INTERFACE = self.interface
         logger.info("Created IoMediator instance, current interface is: {}".format(CURRENT_INTERFACE))
 
+    def __create_clipboard(self) -> Clipboard:
+        if self.interfaceType != "uinput":
+            # Own the X clipboard independently of the main loop of the UI
+            try:
+                return Clipboard(backend=XClipboard())
+            except Exception:
+                logger.exception("Could not set up the X clipboard, falling back to the clipboard of the UI")
+        # The clipboard backend of the Qt UI hands its calls to the main thread, where Qt serves the requests of
+        # other applications. So pasting must not block the main thread.
+        return Clipboard(self.app)
+
     def start(self):
         self.interface.initialise()
         self.interface.start()
@@ -102,6 +129,7 @@ class IoMediator(threading.Thread):
     def shutdown(self):
         logger.debug("IoMediator shutting down")
         self.interface.cancel()
+        self.clipboard.close()
         self.queue.put_nowait((None, None))
         logger.debug("Waiting for IoMediator thread to end")
         self.join()
@@ -189,18 +217,53 @@ class IoMediator(threading.Thread):
         """
         if not string:
             return
+        testMode = ConfigManager.SETTINGS[TYPING_RATE_TEST_MODE]
+        rate = 0
+        if self.typingRates.rates or testMode:
+            windowClass = self.windowInterface.get_window_class()
+            rate = self.typingRates.rate(windowClass)
+        text = string
 
         string = string.replace('\n', "<enter>")
         string = string.replace('\t', "<tab>")
         
         logger.debug("Send via event interface")
         self._clear_modifiers()
-        IoMediator._send_string(string, self.interface)
+        IoMediator._send_string(string, self.interface, rate)
         self._reapply_modifiers()
+        if testMode:
+            self.__verify_typed_text(text, windowClass)
+
+    def __verify_typed_text(self, text: str, window_class: str):
+        """
+        Test mode: select the text just typed, copy it and compare it to the sent text to detect dropped
+        characters. This only works in applications where shift+left selects text and ctrl+c copies it.
+        """
+        if any(Key.is_key(section) for section in KEY_SPLIT_RE.split(text)):
+            # Only plain text can be compared
+            return
+        backup = self.clipboard.text
+        self.clipboard.text = ""
+        for _ in range(len(text)):
+            self.interface.send_modified_key(Key.LEFT, [Key.SHIFT])
+        self.interface.send_modified_key("c", [Key.CONTROL])
+        self.interface.send_key(Key.RIGHT)
+        # The interface sends the keys asynchronously, so wait for the copy to happen
+        deadline = time.monotonic() + self.VERIFY_COPY_TIMEOUT + self.VERIFY_COPY_TIMEOUT_PER_CHAR * len(text)
+        typed = self.clipboard.text
+        while not typed and time.monotonic() < deadline:
+            time.sleep(self.PACING_INTERVAL)
+            typed = self.clipboard.text
+        self.clipboard.text = backup if backup is not None else ""
+        if typed == text:
+            self.typingRates.report_verified(window_class)
+        else:
+            logger.debug("Typed text verification failed, expected %r, got %r", text, typed)
+            self.typingRates.report_dropped(window_class)
 
     # Mainly static for the purpose of testing
     @staticmethod
-    def _send_string(string, interface):
+    def _send_string(string, interface, rate=0):
         modifiers = []
         logger.debug("Sending string sections: %s", KEY_SPLIT_RE.split(string))
         for section in KEY_SPLIT_RE.split(string):
@@ -225,9 +288,26 @@ class IoMediator(threading.Thread):
                         if Key.is_key(section):
                             interface.send_key(section)
                         else:
-                            interface.send_string(section)
+                            IoMediator._send_text(section, interface, rate)
         logger.debug("Finished Sending string?")
 
+    @staticmethod
+    def _send_text(text, interface, rate=0):
+        """
+        Sends plain text, handing it to the interface in chunks no faster than the given rate in characters per
+        second. The whole text is sent at once if the rate is 0.
+        """
+        if not rate:
+            interface.send_string(text)
+            return
+        chunkSize = max(1, int(rate * IoMediator.PACING_INTERVAL))
+        start = time.monotonic()
+        for offset in range(0, len(text), chunkSize):
+            delay = start + offset / rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            interface.send_string(text[offset:offset + chunkSize])
+
     def paste_string(self, string, paste_command: SendMode):
         """
         This method is called for Phrase expansion using one of the clipboard methods.
@@ -264,6 +344,15 @@ class IoMediator(threading.Thread):
         key_name = key_name.replace('\n', "<enter>")
         self.interface.send_key(key_name)
 
+    def send_key_repeat(self, key_name, count):
+        """
+        Sends the given key count times, using a single interface call.
+        """
+        if count <= 0:
+            return
+        key_name = key_name.replace('\n', "<enter>")
+        self.interface.send_key_repeat(key_name, count)
+
     def press_key(self, key_name):
         key_name = key_name.replace('\n', "<enter>")
         self.interface.fake_keydown(key_name)
@@ -281,26 +370,22 @@ class IoMediator(threading.Thread):
         """
         Sends the given number of left key presses.
         """
-        for _ in range(count):
-            self.send_key(Key.LEFT)
+        self.send_key_repeat(Key.LEFT, count)
 
     def send_right(self, count):
-        for _ in range(count):
-            self.send_key(Key.RIGHT)
+        self.send_key_repeat(Key.RIGHT, count)
     
     def send_up(self, count):
         """
         Sends the given number of up key presses.
         """        
-        for _ in range(count):
-            self.send_key(Key.UP)
+        self.send_key_repeat(Key.UP, count)
 
     def send_backspace(self, count):
         """
         Sends the given number of backspace key presses.
         """
-        for _ in range(count):
-            self.send_key(Key.BACKSPACE)
+        self.send_key_repeat(Key.BACKSPACE, count)
 
     def flush(self):
         self.interface.flush()
@@ -338,55 +423,50 @@ class IoMediator(threading.Thread):
          keyboard combination string, like '<ctrl>+v', or '<shift>+<insert>' that is sent to the target application,
          causing a paste operation to happen.
         """
-        if common.USED_UI_TYPE == "QT":
-            self.app.exec_in_main(self.__send_string_clipboard, string, paste_command)
-        elif common.USED_UI_TYPE in ["GTK", "headless"]:
-            self.__send_string_clipboard(string, paste_command)
-
-    def send_string_selection(self, string: str):
-        if common.USED_UI_TYPE == "QT":
-            self.app.exec_in_main(self._send_string_selection, string)
-        elif common.USED_UI_TYPE in ["GTK", "headless"]:
-            self._send_string_selection(string)
-
-    def __send_string_clipboard(self, string: str, paste_command: autokey.model.phrase.SendMode):
-        """
-        Use the clipboard to send a string.
-        """
         backup = self.clipboard.text  # Keep a backup of current content, to restore the original afterwards.
         if backup is None:
             logger.warning("Tried to backup the X clipboard content, but got None instead of a string.")
         self.clipboard.text = string
+        requests = self.clipboard.get_request_count()
         try:
             self.send_string(paste_command.value)
         finally:
             self.interface.ungrab_keyboard()
-        # Because send_string is queued, also enqueue the clipboard restore, to keep the proper action ordering.
-        self.__restore_clipboard_text(backup)
-
-    def __restore_clipboard_text(self, backup: str):
-        """Restore the clipboard content."""
-        # Pasting takes some time, so wait a bit before restoring the content. Otherwise the restore is done before
-        # the pasting happens, causing the backup to be pasted instead of the desired clipboard content.
-        time.sleep(0.2)
+        self.__wait_for_paste(False, requests, self.CLIPBOARD_RESTORE_DELAY)
         self.clipboard.text = backup if backup is not None else ""
 
-    def _send_string_selection(self, string: str):
+    def send_string_selection(self, string: str):
         """Use the mouse selection clipboard to send a string."""
         backup = self.clipboard.selection  # Keep a backup of current content, to restore the original afterwards.
         if backup is None:
             logger.warning("Tried to backup the X PRIMARY selection content, but got None instead of a string.")
         self.clipboard.selection = string
+        requests = self.clipboard.get_request_count(True)
         pos = self.interface.get_mouse_position()
         self.interface.send_mouse_click(pos[0], pos[1], Button.MIDDLE, False)
-        self.__restore_clipboard_selection(backup)
-
-    def __restore_clipboard_selection(self, backup: str):
-        """Restore the selection clipboard content."""
-        # Pasting takes some time, so wait a bit before restoring the content. Otherwise the restore is done before
-        # the pasting happens, causing the backup to be pasted instead of the desired clipboard content.
-
-        # Programmatically pressing the middle mouse button seems VERY slow, so wait rather long.
-        # It might be a good idea to make this delay configurable. There might be systems that need even longer.
-        time.sleep(1)
+        self.__wait_for_paste(True, requests, self.SELECTION_RESTORE_DELAY)
         self.clipboard.selection = backup if backup is not None else ""
+
+    def __wait_for_paste(self, selection: bool, requests: int, delay: float):
+        """
+        Wait until the target application read the pasted text, so that restoring the previous content does not
+        cause the backup to be pasted instead. The paste command is sent asynchronously, so the text is read some time
+        after it was sent.
+        :param requests: The request count of the clipboard or selection before the paste command was sent
+        :param delay: Seconds to wait instead, if the clipboard does not report when the text is read, and at least,
+         if it does not report which application read it
+        """
+        timeout = ConfigManager.SETTINGS[CLIPBOARD_RESTORE_TIMEOUT]
+        if not self.clipboard.reports_requests:
+            time.sleep(min(delay, timeout))
+            return
+        start = time.monotonic()
+        if not self.clipboard.wait_for_request(requests, selection, timeout):
+            logger.warning("The pasted text was not read within {} seconds, restoring the {} anyway".format(
+                timeout, "selection" if selection else "clipboard"))
+        elif not self.clipboard.identifies_requestors:
+            # The request may come from a clipboard manager instead of the target application, so wait at least
+            # the delay used without request reports
+            remaining = min(delay, timeout) - (time.monotonic() - start)
+            if remaining > 0:
+                time.sleep(remaining)
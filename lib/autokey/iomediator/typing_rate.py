@@ -0,0 +1,80 @@
+# Copyright (C) 2024 AutoKey contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import typing
+
+logger = __import__("autokey.logger").logger.get_logger(__name__)
+
+
+class TypingRateController:
+    """
+    Learns the fastest rate at which each application reliably receives typed characters.
+
+    Applications are identified by their window class and are typed at full speed until a dropped character is
+    reported. Each drop halves the rate, while a series of verified expansions raises it again, but never up to a
+    rate that already dropped characters. The learned rates are kept in the given dictionary, which is part of the
+    persisted settings.
+    """
+
+    # Rate after the first drop in an application typed at full speed, in characters per second
+    INITIAL_RATE = 400
+    MIN_RATE = 10
+    # Applications reaching this rate are typed at full speed again
+    MAX_RATE = 1000
+    # Number of consecutive verified expansions before trying a faster rate
+    SPEED_UP_AFTER = 5
+    SPEED_UP_FACTOR = 1.25
+
+    def __init__(self, rates: typing.Dict[str, float]):
+        self.rates = rates
+        self._verified = {}  # type: typing.Dict[str, int]
+        # Slowest rate at which each application dropped characters during this session
+        self._dropped_at = {}  # type: typing.Dict[str, float]
+
+    def rate(self, window_class: str) -> float:
+        """Return the rate for the given application in characters per second, 0 if it is not limited."""
+        return self.rates.get(window_class, 0)
+
+    def report_dropped(self, window_class: str):
+        current = self.rate(window_class)
+        new_rate = self.INITIAL_RATE if current == 0 else max(self.MIN_RATE, current / 2)
+        failed = current or self.MAX_RATE
+        self._dropped_at[window_class] = min(failed, self._dropped_at.get(window_class, failed))
+        self._verified[window_class] = 0
+        self.rates[window_class] = new_rate
+        logger.info("Characters dropped in {}, typing at {:.0f} characters per second".format(window_class, new_rate))
+
+    def report_verified(self, window_class: str):
+        current = self.rate(window_class)
+        if current == 0:
+            return
+        verified = self._verified.get(window_class, 0) + 1
+        if verified < self.SPEED_UP_AFTER:
+            self._verified[window_class] = verified
+            return
+        self._verified[window_class] = 0
+        new_rate = current * self.SPEED_UP_FACTOR
+        if window_class in self._dropped_at:
+            # Stay below the rate that already failed
+            new_rate = min(new_rate, (current + self._dropped_at[window_class]) / 2)
+        if new_rate - current < 1:
+            # Settled on the fastest safe rate
+            return
+        if new_rate >= self.MAX_RATE:
+            del self.rates[window_class]
+            logger.info("Typing at full speed in {}".format(window_class))
+        else:
+            self.rates[window_class] = new_rate
+            logger.info("Typing at {:.0f} characters per second in {}".format(new_rate, window_class))
@@ -1,12 +1,24 @@
+import collections
+import concurrent.futures
 import datetime
+import functools
+import math
+import os
+import threading
+import time
 from abc import abstractmethod
 import shlex
+import typing
 
 from autokey.model.key import Key, KEY_SPLIT_RE
 from autokey import common
+from autokey.configmanager.configmanager import ConfigManager
+import autokey.configmanager.configmanager_constants as cm_constants
+from autokey.executor import Executor
 
 import autokey.scripting
 
+logger = __import__("autokey.logger").logger.get_logger(__name__)
 
 if common.USED_UI_TYPE == "QT":
     from PyQt5.QtWidgets import QAction
@@ -52,6 +64,13 @@ def decode_escaped_brackets(s):
     s = s.replace(chr(0x1f), '>')  # unit seperator
     return s
 
+
+def restore_escaped_brackets(s):
+    """Undo encode_escaped_brackets() for text outside of macros, which is sent as written."""
+    s = s.replace(chr(0x1e), "\\<")
+    s = s.replace(chr(0x1f), "\\>")
+    return s
+
 def sections_decode_escaped_brackets(sections):
     for i, s in enumerate(sections):
         sections[i] = decode_escaped_brackets(s)
@@ -68,6 +87,19 @@ def extract_tag(s):
         return ''.join(extracted)
 
 
+# Returns the macro type and the unparsed arguments of a <> section.
+def extract_macro(section):
+    content = extract_tag(section)
+    content = decode_escaped_brackets(content)
+    # type is space-separated from rest of macro.
+    # Cursor macros have no space.
+    if ' ' in content:
+        macro_type, macro = content.split(' ', 1)
+    else:
+        macro_type, macro = (content, '')
+    return macro_type, macro
+
+
 def split_key_val(s):
     # Split as if a shell argument.
     # Splits at spaces, but preserves spaces within quotes.
@@ -75,17 +107,115 @@ def split_key_val(s):
     return dict(pair.split('=', 1) for pair in pairs)
 
 
+def parse_bool(s):
+    value = s.lower()
+    if value in ("true", "yes", "on", "1"):
+        return True
+    if value in ("false", "no", "off", "0"):
+        return False
+    raise ValueError("Invalid boolean value '{}'".format(s))
+
+
+class _CacheEntry:
+
+    def __init__(self, value: str, validator):
+        self.value = value
+        # Must be equal to the current state of the source for the entry to be valid, e.g. the file modification time
+        self.validator = validator
+        self.created = time.monotonic()
+        self.refreshing = False
+
+    def age(self) -> float:
+        return time.monotonic() - self.created
+
+
+class MacroResultCache:
+    """
+    Cache of macro results, evicting the least recently used entries when full. The size is measured in characters.
+    """
+
+    MAX_ENTRIES = 128
+    MAX_SIZE = 1000000
+
+    def __init__(self):
+        self._entries = collections.OrderedDict()  # type: typing.MutableMapping[typing.Hashable, _CacheEntry]
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: typing.Hashable, validator=None, ttl: float=math.inf) -> typing.Optional[_CacheEntry]:
+        """Returns the entry for the key, if it matches the validator and is not older than ttl seconds."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.validator != validator or entry.age() >= ttl:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: typing.Hashable, value: str, validator=None):
+        with self._lock:
+            self._remove(key)
+            if len(value) > self.MAX_SIZE:
+                return
+            self._entries[key] = _CacheEntry(value, validator)
+            self._size += len(value)
+            while len(self._entries) > self.MAX_ENTRIES or self._size > self.MAX_SIZE:
+                self._remove(next(iter(self._entries)))
+
+    def start_refresh(self, key: typing.Hashable) -> bool:
+        """Mark the entry as being refreshed. Returns False if it is refreshed already or was evicted."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.refreshing:
+                return False
+            entry.refreshing = True
+            return True
+
+    def _remove(self, key: typing.Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry.value)
+
+    def get_stats(self) -> typing.Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "size": self._size, "hits": self.hits, "misses": self.misses}
+
+
+class MacroNode(typing.NamedTuple("MacroNode", (
+        ("macro", "AbstractMacro"),
+        ("args", typing.Dict[str, str])))):
+    """A macro in a parsed phrase, with its parsed arguments. Must not be modified, as parsed phrases are cached."""
+
+
+# A parsed phrase is a sequence of literal text and macros
+ParsedPhrase = typing.Tuple[typing.Union[str, MacroNode], ...]
+
+
 class MacroManager:
 
-    def __init__(self, engine):
+    # Number of parsed phrases kept
+    MAX_CACHED_PHRASES = 256
+    # Inserted in place of macros that did not finish in time
+    TIMEOUT_PLACEHOLDER = "{ERROR: macro timed out}"
+
+    def __init__(self, engine, executor: Executor=None):
+        # Runs the concurrent macros
+        self.executor = executor if executor is not None else Executor()
+        self.result_cache = MacroResultCache()
         self.macros = []
 
         self.macros.append(ScriptMacro(engine))
         self.macros.append(DateMacro())
-        self.macros.append(FileContentsMacro())
+        self.macros.append(FileContentsMacro(self.result_cache))
         self.macros.append(CursorMacro())
-        self.macros.append(SystemMacro(engine))
+        self.macros.append(SystemMacro(engine, self.result_cache, self.executor))
         self.macros.append(ClipboardMacro())
+        self.macros_by_id = {macro.ID: macro for macro in self.macros}
+        # Phrases are cached by their content, so changing a phrase invalidates its entry
+        self.parse = functools.lru_cache(maxsize=self.MAX_CACHED_PHRASES)(self._parse)
 
     def get_menu(self, callback, menu=None):
         if common.USED_UI_TYPE == "QT":
@@ -104,22 +234,71 @@ class MacroManager:
 
         return menu
 
-    # Split expansion.string, expand and process its macros, then
-    # replace with the results.
-    def process_expansion_macros(self, content):
+    def _parse(self, content: str) -> ParsedPhrase:
+        """Split the content into literal text and macros, and parse the macro arguments."""
         # Split into sections with <> macros in them.
         # Using the Key split regex works for now.
-        content = encode_escaped_brackets(content)
-        content_sections = KEY_SPLIT_RE.split(content)
-
-        for macroClass in self.macros:
-            content_sections = macroClass.process(content_sections)
-
-        return ''.join(content_sections)
+        sections = KEY_SPLIT_RE.split(encode_escaped_brackets(content))
+        nodes = []
+        for i, section in enumerate(sections):
+            # The split places the <> sections at the odd indices
+            if i % 2:
+                macro_type, macro = extract_macro(section)
+                if macro_type in self.macros_by_id:
+                    macro_class = self.macros_by_id[macro_type]
+                    nodes.append(MacroNode(macro_class, macro_class.parse_args(macro)))
+                    continue
+            if section:
+                nodes.append(restore_escaped_brackets(section))
+        return tuple(nodes)
+
+    # Expand the macros in expansion.string and replace them with the results.
+    def process_expansion_macros(self, content: str) -> str:
+        if '<' not in content:
+            return content
+        nodes = self.parse(content)
+        sections = []
+        cursor_positions = []
+        pending = {}  # type: typing.Dict[int, concurrent.futures.Future]
+        for node in nodes:
+            if isinstance(node, str):
+                sections.append(node)
+            elif node.macro.ID == CursorMacro.ID:
+                # The cursor position depends on the length of the expanded text after it
+                cursor_positions.append(len(sections))
+                sections.append('')
+            elif node.macro.CONCURRENT:
+                pending[len(sections)] = self.executor.call(Executor.MACROS, node.macro.expand, node.args)
+                sections.append('')
+            else:
+                sections.append(node.macro.expand(node.args))
+        if pending:
+            self._insert_results(sections, pending)
+        for i in cursor_positions:
+            lefts = len(''.join(sections[i+1:]))
+            sections.append(Key.LEFT * lefts)
+        return ''.join(sections)
+
+    def _insert_results(self, sections: typing.List[str], pending: typing.Dict[int, concurrent.futures.Future]):
+        """Wait for the concurrent macros of a phrase and insert their results, or the placeholder on timeout."""
+        timeout = ConfigManager.SETTINGS[cm_constants.MACRO_TIMEOUT] or None
+        done, not_done = concurrent.futures.wait(pending.values(), timeout)
+        if not_done:
+            logger.warning("{} phrase macros did not finish within {} seconds".format(len(not_done), timeout))
+        for i, future in pending.items():
+            if future in done and not future.cancelled():
+                # Raises the exception of a failed macro, like expanding it directly would
+                sections[i] = future.result()
+            else:
+                sections[i] = self.TIMEOUT_PLACEHOLDER
 
 
 class AbstractMacro:
 
+    # Set for macros that wait for other processes or files. These are expanded concurrently with the other macros
+    # of the phrase, so they must not depend on state shared with other macros.
+    CONCURRENT = False
+
     @property
     @abstractmethod
     def ID(self):
@@ -132,6 +311,8 @@ class AbstractMacro:
     @abstractmethod
     def ARGS(self):
         pass
+    # Arguments that may be omitted
+    OPTIONAL_ARGS = []
 
     def get_token(self):
         ret = "<%s" % self.ID
@@ -143,43 +324,54 @@ class AbstractMacro:
     def _get_args(self, macro):
         args = split_key_val(macro)
         expected_args = [arg[0] for arg in self.ARGS]
+        optional_args = [arg[0] for arg in self.OPTIONAL_ARGS]
         expected_argnum = len(self.ARGS)
 
         for arg in expected_args:
             if arg not in args:
                 raise ValueError("Missing mandatory argument '{}' for macro '{}'".format(arg, self.ID))
         for arg in args:
-            if arg not in expected_args:
+            if arg not in expected_args and arg not in optional_args:
                 raise ValueError("Unexpected argument '{}' for macro '{}'".format(arg, self.ID))
         return args
 
-    def _extract_macro(self, section):
-        content = extract_tag(section)
-        content = decode_escaped_brackets(content)
-        # type is space-separated from rest of macro.
-        # Cursor macros have no space.
-        if ' ' in content:
-            macro_type, macro = content.split(' ', 1)
-        else:
-            macro_type, macro = (content, '')
-        return macro_type, macro
+    def parse_args(self, macro):
+        """ Returns the arguments of the macro as a dict. Called once per phrase, as parsed phrases are cached. """
+        return self._get_args(macro)
 
+    @abstractmethod
+    def expand(self, args):
+        """ Returns the text replacing the macro """
+        return ''
 
-    def process(self, sections):
-        for i, section in enumerate(sections):
-            # if MACRO_SPLIT_RE.match(section):
-            if KEY_SPLIT_RE.match(section):
-                macro_type, macro = self._extract_macro(sections[i])
-                if macro_type == self.ID:
-        # parts and i are required for cursor macros.
-                    sections = self.do_process(sections, i)
-        return sections
 
-    @abstractmethod
-    def do_process(self, sections, i):
-        """ Returns updated sections """
-        # parts and i are required for cursor macros.
-        return sections
+class CachingMacro(AbstractMacro):
+    """
+    Base class for macros whose results can be cached, using the optional cache and ttl arguments. Giving a ttl
+    enables the cache, unless cache=false is given as well.
+    """
+
+    OPTIONAL_ARGS = [("cache", _("Cache the result (true or false)")),
+                     ("ttl", _("Seconds to keep the cached result"))]
+    # Seconds to keep results cached with cache=true but without ttl
+    DEFAULT_TTL = math.inf
+
+    def __init__(self, cache: MacroResultCache):
+        self.cache = cache
+
+    def parse_args(self, macro):
+        args = self._get_args(macro)
+        if "cache" in args:
+            args["cache"] = parse_bool(args["cache"])
+        if "ttl" in args:
+            args["ttl"] = float(args["ttl"])
+        return args
+
+    def get_ttl(self, args) -> typing.Optional[float]:
+        """ Returns the seconds to keep the result cached, None if it must not be cached. """
+        if not args.get("cache", "ttl" in args):
+            return None
+        return args.get("ttl", self.DEFAULT_TTL)
 
 
 class CursorMacro(AbstractMacro):
@@ -191,14 +383,12 @@ class CursorMacro(AbstractMacro):
     TITLE = _("Position cursor")
     ARGS = []
 
-    def do_process(self, sections, i):
-        try:
-            lefts = len(''.join(sections[i+1:]))
-            sections.append(Key.LEFT * lefts)
-            sections[i] = ''
-        except IndexError:
-            pass
-        return sections
+    def parse_args(self, macro):
+        return {}
+
+    def expand(self, args):
+        # The cursor is positioned by MacroManager.process_expansion_macros(), once the whole phrase is expanded.
+        return ''
 
 
 class ScriptMacro(AbstractMacro):
@@ -225,6 +415,7 @@ class ScriptMacro(AbstractMacro):
     """
 
 
+    CONCURRENT = True
     ID = "script"
     TITLE = _("Run script")
     ARGS = [("name", _("Name")),
@@ -233,23 +424,27 @@ class ScriptMacro(AbstractMacro):
     def __init__(self, engine):
         self.engine = engine
 
-    def do_process(self, sections, i):
-        macro_type, macro = self._extract_macro(sections[i])
-        args = self._get_args(macro)
+    def expand(self, args):
         self.engine.run_script_from_macro(args)
-        sections[i] = self.engine._get_return_value()
-        return sections
+        return self.engine._get_return_value()
 
 
-class SystemMacro(AbstractMacro):
+class SystemMacro(CachingMacro):
     """
     C{<system>} - Runs a system command. The command's stdout is inserted into the snippet.
 
     C{System.exec_command(args["command"], getOutput=True)} is used to run the command.
 
     Example: C{<system command="ls -l">}
+
+    The output can be cached with the optional C{cache} and C{ttl} parameters. Giving C{cache=true} keeps it for a
+    minute, C{ttl} sets the number of seconds. Close to the end of that time, the output is returned from the cache
+    and the command is run again in the background. Failing commands are not cached.
+
+    Example: C{<system command="git config user.name" ttl=3600>}
     """
 
+    CONCURRENT = True
     ID = "system"
     TITLE = _("Run system command")
     ARGS = [("command", _("Command to be executed (including any arguments) - e.g. 'ls -l'")),]
@@ -257,15 +452,41 @@ class SystemMacro(AbstractMacro):
             #     value to the script's stdout (blocks until script finishes). If
             #     false, "))]
 
-    def __init__(self, engine):
+    DEFAULT_TTL = 60
+    # Fraction of the ttl after which cached output is refreshed in the background
+    REFRESH_AFTER = 0.8
+
+    def __init__(self, engine, cache: MacroResultCache=None, executor: Executor=None):
+        super().__init__(cache if cache is not None else MacroResultCache())
         self.engine = engine
+        self.executor = executor if executor is not None else Executor()
+
+    def expand(self, args):
+        ttl = self.get_ttl(args)
+        if ttl is None:
+            self.engine.run_system_command_from_macro(args)
+            return self.engine._get_return_value()
+        key = (self.ID, args["command"])
+        entry = self.cache.get(key, ttl=ttl)
+        if entry is not None:
+            if entry.age() >= ttl * self.REFRESH_AFTER and self.cache.start_refresh(key):
+                self.executor.submit(Executor.MACROS, self._refresh, key, args["command"])
+            return entry.value
+        try:
+            output = autokey.scripting.System.exec_command(args["command"], getOutput=True)
+        except Exception as e:
+            return "{ERROR: %s}" % str(e)
+        self.cache.put(key, output)
+        return output
 
-    def do_process(self, sections, i):
-        macro_type, macro = self._extract_macro(sections[i])
-        args = self._get_args(macro)
-        self.engine.run_system_command_from_macro(args)
-        sections[i] =  self.engine._get_return_value()
-        return sections
+    def _refresh(self, key, command: str):
+        try:
+            output = autokey.scripting.System.exec_command(command, getOutput=True)
+        except Exception:
+            # Keep the cached output until it expires
+            logger.exception("Unable to refresh the cached output of system macro '{}'".format(command))
+        else:
+            self.cache.put(key, output)
 
 
 class DateMacro(AbstractMacro):
@@ -283,16 +504,12 @@ class DateMacro(AbstractMacro):
     TITLE = _("Insert date")
     ARGS = [("format", _("Format"))]
 
-    def do_process(self, sections, i):
-        macro_type, macro = self._extract_macro(sections[i])
-        format_ = self._get_args(macro)["format"]
+    def expand(self, args):
         date = datetime.datetime.now()
-        date = date.strftime(format_)
-        sections[i] = date
-        return sections
+        return date.strftime(args["format"])
 
 
-class FileContentsMacro(AbstractMacro):
+class FileContentsMacro(CachingMacro):
     """
     C{<file>} - Inserts the contents of a file. Has a C{name} parameter that allows you to set the name of the file.
 
@@ -302,20 +519,39 @@ class FileContentsMacro(AbstractMacro):
     Typically, text editors dislike raw binary data, so only use text files.
 
     This can be used to include another Phrase by specifying its full file path and treating it like an ordinary file.
+
+    With the optional C{cache=true} parameter, the content is kept in memory and only read again when the modification
+    time or size of the file changes, or when the optional C{ttl} in seconds has passed.
+
+    Example: C{<file name="/home/user/signature.txt" cache=true>}
     """
 
+    CONCURRENT = True
     ID = "file"
     TITLE = _("Insert file contents")
     ARGS = [("name", _("File name"))]
 
-    def do_process(self, sections, i):
-        macro_type, macro = self._extract_macro(sections[i])
-        name = self._get_args(macro)["name"]
-
+    def __init__(self, cache: MacroResultCache=None):
+        super().__init__(cache if cache is not None else MacroResultCache())
+
+    def expand(self, args):
+        ttl = self.get_ttl(args)
+        if ttl is None:
+            return self._read(args["name"])
+        key = (self.ID, args["name"])
+        stat = os.stat(args["name"])
+        validator = (stat.st_mtime_ns, stat.st_size)
+        entry = self.cache.get(key, validator, ttl)
+        if entry is not None:
+            return entry.value
+        content = self._read(args["name"])
+        self.cache.put(key, content, validator)
+        return content
+
+    @staticmethod
+    def _read(name):
         with open(name, "r") as inputFile:
-            sections[i] = inputFile.read()
-
-        return sections
+            return inputFile.read()
 
 class ClipboardMacro(AbstractMacro):
     """
@@ -332,13 +568,11 @@ class ClipboardMacro(AbstractMacro):
     def __init__(self):
         self.clipboard = autokey.scripting.Clipboard()
 
-    def do_process(self, sections, i):
-        macro_type, macro = self._extract_macro(sections[i])
-        args = split_key_val(macro)
+    def parse_args(self, macro):
+        return split_key_val(macro)
+
+    def expand(self, args):
         if args.get("clipboard") and args.get("clipboard")=="selection":
-            sections[i] = self.clipboard.get_selection()
+            return self.clipboard.get_selection()
         else:
-            sections[i] = self.clipboard.get_clipboard()
-
-
-        return sections
\ No newline at end of file
+            return self.clipboard.get_clipboard()
\ No newline at end of file
@@ -0,0 +1,204 @@
+# Copyright (C) 2024 AutoKey contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compiled lookup structures used to find the items whose abbreviation was just typed.
+
+Instead of asking every item to partition the whole input buffer on each keystroke, all abbreviations are
+compiled into an Aho-Corasick automaton. The automaton is advanced by one state per typed character, and each state
+knows which abbreviations end at that position. The cost of a keystroke is therefore independent of the number of
+configured items.
+"""
+
+import collections
+import typing
+
+from autokey.model.triggermode import TriggerMode
+
+# Any item having abbreviations (Phrase, Script, Folder)
+AbbreviationItem = typing.Any
+# (insertion order, item, abbreviation length)
+Output = typing.Tuple[int, AbbreviationItem, int]
+
+
+class _Node:
+
+    __slots__ = ("children", "fail", "outputs")
+
+    def __init__(self):
+        self.children = {}  # type: typing.Dict[str, _Node]
+        self.fail = None  # type: typing.Optional[_Node]
+        # All abbreviations ending at this node, including those reached through the fail links
+        self.outputs = []  # type: typing.List[Output]
+
+    def add(self, abbreviation: str, output: Output):
+        node = self
+        for char in abbreviation:
+            node = node.children.setdefault(char, _Node())
+        node.outputs.append(output)
+
+    def link(self):
+        """Compute the fail links of the automaton rooted at this node. Must be called on the root node."""
+        queue = collections.deque()
+        for child in self.children.values():
+            child.fail = self
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for char, child in node.children.items():
+                child.fail = node.fail.step(char)
+                child.outputs.extend(child.fail.outputs)
+                queue.append(child)
+
+    def step(self, char: str) -> "_Node":
+        node = self
+        while True:
+            child = node.children.get(char)
+            if child is not None:
+                return child
+            if node.fail is None:
+                # Back at the root node
+                return node
+            node = node.fail
+
+
+# Automaton state after some input: (node in the case sensitive automaton, node in the case folded automaton)
+MatchState = typing.Tuple[_Node, _Node]
+
+
+class AbbreviationMatcher:
+    """
+    Aho-Corasick automaton over the abbreviations of the given items.
+
+    Items with ignoreCase set are stored lower-cased in a separate automaton, which is fed the lower-cased input.
+    The matcher only finds candidate items. Each candidate still has to be confirmed using its C{check_input()}
+    method, which also handles the window filter.
+    """
+
+    def __init__(self, items: typing.Iterable[AbbreviationItem]=()):
+        exact = _Node()
+        folded = _Node()
+        for index, item in enumerate(items):
+            if TriggerMode.ABBREVIATION not in item.modes:
+                continue
+            for abbreviation in item.abbreviations:
+                if not abbreviation:
+                    continue
+                if item.ignoreCase:
+                    folded.add(self._fold_case(abbreviation), (index, item, len(abbreviation)))
+                else:
+                    exact.add(abbreviation, (index, item, len(abbreviation)))
+        exact.link()
+        folded.link()
+        self.start = (exact, folded)  # type: MatchState
+
+    @staticmethod
+    def _fold_case(text: str) -> str:
+        # Only fold characters that keep their length, so that positions in the input stay aligned
+        return "".join(char.lower() if len(char.lower()) == 1 else char for char in text)
+
+    def advance(self, state: MatchState, char: str) -> MatchState:
+        exact, folded = state
+        return exact.step(char), folded.step(self._fold_case(char))
+
+    @staticmethod
+    def outputs(state: MatchState) -> typing.Iterator[Output]:
+        """Yield all abbreviations ending at the character that lead to the given state."""
+        exact, folded = state
+        yield from exact.outputs
+        yield from folded.outputs
+
+    def match(self, buffer: typing.Iterable[str]) -> typing.List[AbbreviationItem]:
+        """
+        Return the items having an abbreviation that ends at the end of the buffer (for immediate abbreviations)
+        or one character before it (followed by a trigger character), in the order the items were added.
+
+        This does not check the characters around the abbreviation. See L{InputState} for that.
+        """
+        before = after = self.start
+        for char in buffer:
+            before, after = after, self.advance(after, char)
+        found = {}  # type: typing.Dict[int, AbbreviationItem]
+        found.update((index, item) for index, item, _ in self.outputs(after) if item.immediate)
+        found.update((index, item) for index, item, _ in self.outputs(before) if not item.immediate)
+        return [found[index] for index in sorted(found)]
+
+
+class InputState:
+    """
+    Matching state kept alongside the input stack of the Service.
+
+    For every typed character, the automaton state after that character and whether the character is a
+    whitespace are stored. Typing a character advances the state by a single step, a backspace simply drops the last
+    entry. C{candidates()} uses this to check the trigger character and the character in front of each abbreviation,
+    without joining or re-scanning the typed input.
+    """
+
+    def __init__(self, maxlen: int):
+        self.matcher = None  # type: typing.Optional[AbbreviationMatcher]
+        # (typed character, is whitespace, automaton state after this character)
+        self._entries = collections.deque(maxlen=maxlen)  # type: typing.Deque[typing.Tuple[str, bool, MatchState]]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def reset(self, matcher: AbbreviationMatcher, typed: typing.Iterable[str]=()):
+        """Switch to the given matcher, for example after the configuration changed, and replay the typed input."""
+        self.matcher = matcher
+        self._entries.clear()
+        for char in typed:
+            self.push(char)
+
+    def clear(self):
+        self._entries.clear()
+
+    def push(self, char: str):
+        state = self._entries[-1][2] if self._entries else self.matcher.start
+        self._entries.append((char, char.isspace(), self.matcher.advance(state, char)))
+
+    def pop(self):
+        try:
+            self._entries.pop()
+        except IndexError:
+            # in case nothing was typed yet
+            pass
+
+    def follows_word_boundary(self, length: int) -> bool:
+        """
+        Return True, if the input in front of the last <length> typed characters is empty or ends with a whitespace.
+        """
+        if length >= len(self._entries):
+            return True
+        return self._entries[-length - 1][1]
+
+    def candidates(self) -> typing.List[AbbreviationItem]:
+        """
+        Return the items whose abbreviation was just typed, in the order the items were given to the matcher.
+        Immediate abbreviations must end at the last typed character, all others must be followed by exactly one
+        trigger character that does not match the item's word characters.
+        """
+        if not self._entries:
+            return []
+        char, _, after = self._entries[-1]
+        before = self._entries[-2][2] if len(self._entries) > 1 else self.matcher.start
+        found = {}  # type: typing.Dict[int, AbbreviationItem]
+        for index, item, length in self.matcher.outputs(after):
+            if item.immediate and (item.triggerInside or self.follows_word_boundary(length)):
+                found[index] = item
+        for index, item, length in self.matcher.outputs(before):
+            if not item.immediate and not item.wordChars.match(char) and \
+                    (item.triggerInside or self.follows_word_boundary(length + 1)):
+                found[index] = item
+        return [found[index] for index in sorted(found)]
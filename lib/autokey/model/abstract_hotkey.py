@@ -19,6 +19,7 @@ import typing
 from autokey.model.triggermode import TriggerMode
 from autokey.model.abstract_window_filter import AbstractWindowFilter
 from autokey.model.key import Key, UNIVERSAL_MODIFIERS, MAPPED_UNIVERSAL_MODIFIERS
+from autokey.model.hotkey_index import normalise_modifiers
 
 
 class AbstractHotkey(AbstractWindowFilter):
@@ -56,28 +57,34 @@ class AbstractHotkey(AbstractWindowFilter):
         if TriggerMode.HOTKEY in self.modes:
             self.modes.remove(TriggerMode.HOTKEY)
 
-    def check_hotkey_has_properties(self, modifiers, key, windowTitle):
+    def get_hotkey_combinations(self) -> typing.Set[typing.Tuple[typing.Tuple[Key, ...], str]]:
         """
-        This method is run whenever a key is pressed for all of the scripts in autokey
-
-        :param modifiers: The modifiers that were pressed when the key was pressed
-        :param key: The key that was pressed
-        :param windowTitle: The title of the window that was active when the key was pressed
-        :return Boolean: Whether or not the hotkey matches
+        Return the (modifiers, key) combinations triggering this hotkey, with normalised modifiers. If the hotkey
+        uses universal modifiers, like <ctrl>, the combinations using only their left or only their right variant
+        are included.
         """
         left_mods = []
         right_mods = []
         for modifier in self.modifiers:
-            if modifier in UNIVERSAL_MODIFIERS: # if one of the hotkey modifiers is universal. Generate a left and right version of the hotkey. the same way it does below and return if true?
+            if modifier in UNIVERSAL_MODIFIERS:
                 left_mods.append(MAPPED_UNIVERSAL_MODIFIERS[modifier][0])
                 right_mods.append(MAPPED_UNIVERSAL_MODIFIERS[modifier][1])
             else:
                 left_mods.append(modifier)
                 right_mods.append(modifier)
+        return {(normalise_modifiers(mods), self.hotKey) for mods in (self.modifiers, left_mods, right_mods)}
+
+    def check_hotkey_has_properties(self, modifiers, key, windowTitle):
+        """
+        This method is run whenever a key is pressed for all of the scripts in autokey
 
-        #print(modifiers, self.modifiers, left_mods, right_mods)
+        :param modifiers: The modifiers that were pressed when the key was pressed
+        :param key: The key that was pressed
+        :param windowTitle: The title of the window that was active when the key was pressed
+        :return Boolean: Whether or not the hotkey matches
+        """
         if self.hotKey is not None and self._should_trigger_window_title(windowTitle):
-            return (self.modifiers == modifiers or left_mods == modifiers or right_mods == modifiers) and (self.hotKey == key)
+            return (normalise_modifiers(modifiers), key) in self.get_hotkey_combinations()
         else:
             return False
 
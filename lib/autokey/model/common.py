@@ -18,6 +18,7 @@ import json
 from autokey.model.abstract_abbreviation import AbstractAbbreviation
 from autokey.model.abstract_window_filter import AbstractWindowFilter
 from autokey.model.abstract_hotkey import AbstractHotkey
+from autokey.model.concurrency import ConcurrencyPolicy
 from autokey.model.constants import JSON_FILE_PATTERN
 from autokey.model.triggermode import TriggerMode
 from autokey.model.helpers import get_safe_path
@@ -42,6 +43,7 @@ def get_serializable_scriptphrase(item):
         "description": item.description,
         "prompt": item.prompt,
         "omitTrigger": item.omitTrigger,
+        "concurrency": item.concurrency.value,
         }
     d.update(d2)
     return d
@@ -62,6 +64,7 @@ def inject_json_data_scriptphrase(item, data: dict):
     item.description = data["description"]
     item.prompt = data["prompt"]
     item.omitTrigger = data["omitTrigger"]
+    item.concurrency = ConcurrencyPolicy(data.get("concurrency", ConcurrencyPolicy.QUEUE.value))
     inject_json_data_base(item, data)
 
 
@@ -123,3 +126,4 @@ def copy_scriptphrase(item, source):
     item.parent = source.parent
     item.show_in_tray_menu = source.show_in_tray_menu
     item.prompt = source.prompt
+    item.concurrency = source.concurrency
@@ -0,0 +1,30 @@
+# Copyright (C) 2024 AutoKey contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import enum
+
+
+@enum.unique
+class ConcurrencyPolicy(enum.Enum):
+    """
+    Enumeration class for what happens when a phrase or script is triggered while it is still queued or running.
+
+    QUEUE: Run it again after the previous runs.
+    DROP: Ignore the new trigger.
+    REPLACE: Discard the queued runs and run it once, after the current run.
+    """
+    QUEUE = "queue"
+    DROP = "drop"
+    REPLACE = "replace"
@@ -0,0 +1,51 @@
+# Copyright (C) 2024 AutoKey contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Lookup table from pressed (modifiers, key) combinations to the items using that combination as their hotkey.
+"""
+
+import typing
+
+from autokey.model.key import Key
+
+# Any item having a hotkey (Phrase, Script, Folder, GlobalHotkey)
+HotkeyItem = typing.Any
+HotkeyCombination = typing.Tuple[typing.Tuple[Key, ...], str]
+
+
+class HotkeyIndex:
+    """
+    Maps each hotkey combination of the given items to the items using it, with universal modifiers already
+    expanded to their left and right variants. C{get()} only returns candidates that still have to pass their window
+    filter.
+    """
+
+    def __init__(self, items: typing.Iterable[HotkeyItem]=()):
+        self.items = tuple(items)  # type: typing.Tuple[HotkeyItem, ...]
+        self._index = {}  # type: typing.Dict[HotkeyCombination, typing.List[HotkeyItem]]
+        for item in self.items:
+            if item.hotKey is None:
+                continue
+            for combination in item.get_hotkey_combinations():
+                self._index.setdefault(combination, []).append(item)
+
+    def get(self, modifiers: typing.Iterable[Key], key: str) -> typing.List[HotkeyItem]:
+        """Return the items using the given combination, in the order the items were given."""
+        return self._index.get((normalise_modifiers(modifiers), key), [])
+
+
+def normalise_modifiers(modifiers: typing.Iterable[Key]) -> typing.Tuple[Key, ...]:
+    return tuple(sorted(modifiers))
@@ -0,0 +1,58 @@
+# Copyright (C) 2024 AutoKey contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import itertools
+import typing
+
+from autokey.model.abbreviation_matcher import AbbreviationMatcher
+from autokey.model.hotkey_index import HotkeyIndex
+from autokey.model.window_filter_cache import WindowFilterCache
+
+# Any configuration item (Phrase, Script, Folder, GlobalHotkey)
+Item = typing.Any
+
+
+class MatchingSnapshot(typing.NamedTuple("MatchingSnapshot", (
+        ("global_hotkeys", typing.Tuple[Item, ...]),
+        ("all_folders", typing.Tuple[Item, ...]),
+        ("all_items", typing.Tuple[Item, ...]),
+        ("hotkey_index", HotkeyIndex),
+        ("folder_hotkey_index", HotkeyIndex),
+        ("abbreviation_matcher", AbbreviationMatcher),
+        ("window_filters", WindowFilterCache)))):
+    """
+    Everything the expansion service needs to match key presses against the configuration.
+
+    A new snapshot is built whenever the configuration changes and replaces the previous one as a whole, so readers
+    can use the snapshot they fetched without locking while the next one is being built. The snapshot must not be
+    modified after it has been built.
+    """
+
+    @classmethod
+    def build(cls, global_hotkeys: typing.Iterable[Item], hotkey_folders: typing.Iterable[Item],
+              hotkey_items: typing.Iterable[Item], all_folders: typing.Iterable[Item],
+              all_items: typing.Iterable[Item]) -> "MatchingSnapshot":
+        all_folders = tuple(all_folders)
+        all_items = tuple(all_items)
+        return cls(
+            global_hotkeys=tuple(global_hotkeys),
+            all_folders=all_folders,
+            all_items=all_items,
+            hotkey_index=HotkeyIndex(hotkey_items),
+            folder_hotkey_index=HotkeyIndex(hotkey_folders),
+            # The matcher skips items without abbreviation trigger mode itself
+            abbreviation_matcher=AbbreviationMatcher(itertools.chain(all_folders, all_items)),
+            window_filters=WindowFilterCache(itertools.chain(all_folders, all_items))
+        )
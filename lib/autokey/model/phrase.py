@@ -21,6 +21,7 @@ import typing
 
 import autokey.model.helpers as helpers
 import autokey.model.common as model_common
+from autokey.model.concurrency import ConcurrencyPolicy
 from autokey.model.key import NAVIGATION_KEYS, Key, KEY_SPLIT_RE
 from autokey.model.triggermode import TriggerMode
 from autokey.model.abstract_abbreviation import AbstractAbbreviation
@@ -50,6 +51,7 @@ class Phrase(AbstractAbbreviation, AbstractHotkey, AbstractWindowFilter):
         self.parent = None
         self.show_in_tray_menu = False
         self.sendMode = SendMode.CB_CTRL_V
+        self.concurrency = ConcurrencyPolicy.QUEUE
         self.path = path
 
     def build_path(self, base_name=None):
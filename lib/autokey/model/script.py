@@ -21,6 +21,7 @@ import typing
 from pathlib import Path
 
 import autokey.model.common as model_common
+from autokey.model.concurrency import ConcurrencyPolicy
 from autokey.model.store import Store
 from autokey.model.triggermode import TriggerMode
 from autokey.model.abstract_abbreviation import AbstractAbbreviation
@@ -48,6 +49,9 @@ class Script(AbstractAbbreviation, AbstractHotkey, AbstractWindowFilter):
         self.omitTrigger = False
         self.parent = None
         self.show_in_tray_menu = False
+        self.concurrency = ConcurrencyPolicy.QUEUE
+        # Seconds after which the script is cancelled, 0 to let it run until it finishes
+        self.timeout = 0
         self.path = path
 
     def build_path(self, base_name=None):
@@ -70,6 +74,7 @@ class Script(AbstractAbbreviation, AbstractHotkey, AbstractWindowFilter):
         d2 = {
             "type": "script",
             "store": self.store,
+            "timeout": self.timeout,
         }
         d.update(d2)
         return d
@@ -131,6 +136,7 @@ class Script(AbstractAbbreviation, AbstractHotkey, AbstractWindowFilter):
     def inject_json_data(self, data: dict):
         model_common.inject_json_data_scriptphrase(self, data)
         self.store = Store(data["store"])
+        self.timeout = data.get("timeout", 0)
 
     def rebuild_path(self):
         model_common.rebuild_path(self)
@@ -142,6 +148,7 @@ class Script(AbstractAbbreviation, AbstractHotkey, AbstractWindowFilter):
         model_common.copy_scriptphrase(self, source_script)
         self.code = source_script.code
         self.omitTrigger = source_script.omitTrigger
+        self.timeout = source_script.timeout
 
     def get_tuple(self):
         return "text-x-python", self.description, self.get_abbreviations(), self.get_hotkey_string(), self
@@ -205,3 +212,24 @@ class ScriptErrorRecord:
         self.error_traceback = error_traceback
         self.start_time = start_time
         self.error_time = error_time
+
+
+class ScriptRunRecord:
+    """
+    This class holds the resources used by a finished run of a user Script, and how the run ended.
+    """
+    FINISHED = "finished"
+    ERROR = "error"
+    CANCELLED = "cancelled"
+    TIMEOUT = "timeout"
+
+    def __init__(self, script: typing.Union[Script, Path], outcome: str, start_time: datetime.time,
+                 wall_time: float, cpu_time: float, peak_memory: int):
+        self.script_name = script.description if isinstance(script, Script) else str(script)
+        self.outcome = outcome
+        self.start_time = start_time
+        # Seconds
+        self.wall_time = wall_time
+        self.cpu_time = cpu_time
+        # KiB
+        self.peak_memory = peak_memory
@@ -0,0 +1,73 @@
+# Copyright (C) 2024 AutoKey contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Memoized evaluation of the window filters of all items.
+"""
+
+import typing
+
+# Any item having a window filter (Phrase, Script, Folder)
+FilteredItem = typing.Any
+# autokey.sys_interface.abstract_interface.WindowInfo, not imported to keep the model independent of the interfaces
+WindowInfo = typing.Any
+
+
+class WindowFilterCache:
+    """
+    Evaluates the window filters of the given items once per window.
+
+    The applicable filter of each item, which may be inherited from a parent folder, is resolved when the cache is
+    built. Items sharing the same filter are grouped, so that each distinct regular expression is matched only once
+    per window. The result, the set of items whose filter matches the window, is kept for the last few windows.
+    """
+
+    # Number of windows to remember the matching items for
+    MAX_WINDOWS = 32
+
+    def __init__(self, items: typing.Iterable[FilteredItem]=()):
+        # IDs of all items having a filter. Items without filter match every window.
+        self._filtered = set()  # type: typing.Set[int]
+        patterns = {}  # type: typing.Dict[str, typing.Tuple[typing.Pattern, typing.List[int]]]
+        for item in items:
+            regex = item.get_applicable_regex()
+            if regex is None:
+                continue
+            self._filtered.add(id(item))
+            patterns.setdefault(regex.pattern, (regex, []))[1].append(id(item))
+        self._patterns = list(patterns.values())
+        self._matches = {}  # type: typing.Dict[typing.Tuple[str, str], typing.FrozenSet[int]]
+
+    def matching_items(self, window_info: WindowInfo) -> typing.FrozenSet[int]:
+        """Return the IDs of the items having a filter that matches the window title or class of the given window."""
+        key = (window_info.wm_title, window_info.wm_class)
+        try:
+            return self._matches[key]
+        except KeyError:
+            pass
+        matching = set()
+        for regex, item_ids in self._patterns:
+            if regex.match(window_info.wm_title) or regex.match(window_info.wm_class):
+                matching.update(item_ids)
+        if len(self._matches) >= self.MAX_WINDOWS:
+            self._matches.clear()
+        result = self._matches[key] = frozenset(matching)
+        return result
+
+    def filter(self, items: typing.Iterable[FilteredItem], window_info: WindowInfo) -> typing.List[FilteredItem]:
+        """Return the given items that may trigger in the given window, keeping their order."""
+        matching = self.matching_items(window_info)
+        filtered = self._filtered
+        return [item for item in items if id(item) not in filtered or id(item) in matching]
@@ -34,6 +34,19 @@ class AppService(QDBusAbstractAdaptor):
         '    <method name="run_folder">\n'
         '      <arg type="s" name="name" direction="in"/>\n'
         '    </method>\n'
+        '    <method name="get_executor_stats">\n'
+        '      <arg type="a{sv}" name="stats" direction="out"/>\n'
+        '    </method>\n'
+        '    <method name="get_running_scripts">\n'
+        '      <arg type="as" name="names" direction="out"/>\n'
+        '    </method>\n'
+        '    <method name="cancel_script">\n'
+        '      <arg type="s" name="name" direction="in"/>\n'
+        '      <arg type="i" name="cancelled" direction="out"/>\n'
+        '    </method>\n'
+        '    <method name="get_script_usage">\n'
+        '      <arg type="a{sv}" name="usage" direction="out"/>\n'
+        '    </method>\n'
         '  </interface>\n'
     )
 
@@ -62,3 +75,22 @@ class AppService(QDBusAbstractAdaptor):
     def run_folder(self, name):
         self.parent().service.run_folder(name)
 
+    @pyqtSlot(result="QVariantMap")
+    def get_executor_stats(self):
+        """Queue depth and wait times in seconds of the phrase and script jobs."""
+        return self.parent().service.executor.get_stats()
+
+    @pyqtSlot(result="QStringList")
+    def get_running_scripts(self):
+        return [run.script_name for run in self.parent().service.scriptRunner.supervisor.get_running()]
+
+    @pyqtSlot(str, result=int)
+    def cancel_script(self, name):
+        """Cancel all runs of the script with the given name. Returns the number of cancelled runs."""
+        return self.parent().service.scriptRunner.supervisor.cancel_script(name)
+
+    @pyqtSlot(result="QVariantMap")
+    def get_script_usage(self):
+        """CPU time in seconds used by the recent runs of each script."""
+        return self.parent().service.scriptRunner.get_script_usage()
+
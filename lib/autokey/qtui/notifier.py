@@ -42,6 +42,7 @@ class Notifier(QSystemTrayIcon):
         self.action_view_script_error = None  # type: QAction
         self.action_hide_icon = None  # type: QAction
         self.action_show_config_window = None  # type: QAction
+        self.action_cancel_scripts = None  # type: QAction
         self.action_quit = None  # type: QAction
         self.action_enable_monitoring = None  # type: QAction
 
@@ -125,6 +126,10 @@ class Notifier(QSystemTrayIcon):
             "configure", "&Show Main Window", self.app.show_configure,
             "Show the main AutoKey window. This does the same as left clicking the tray icon."
         )
+        self.action_cancel_scripts = self._create_action(
+            "process-stop", "&Cancel Running Scripts", self.cancel_running_scripts,
+            "Stop all scripts that are currently running."
+        )
         self.action_quit = self._create_action("application-exit", "Exit AutoKey", self.app.shutdown)
         # TODO: maybe import this from configwindow.py ? The exact same Action is defined in the main window.
         self.action_enable_monitoring = self._create_action(
@@ -174,6 +179,7 @@ class Notifier(QSystemTrayIcon):
         context_menu.addAction(self.action_enable_monitoring)
         context_menu.addAction(self.action_hide_icon)
         context_menu.addAction(self.action_show_config_window)
+        context_menu.addAction(self.action_cancel_scripts)
         context_menu.addAction(self.action_quit)
 
     def update_visible_status(self):
@@ -188,6 +194,9 @@ class Notifier(QSystemTrayIcon):
         self.action_view_script_error.setEnabled(True)
         self.showMessage("AutoKey Error", message)
 
+    def cancel_running_scripts(self):
+        self.app.service.scriptRunner.supervisor.cancel_all()
+
     def reset_tray_icon(self):
         """
         Slot function that resets the icon to the default, as configured in the settings.
@@ -0,0 +1,165 @@
+# Copyright (C) 2024 AutoKey contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Runs user scripts in separate worker processes, so that CPU-heavy scripts do not hold the GIL of the daemon.
+
+The scripting API objects stay in the daemon. The workers get proxies that send each method call over a socket to
+the daemon, where it is executed by the thread waiting for the script to finish. See autokey.sandbox_worker for the
+worker side.
+"""
+
+import os
+import pickle
+import queue
+import socket
+import subprocess
+import sys
+import threading
+import typing
+from multiprocessing.connection import Connection
+
+import autokey
+from autokey.supervisor import ResourceUsage, ScriptRun
+
+logger = __import__("autokey.logger").logger.get_logger(__name__)
+
+# Names of the scripting API objects proxied into the workers. The highlevel module is proxied as well, so that its
+# functions run in the daemon like for scripts that are not sandboxed.
+PROXIED_OBJECTS = ("keyboard", "mouse", "window", "clipboard", "engine", "store", "system", "dialog", "highlevel")
+
+
+class SandboxScriptError(Exception):
+    """Raised when a script fails in a worker process. The message is the formatted traceback from the worker."""
+
+    def __init__(self, message: str, usage: typing.Optional[ResourceUsage]=None):
+        super().__init__(message)
+        # Resources used by the script, if the worker survived
+        self.usage = usage
+
+
+class _Worker:
+
+    def __init__(self):
+        daemon_socket, worker_socket = socket.socketpair()
+        env = os.environ.copy()
+        # Make sure the worker imports the same autokey package as the daemon
+        package_root = os.path.dirname(os.path.dirname(os.path.abspath(autokey.__file__)))
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, (package_root, env.get("PYTHONPATH"))))
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "autokey.sandbox_worker", str(worker_socket.fileno())],
+            pass_fds=(worker_socket.fileno(),), env=env)
+        worker_socket.close()
+        self.connection = Connection(daemon_socket.detach())
+
+    def is_alive(self) -> bool:
+        return self.process.poll() is None
+
+    def run(self, name: str, source: str, scope: dict) -> ResourceUsage:
+        """Run the script and serve the calls it makes to the proxied objects until it finishes."""
+        self.connection.send(("run", name, source, {"__file__": scope.get("__file__")}))
+        while True:
+            message = self.connection.recv()
+            if message[0] == "call":
+                reply = self._call(scope, *message[1:])
+                try:
+                    self.connection.send(reply)
+                except (pickle.PicklingError, TypeError, AttributeError) as e:
+                    self.connection.send(("raise", RuntimeError(
+                        "The result of {}.{}() cannot be passed to a sandboxed script: {}".format(
+                            message[1], message[2], e))))
+            elif message[0] == "done":
+                return ResourceUsage(*message[1])
+            elif message[0] == "error":
+                raise SandboxScriptError(message[1], ResourceUsage(*message[2]))
+
+    @staticmethod
+    def _call(scope: dict, target: str, method: str, args: tuple, kwargs: dict) -> tuple:
+        try:
+            result = getattr(scope[target], method)(*args, **kwargs)
+        except Exception as e:
+            return "raise", e
+        return "result", result
+
+    def kill(self):
+        self.process.kill()
+
+    def stop(self):
+        try:
+            self.connection.send(("exit",))
+            self.connection.close()
+            self.process.wait(1)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+
+
+class SandboxPool:
+    """
+    A pool of worker processes running user scripts. The workers are started once and reused for all runs.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._idle = queue.Queue()  # type: queue.Queue[_Worker]
+        self._workers = []  # type: typing.List[_Worker]
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            while len(self._workers) < self.size:
+                worker = _Worker()
+                self._workers.append(worker)
+                self._idle.put(worker)
+        logger.info("Started {} script sandbox workers".format(self.size))
+
+    def run(self, name: str, source: str, scope: dict, run: ScriptRun=None) -> ResourceUsage:
+        """
+        Run the given script source in a worker, using the API objects in scope. Blocks until the script finishes.
+        If a script run is given, cancelling it terminates the worker.
+
+        :raise SandboxScriptError: If the script raised an exception
+        """
+        if not self._workers:
+            self.start()
+        worker = self._idle.get()
+        try:
+            if not worker.is_alive():
+                worker = self._replace(worker)
+            if run is not None:
+                run.set_cancel_handler(worker.kill)
+            return worker.run(name, source, scope)
+        except (EOFError, OSError) as e:
+            # The worker died, e.g. because the script called os._exit() or was cancelled. Replace it.
+            logger.warning("Script sandbox worker terminated while running {}".format(name))
+            worker = self._replace(worker)
+            raise SandboxScriptError("Script sandbox worker terminated: {!r}".format(e))
+        finally:
+            if run is not None:
+                run.set_cancel_handler(None)
+            self._idle.put(worker)
+
+    def _replace(self, worker: _Worker) -> _Worker:
+        worker.stop()
+        with self._lock:
+            self._workers.remove(worker)
+            worker = _Worker()
+            self._workers.append(worker)
+        return worker
+
+    def shutdown(self):
+        with self._lock:
+            for worker in self._workers:
+                worker.stop()
+            self._workers.clear()
@@ -0,0 +1,89 @@
+# Copyright (C) 2024 AutoKey contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Worker process of the script sandbox, started by autokey.sandbox with the file descriptor of its socket as argument.
+
+Keep the imports of this module minimal: the worker must not load the UI toolkits or connect to the display.
+"""
+
+import resource
+import sys
+import time
+import traceback
+from multiprocessing.connection import Connection
+
+from autokey.sandbox import PROXIED_OBJECTS
+
+
+class _Proxy:
+    """Forwards method calls to the scripting API object of the same name in the daemon."""
+
+    def __init__(self, connection: Connection, target: str):
+        self._connection = connection
+        self._target = target
+
+    def __getattr__(self, method: str):
+        if method.startswith("__"):
+            raise AttributeError(method)
+
+        def call(*args, **kwargs):
+            self._connection.send(("call", self._target, method, args, kwargs))
+            status, value = self._connection.recv()
+            if status == "raise":
+                raise value
+            return value
+
+        call.__name__ = method
+        return call
+
+
+def run(connection: Connection, name: str, source: str, variables: dict):
+    # Same names as autokey.service.ScriptRunner.scope, with proxies for the scripting API objects
+    scope = {"__name__": "__main__", "__builtins__": __builtins__, "time": time}
+    scope.update(variables)
+    for target in PROXIED_OBJECTS:
+        scope[target] = _Proxy(connection, target)
+    cpu_time = time.process_time()
+    peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    try:
+        exec(compile(source, name, "exec"), scope)
+    except BaseException:
+        error = traceback.format_exc()
+    else:
+        error = None
+    usage = (time.process_time() - cpu_time, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - peak_memory)
+    if error is None:
+        connection.send(("done", usage))
+    else:
+        connection.send(("error", error, usage))
+
+
+def main(fd: int):
+    connection = Connection(fd)
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            # The daemon exited
+            return
+        if message[0] == "exit":
+            return
+        if message[0] == "run":
+            run(connection, *message[1:])
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]))
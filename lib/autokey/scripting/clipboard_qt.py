@@ -4,6 +4,7 @@ QtClipboard Functions
 
 import threading
 
+from PyQt5.QtCore import QMimeData
 from PyQt5.QtGui import QClipboard, QImage
 from PyQt5.QtWidgets import QApplication
 from autokey.scripting.abstract_clipboard import AbstractClipboard
@@ -12,6 +13,24 @@ from pathlib import Path
 
 logger = __import__("autokey.logger").logger.get_logger(__name__)
 
+
+class _RequestedMimeData(QMimeData):
+    """
+    Text placed in the clipboard or selection, which reports each time its content is requested.
+    Qt retrieves the data when it serves the request of another application.
+    """
+
+    def __init__(self, text, on_request):
+        super().__init__()
+        self.setText(text)
+        self._on_request = on_request
+
+    def retrieveData(self, mime_type, preferred_type):
+        if self._on_request is not None and mime_type.startswith("text/"):
+            self._on_request()
+        return super().retrieveData(mime_type, preferred_type)
+
+
 class QtClipboard(AbstractClipboard):
     """
     Read/write access to the X selection and clipboard - QT version
@@ -45,6 +64,13 @@ class QtClipboard(AbstractClipboard):
         Qt semaphore object used for asynchronous method execution
         """
 
+        self.request_listener = None
+        """
+        Called with True for the selection and False for the clipboard whenever the text placed there is requested,
+        e.g. by the application pasting it. Qt does not tell which application requested it, so reads of clipboard
+        managers are reported as well.
+        """
+
     def fill_selection(self, contents):
         """
         Copy text into the X selection
@@ -63,7 +89,7 @@ class QtClipboard(AbstractClipboard):
 
         :param string: Value to change the selection to
         """
-        self.clipBoard.setText(string, QClipboard.Selection)
+        self.clipBoard.setMimeData(self.__create_mime_data(string, True), QClipboard.Selection)
         if self.app:
             self.sem.release()
 
@@ -115,10 +141,17 @@ class QtClipboard(AbstractClipboard):
             raise OSError
 
     def __fillClipboard(self, string):
-        self.clipBoard.setText(string, QClipboard.Clipboard)
+        self.clipBoard.setMimeData(self.__create_mime_data(string, False), QClipboard.Clipboard)
         if self.app:
             self.sem.release()
 
+    def __create_mime_data(self, string, selection):
+        if self.request_listener is None:
+            on_request = None
+        else:
+            on_request = lambda: self.request_listener(selection)
+        return _RequestedMimeData(string, on_request)
+
     def get_clipboard(self):
         """
         Read text from the clipboard
@@ -16,6 +16,7 @@
 """Engine backend for Autokey"""
 
 import pathlib
+import threading
 
 from collections.abc import Iterable
 
@@ -32,6 +33,20 @@ from autokey.scripting.system import System
 
 logger = __import__("autokey.logger").logger.get_logger(__name__)
 
+
+class _InvocationState(threading.local):
+    """
+    Arguments and return value of the script running in the current thread. Kept per thread, because the macros of
+    a phrase are expanded concurrently and the scripts run by them must not see each other's values.
+    """
+
+    def __init__(self):
+        self.macro_args = []
+        self.script_args = []
+        self.script_kwargs = {}
+        self.return_value = ''
+
+
 class Engine:
     """
     Provides access to the internals of AutoKey.
@@ -48,10 +63,7 @@ class Engine:
         self.configManager = config_manager
         self.runner = runner
         self.monitor = config_manager.app.monitor
-        self._macro_args = []
-        self._script_args = []
-        self._script_kwargs = {}
-        self._return_value = ''
+        self._invocation = _InvocationState()
         self._triggered_abbreviation = None  # type: Optional[str]
 
     def get_folder(self, title: str):
@@ -356,8 +368,8 @@ Folders created within temporary folders must themselves be set temporary")
             an absolute path to an existing file, that will be run instead.
         :raise Exception: if the specified script does not exist
         """
-        self._script_args = args
-        self._script_kwargs = kwargs
+        self._invocation.script_args = args
+        self._invocation.script_kwargs = kwargs
         path = pathlib.Path(description)
         path = path.expanduser()
         # Check if absolute path.
@@ -373,13 +385,13 @@ Folders created within temporary folders must themselves be set temporary")
                 self.runner.run_subscript(target_script)
             else:
                 raise Exception("No script with description '%s' found" % description)
-        return self._return_value
+        return self._invocation.return_value
 
     def run_script_from_macro(self, args):
         """
         Used internally by AutoKey for phrase macros
         """
-        self._macro_args = args["args"].split(',')
+        self._invocation.macro_args = args["args"].split(',')
 
         try:
             self.run_script(args["name"])
@@ -394,7 +406,7 @@ Folders created within temporary folders must themselves be set temporary")
         """
 
         try:
-            self._return_value = System.exec_command(args["command"], getOutput=True)
+            self._invocation.return_value = System.exec_command(args["command"], getOutput=True)
         except Exception as e:
             self.set_return_value("{ERROR: %s}" % str(e))
 
@@ -407,7 +419,7 @@ Folders created within temporary folders must themselves be set temporary")
         :return: the arguments
         :rtype: C{list[Any]}
         """
-        return self._script_args
+        return self._invocation.script_args
 
     def get_script_keyword_arguments(self):
         """
@@ -419,7 +431,7 @@ Folders created within temporary folders must themselves be set temporary")
         :return: the arguments
         :rtype: C{Dict[str, Any]}
         """
-        return self._script_kwargs
+        return self._invocation.script_kwargs
 
     def get_macro_arguments(self):
         """
@@ -430,7 +442,7 @@ Folders created within temporary folders must themselves be set temporary")
         :return: the arguments
         :rtype: C{list(str())}
         """
-        return self._macro_args
+        return self._invocation.macro_args
 
     def set_return_value(self, val):
         """
@@ -440,14 +452,14 @@ Folders created within temporary folders must themselves be set temporary")
 
         :param val: value to be stored
         """
-        self._return_value = val
+        self._invocation.return_value = val
 
     def _get_return_value(self):
         """
         Used internally by AutoKey for phrase macros
         """
-        ret = self._return_value
-        self._return_value = ''
+        ret = self._invocation.return_value
+        self._invocation.return_value = ''
         return ret
 
     def _set_triggered_abbreviation(self, abbreviation: str, trigger_character: str):
@@ -70,8 +70,7 @@ class Keyboard:
         :param key: the key to be sent (e.g. "s" or "<enter>")
         :param repeat: number of times to repeat the key event
         """
-        for _ in range(repeat):
-            self.mediator.send_key(key)
+        self.mediator.send_key_repeat(key, repeat)
         self.mediator.flush()
 
     def press_key(self, key):
@@ -13,11 +13,19 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-"""Basic window management. Requies C{wmctrl} and C{xrandr} to be installed."""
+"""
+Basic window management. Uses the EWMH hints of the window manager directly, and falls back to C{wmctrl} and
+C{xrandr} where they are not available.
+"""
 
 import re
 import subprocess
-import time
+
+from Xlib import error
+
+from autokey.sys_interface.ewmh import EwmhWindowManager
+
+logger = __import__("autokey.logger").logger.get_logger(__name__)
 
 
 # this regex extracts the pertinant data from wmctrl output, see test_window.py for more info
@@ -32,7 +40,7 @@ XRANDR_MONITOR_REGEX = r" (\d{3,4}).*?x(\d{3,4})\/.*?\+(\d{1,4})\+(\d{1,4})"
 
 class Window:
     """
-    Basic window management using wmctrl
+    Basic window management, with the same semantics as C{wmctrl}
 
     Note: in all cases where a window title is required (with the exception of wait_for_focus()),
     two special values of window title are permitted:
@@ -58,18 +66,7 @@ class Window:
         :rtype: boolean
         """
         regex = re.compile(title)
-        waited = 0
-        while waited <= timeOut:
-            if regex.match(self.mediator.windowInterface.get_window_title()):
-                return True
-
-            if timeOut == 0:
-                break  # zero length timeout, if not matched go straight to end
-
-            time.sleep(0.3)
-            waited += 0.3
-
-        return False
+        return self._wait_for(lambda: regex.match(self.mediator.windowInterface.get_window_title()), timeOut)
 
     def wait_for_exist(self, title, timeOut=5, by_hex=False):
         """
@@ -84,22 +81,15 @@ class Window:
         :param by_hex: If true, C{wmctrl} will interpret the C{title} as a hexid
         :rtype: boolean
         """
-        waited = 0
-        while waited <= timeOut:
-            windowList = self.get_window_list()
-            for window in windowList:
-                if by_hex:
-                    if title == window[0]: return True
-                else:
-                    if title == window[3]: return True
-
-            if timeOut == 0:
-                break  # zero length timeout, if not matched go straight to end
+        index = 0 if by_hex else 3
+        return self._wait_for(lambda: any(title == window[index] for window in self.get_window_list()), timeOut)
 
-            time.sleep(0.3)
-            waited += 0.3
-
-        return False
+    def _wait_for(self, predicate, timeOut):
+        """
+        Wait until the predicate is true. It is checked whenever the window interface reports a window change, or
+        every 0.3 seconds if the window interface does not report changes.
+        """
+        return self.mediator.windowInterface.window_changes.wait_for(predicate, timeOut)
 
     def activate(self, title, switchDesktop=False, matchClass=False, by_hex=False):
         """
@@ -114,6 +104,8 @@ class Window:
         :param matchClass: if True, match on the window class instead of the title
         :param by_hex: If true, C{wmctrl} will interpret the C{title} as a hexid
         """
+        if self._run_ewmh(title, matchClass, by_hex, EwmhWindowManager.activate, switchDesktop):
+            return
         if switchDesktop:
             xArgs = ["-a", title]
         else:
@@ -136,6 +128,8 @@ class Window:
         :param matchClass: if True, match on the window class instead of the title
         :param by_hex: If true, C{wmctrl} will interpret the C{title} as a hexid
         """
+        if self._run_ewmh(title, matchClass, by_hex, EwmhWindowManager.close):
+            return
         xArgs = ["-c", title]
         if matchClass:
             xArgs += ["-x"]
@@ -161,6 +155,8 @@ class Window:
         :param matchClass: if C{True}, match on the window class instead of the title
         :param by_hex: If true, C{wmctrl} will interpret the C{title} as a hexid
         """
+        if self._run_ewmh(title, matchClass, by_hex, EwmhWindowManager.move_resize, xOrigin, yOrigin, width, height):
+            return
         mvArgs = ["0", str(xOrigin), str(yOrigin), str(width), str(height)]
         xArgs = []
         if matchClass:
@@ -180,6 +176,8 @@ class Window:
         :param matchClass: if True, match on the window class instead of the title
         :param by_hex: If true, C{wmctrl} will interpret the C{title} as a hexid
         """
+        if self._run_ewmh(title, matchClass, by_hex, EwmhWindowManager.move_to_desktop, deskNum):
+            return
         xArgs = []
         if matchClass:
             xArgs += ["-x"]
@@ -195,6 +193,10 @@ class Window:
 
         :param deskNum: desktop to switch to (note: zero based)
         """
+        ewmh = self._get_ewmh()
+        if ewmh is not None:
+            ewmh.switch_desktop(deskNum)
+            return
         self._run_wmctrl(["-s", str(deskNum)])
 
     def set_property(self, title, action, prop, matchClass=False, by_hex=False):
@@ -227,7 +229,10 @@ class Window:
         :param prop: one of the properties listed above
         :param matchClass: if True, match on the window class instead of the title
         :param by_hex: If true, C{wmctrl} will interpret the C{title} as a hexid
+        :raises ValueError: If the action or property is invalid
         """
+        if self._run_ewmh(title, matchClass, by_hex, EwmhWindowManager.set_state, action, prop):
+            return
         xArgs = []
         if matchClass:
             xArgs += ["-x"]
@@ -237,7 +242,7 @@ class Window:
 
     def get_active_geometry(self):
         """
-        Get the geometry of the currently active window. Uses the C{:ACTIVE:} function of C{wmctrl}.
+        Get the geometry of the currently active window.
 
         Usage: C{window.get_active_geometry()}
 
@@ -271,7 +276,8 @@ class Window:
 
     def center_window(self, title=":ACTIVE:", win_width=None, win_height=None, monitor=0, matchClass=False, by_hex=False):
         """
-        Centers the active (or window selected by title) window. Requires xrandr for getting monitor sizes and offsets.
+        Centers the active (or window selected by title) window. Uses RandR, or the xrandr command, for getting
+        monitor sizes and offsets.
 
         :param title: Title of the window to center (defaults to using the active window)
         :param win_width: Width of the centered window, defaults to screenx/3. Use -1 to center without size change.
@@ -281,10 +287,13 @@ class Window:
         :raises ValueError: If title or desktop is not found by wmctrl
         :param by_hex: If true, C{wmctrl} will interpret the C{title} as a hexid
         """
-        #could also use Gdk.Display.get_default().get_montiors etc.
-        #Used xrandr for ease of cross Gtk/Qt use, wayland might require an alternate implementation
-        returncode, output = self._run_xrandr(["--listactivemonitors"])
-        matches = re.findall(XRANDR_MONITOR_REGEX, output, re.MULTILINE)
+        ewmh = self._get_ewmh()
+        matches = ewmh.get_monitors() if ewmh is not None else None
+        if not matches:
+            #could also use Gdk.Display.get_default().get_montiors etc.
+            #Used xrandr for ease of cross Gtk/Qt use, wayland might require an alternate implementation
+            returncode, output = self._run_xrandr(["--listactivemonitors"])
+            matches = re.findall(XRANDR_MONITOR_REGEX, output, re.MULTILINE)
 
         width = int(matches[monitor][0])
         height = int(matches[monitor][1])
@@ -305,6 +314,38 @@ class Window:
         #resize and move window
         self.resize_move(title, x_offset+top_x, y_offset+top_y, win_width, win_height, matchClass=matchClass, by_hex=by_hex)
 
+    def _get_ewmh(self, title=None):
+        """
+        Returns the in-process window manager backend, or None if C{wmctrl} has to be used instead, e.g. because
+        the window manager does not support EWMH or the window has to be selected by clicking on it.
+        """
+        ewmh = getattr(self.mediator.windowInterface, "ewmh", None)
+        if not isinstance(ewmh, EwmhWindowManager) or title == ":SELECT:":
+            return None
+        try:
+            return ewmh if ewmh.is_supported() else None
+        except error.XError:
+            logger.warning("Unable to read the window list from the window manager, using wmctrl", exc_info=True)
+            return None
+
+    def _run_ewmh(self, title, matchClass, by_hex, action, *args) -> bool:
+        """
+        Run the given L{EwmhWindowManager} method with the given arguments on the first window matching the title.
+        Returns False if the in-process backend is not available and C{wmctrl} has to be used instead.
+        """
+        ewmh = self._get_ewmh(title)
+        if ewmh is None:
+            return False
+        try:
+            window_id = ewmh.find_window(title, matchClass, by_hex)
+            if window_id is None:
+                logger.debug("No window matches {!r}".format(title))
+            else:
+                action(ewmh, window_id, *args)
+        except error.XError:
+            logger.warning("Window operation {} failed for {!r}".format(action.__name__, title), exc_info=True)
+        return True
+
     def _run_xrandr(self, args):
         try:
             with subprocess.Popen(["xrandr"] + args, stdout=subprocess.PIPE) as p:
@@ -327,7 +368,7 @@ class Window:
 
     def get_window_list(self, filter_desktop=-1):
         """
-        Returns a list of windows matching an optional desktop filter, requires C{wmctrl}!
+        Returns a list of windows matching an optional desktop filter.
 
         Each list item consists of: C{[hexid, desktop, hostname, title]}
 
@@ -342,15 +383,17 @@ class Window:
         :param filter_desktop: String, (usually 0-n) to filter the windows by. Any window not on the given desktop will not be returned.
         :return: C{[[hexid1, desktop1, hostname1, title1], [hexid2,desktop2,hostname2,title2], ...etc]} Returns C{[]} if no windows are found.
         """
-        returncode, output = self._run_wmctrl(["-lG"])
-        matches = re.findall(WMCTRL_GEOM_REGEX, output, re.MULTILINE)
+        ewmh = self._get_ewmh()
+        if ewmh is not None:
+            # Like the wmctrl output parsing below, skip windows shown on all desktops, which wmctrl lists on desktop -1
+            windows = [(client.hexid, str(client.desktop), client.hostname, client.title)
+                       for client in ewmh.get_clients() if client.desktop != -1]
+        else:
+            returncode, output = self._run_wmctrl(["-lG"])
+            matches = re.findall(WMCTRL_GEOM_REGEX, output, re.MULTILINE)
+            windows = [(match[0], match[1], match[6], match[7]) for match in matches]
         output = []
-        for match in matches:
-            hexid = match[0]
-            desktop = match[1]
-            hostname = match[6]
-            window_title = match[7]
-
+        for hexid, desktop, hostname, window_title in windows:
             if filter_desktop==desktop:
                 continue
             output.append((hexid,desktop,hostname, window_title))
@@ -376,7 +419,7 @@ class Window:
 
     def get_window_geometry(self, title, by_hex=False):
         """
-        Uses C{wmctrl} to return the window geometry of the given window title. Returns where the location of the
+        Returns the window geometry of the given window title. Returns where the location of the
         top left hand corner of the window is and the width/height of the window.
 
 
@@ -384,6 +427,9 @@ class Window:
         :return: C{[offsetx, offsety, sizex, sizey]} Returns none if no matches are found
         """
 
+        ewmh = self._get_ewmh(title)
+        if ewmh is not None:
+            return self._get_ewmh_geometry(ewmh, title, by_hex)
         index = -1 # by default use the window title for matching
         if by_hex:
             index = 0
@@ -400,3 +446,19 @@ class Window:
                 # convert to ints and return
                 return list(map(int, match[2:-2]))
         return None
+
+    @staticmethod
+    def _get_ewmh_geometry(ewmh, title, by_hex):
+        try:
+            if title == ":ACTIVE:":
+                window_id = ewmh.get_active_window()
+                client = ewmh.get_client(window_id) if window_id is not None else None
+            else:
+                client = next((client for client in ewmh.get_clients()
+                               if (client.hexid if by_hex else client.title) == title), None)
+        except error.XError:
+            logger.warning("Unable to read the geometry of {!r}".format(title), exc_info=True)
+            return None
+        if client is None:
+            return None
+        return [client.x, client.y, client.width, client.height]
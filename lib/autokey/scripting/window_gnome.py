@@ -32,13 +32,38 @@ class Window(AbstractWindow):
 
     def wait_for_focus(self, title, timeOut=5):
         """
+        Wait for window with the given title to have focus
+
+        Usage: C{window.wait_for_focus(title, timeOut=5)}
+
+        If the window becomes active, returns True. Otherwise, returns False if
+        the window has not become active by the time the timeout has elapsed.
+
+        :param title: title to match against (as a regular expression)
+        :param timeOut: period (seconds) to wait before giving up
+        :rtype: boolean
         """
-        raise NotImplementedError
+        regex = re.compile(title)
+        return self.mediator.windowInterface.window_changes.wait_for(
+            lambda: regex.match(self.mediator.windowInterface.get_window_title()), timeOut)
 
     def wait_for_exist(self, title, timeOut=5, by_hex=False):
         """
+        Wait for window with the given title to be created
+
+        Usage: C{window.wait_for_exist(title, timeOut=5)}
+
+        If the window is in existence, returns True. Otherwise, returns False if the window has not been created by the time the timeout has elapsed.
+
+        :param title: title to match against (exact match)
+        :param timeOut: period (seconds) to wait before giving up
+        :param by_hex: not supported for gnome extension
+        :rtype: boolean
         """
-        raise NotImplementedError
+        if by_hex:
+            raise NotImplementedError
+        return self.mediator.windowInterface.window_changes.wait_for(
+            lambda: any(window.get('wm_title') == title for window in self.get_window_list()), timeOut)
 
     def activate(self, title, switchDesktop=False, matchClass=False, by_hex=False):
         """
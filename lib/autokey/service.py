@@ -17,20 +17,31 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import builtins
 import collections
 import datetime
+import os
 import pathlib
-import threading
 import time
 import traceback
+import types
 import typing
 
 import autokey.model
+import autokey.model.folder
 import autokey.model.phrase
 import autokey.model.script
 import autokey.model.store
 from autokey.model.key import Key, KEY_FIND_RE
+from autokey.model.abbreviation_matcher import InputState
+from autokey.model.triggermode import TriggerMode
 from autokey.iomediator.iomediator import IoMediator
+from autokey.executor import Executor
+from autokey.code_cache import CodeCache
+from autokey.sandbox import SandboxPool, SandboxScriptError
+from autokey.supervisor import ScriptCancelled, ScriptRun, ScriptSupervisor
+from autokey.model.script import ScriptRunRecord
+from autokey.model.concurrency import ConcurrencyPolicy
 
 from autokey.macro import MacroManager
 
@@ -44,18 +55,25 @@ logger = __import__("autokey.logger").logger.get_logger(__name__)
 MAX_STACK_LENGTH = 150
 
 
-def threaded(f):
+def executed(lane: str, per_item: bool=True):
+    """
+    Runs the decorated method as a job in the given lane of the executor of the instance, instead of calling it
+    directly. If per_item is set, the first argument is the triggered item, whose concurrency policy is applied.
+    """
+    def decorator(f):
 
-    def wrapper(*args, **kwargs):
-        t = threading.Thread(target=f, args=args, kwargs=kwargs, name="Phrase-thread")
-        t.setDaemon(False)
-        t.start()
+        def wrapper(self, *args, **kwargs):
+            key = args[0] if per_item and args else None
+            policy = getattr(key, "concurrency", ConcurrencyPolicy.QUEUE)
+            self.executor.submit(lane, f, self, *args, key=key, policy=policy, **kwargs)
 
-    wrapper.__name__ = f.__name__
-    wrapper.__dict__ = f.__dict__
-    wrapper.__doc__ = f.__doc__
-    wrapper._original = f  # Store the original function for unit testing purposes.
-    return wrapper
+        wrapper.__name__ = f.__name__
+        wrapper.__dict__ = f.__dict__
+        wrapper.__doc__ = f.__doc__
+        wrapper._original = f  # Store the original function for unit testing purposes.
+        return wrapper
+
+    return decorator
 
 
 def synchronized(lock):
@@ -83,15 +101,18 @@ class Service:
         self.configManager = app.configManager
         ConfigManager.SETTINGS[cm_constants.SERVICE_RUNNING] = False
         self.mediator = None
+        self.scriptRunner = None
         self.app = app
         self.inputStack = collections.deque(maxlen=MAX_STACK_LENGTH)
+        self.inputState = InputState(MAX_STACK_LENGTH)
         self.lastStackState = ''
         self.lastMenu = None
         self.name = None
+        self.executor = Executor()
 
     def start(self):
         self.mediator = self.__start_new_IoMediator()
-        self.scriptRunner = ScriptRunner(self.mediator, self.app)
+        self.scriptRunner = ScriptRunner(self.mediator, self.app, self.executor)
         self.phraseRunner = PhraseRunner(self)
         ConfigManager.SETTINGS[cm_constants.SERVICE_RUNNING] = True
         autokey.model.store.Store.GLOBALS.update(ConfigManager.SETTINGS[cm_constants.SCRIPT_GLOBALS])
@@ -115,7 +136,10 @@ class Service:
 
     def shutdown(self, save=True):
         logger.info("Service shutting down")
+        # Let running phrases and scripts finish while the mediator can still send their output
+        self.executor.shutdown()
         if self.mediator is not None: self.mediator.shutdown()
+        if self.scriptRunner is not None: self.scriptRunner.sandbox.shutdown()
         if save:
             save_config(self.configManager)
             save_files(self.configManager)
@@ -123,7 +147,7 @@ class Service:
 
     def handle_mouseclick(self, rootX, rootY, relX, relY, button, windowTitle):
         # logger.debug("Received mouse click - resetting buffer")
-        self.inputStack.clear()
+        self.__clear_input()
         if autokey.common.ARGS.mouse_logging:
             logger.debug("Mouse click at root:("+str(rootX)+", "+str(rootY)+") Relative:("+str(relX)+","+str(relY)+") Button: "+str(button)+" In window: "+str(windowTitle))
         # If we had a menu and receive a mouse click, means we already
@@ -133,26 +157,30 @@ class Service:
         # Clear last to prevent undo of previous phrase in unexpected places
         self.phraseRunner.clear_last()
 
-    def __check_global_hotkeys(self, modifiers, rawKey, window_info):
-        for hotkey in self.configManager.globalHotkeys:
+    def __check_global_hotkeys(self, snapshot, modifiers, rawKey, window_info):
+        for hotkey in snapshot.global_hotkeys:
             hotkey.check_hotkey_has_properties(modifiers, rawKey, window_info)
 
-    def get_hotkey_with_properties(self, modifiers, rawKey, window_info):
-        for item in self.configManager.hotKeys:
-            if item.check_hotkey_has_properties(modifiers, rawKey, window_info):
-                return item
+    def get_hotkey_with_properties(self, modifiers, rawKey, window_info, snapshot=None):
+        if snapshot is None:
+            snapshot = self.configManager.matchingSnapshot
+        items = snapshot.hotkey_index.get(modifiers, rawKey)
+        for item in snapshot.window_filters.filter(items, window_info):
+            return item
         return None
 
-    def get_folder_with_properties(self, modifiers, rawKey, window_info):
-        for folder in self.configManager.hotKeyFolders:
-            if folder.check_hotkey_has_properties(modifiers, rawKey, window_info):
-                return folder
+    def get_folder_with_properties(self, modifiers, rawKey, window_info, snapshot=None):
+        if snapshot is None:
+            snapshot = self.configManager.matchingSnapshot
+        folders = snapshot.folder_hotkey_index.get(modifiers, rawKey)
+        for folder in snapshot.window_filters.filter(folders, window_info):
+            return folder
         return None
 
-    def __process_hotkey(self, modifiers, rawKey, window_info):
+    def __process_hotkey(self, snapshot, modifiers, rawKey, window_info):
         menu = None
         itemMatch = self.get_hotkey_with_properties(
-            modifiers, rawKey, window_info)
+            modifiers, rawKey, window_info, snapshot)
 
         if itemMatch is not None:
             logger.info(
@@ -165,7 +193,7 @@ class Service:
                 menu = ([], [itemMatch])
         else:
             folderMatch = self.get_folder_with_properties(
-                modifiers, rawKey, window_info)
+                modifiers, rawKey, window_info, snapshot)
             if folderMatch is not None: menu = ([folderMatch], [])
 
         if menu is not None:
@@ -177,71 +205,68 @@ class Service:
             self.app.show_popup_menu(*menu)
 
         if itemMatch is not None:
-            self.__tryReleaseLock()
             self.__processItem(itemMatch)
 
     def handle_keypress(self, rawKey, modifiers, key, window_info):
         logger.debug("Raw key: %r, modifiers: %r, Key: %s", rawKey, modifiers, key)
         logger.debug("Window visible title: %r, Window class: %r" % window_info)
-        self.configManager.lock.acquire()
+        # The configuration manager replaces the snapshot when the configuration changes, so keep using the one
+        # fetched here for the whole key press. No locking needed.
+        snapshot = self.configManager.matchingSnapshot
 
         # Check global hotkeys regardless of whether autokey is paused, because
         # might be hotkey to unpause.
-        self.__check_global_hotkeys(modifiers, rawKey, window_info)
+        self.__check_global_hotkeys(snapshot, modifiers, rawKey, window_info)
 
         if self.__shouldProcess(window_info):
-            self.__process_hotkey(modifiers, rawKey, window_info)
+            self.__process_hotkey(snapshot, modifiers, rawKey, window_info)
 
             modifierCount = len(modifiers)
             hotkey_uses_nonprinting_modifiers = modifierCount > 1 or \
                 (modifierCount == 1 and Key.SHIFT not in modifiers)
             if hotkey_uses_nonprinting_modifiers:
-                self.inputStack.clear()
-                self.__tryReleaseLock()
+                self.__clear_input()
                 return
 
             ### --- end of processing if non-printing modifiers are on --- ###
 
-            if self.__updateStack(key):
-                currentInput = ''.join(self.inputStack)
-                item, menu = self.__checkTextMatches([], self.configManager.abbreviations,
-                                                    currentInput, window_info, True)
-                if not item or menu:
-                    item, menu = self.__checkTextMatches(
-                        self.configManager.allFolders,
-                        self.configManager.allItems,
-                        currentInput, window_info)  # type: autokey.model.phrase.Phrase, list
-
-                if item:
-                    self.__tryReleaseLock()
-                    logger.info(
-                        'Matched {} "{}" having abbreviations "{}" against current input'.format(
-                        item.__class__.__name__,
-                            item.description,
-                            item.abbreviations))
-                    self.__processItem(item, currentInput)
-                elif menu:
-                    if self.lastMenu is not None:
-                        #self.lastMenu.remove_from_desktop()
-                        self.app.hide_menu()
-                    self.lastMenu = menu
-                    #self.lastMenu.show_on_desktop()
-                    self.app.show_popup_menu(*menu)
+            if self.__updateStack(key, snapshot.abbreviation_matcher):
+                # Only items having an abbreviation that was just typed can match, so skip building the input
+                # string if there is none.
+                candidates = self.inputState.candidates()
+                if candidates:
+                    candidateFolders = [c for c in candidates if isinstance(c, autokey.model.folder.Folder)]
+                    candidateItems = [c for c in candidates if not isinstance(c, autokey.model.folder.Folder)]
+                    currentInput = ''.join(self.inputStack)
+                    item, menu = self.__checkTextMatches(snapshot, [], candidateItems,
+                                                        currentInput, window_info, True)
+                    if not item or menu:
+                        item, menu = self.__checkTextMatches(
+                            snapshot,
+                            candidateFolders,
+                            candidateItems,
+                            currentInput, window_info)  # type: autokey.model.phrase.Phrase, list
+
+                    if item:
+                        logger.info(
+                            'Matched {} "{}" having abbreviations "{}" against current input'.format(
+                            item.__class__.__name__,
+                                item.description,
+                                item.abbreviations))
+                        self.__processItem(item, currentInput)
+                    elif menu:
+                        if self.lastMenu is not None:
+                            #self.lastMenu.remove_from_desktop()
+                            self.app.hide_menu()
+                        self.lastMenu = menu
+                        #self.lastMenu.show_on_desktop()
+                        self.app.show_popup_menu(*menu)
 
                 logger.debug("Input queue at end of handle_keypress: %s", self.inputStack)
 
-        self.__tryReleaseLock()
-
-    def __tryReleaseLock(self):
-        try:
-            if self.configManager.lock.locked():
-                self.configManager.lock.release()
-        except:
-            logger.exception("Ignored locking error in handle_keypress")
-
     def run_folder(self, name):
         folder = None
-        for f in self.configManager.allFolders:
+        for f in self.configManager.matchingSnapshot.all_folders:
             if f.title == name:
                 folder = f
 
@@ -265,13 +290,13 @@ class Service:
             self.scriptRunner.execute_script(script)
 
     def __findItem(self, name, objType, typeDescription):
-        for item in self.configManager.allItems:
+        for item in self.configManager.matchingSnapshot.all_items:
             if item.description == name and isinstance(item, objType):
                 return item
 
         raise Exception("No %s found with name '%s'" % (typeDescription, name))
 
-    @threaded
+    @executed(Executor.OUTPUT, per_item=False)
     def item_selected(self, item):
         time.sleep(0.25)  # wait for window to be active
         self.lastMenu = None # if an item has been selected, the menu has been hidden
@@ -289,7 +314,7 @@ class Service:
             extraKeys = ''
         return extraBs, extraKeys
 
-    def __updateStack(self, key):
+    def __updateStack(self, key, abbreviationMatcher):
         """
         Update the input stack in non-hotkey mode, and determine if anything
         further is needed.
@@ -310,14 +335,18 @@ class Service:
 
         elif len(key) > 1:
             # non-simple key
-            self.inputStack.clear()
+            self.__clear_input()
             self.phraseRunner.clear_last()
             return False
         else:
             # Key is a character
             self.phraseRunner.clear_last()
+            if self.inputState.matcher is not abbreviationMatcher:
+                # Configuration changed since the last key press
+                self.inputState.reset(abbreviationMatcher, self.inputStack)
             # if len(self.inputStack) == MAX_STACK_LENGTH, front items will removed for appending new items.
             self.inputStack.append(key)
+            self.inputState.push(key)
             return True
 
     def __map_special_key_to_escape_code(self, key):
@@ -335,8 +364,13 @@ class Service:
         except IndexError:
             # in case self.inputStack is empty
             pass
+        self.inputState.pop()
+
+    def __clear_input(self):
+        self.inputStack.clear()
+        self.inputState.clear()
 
-    def __checkTextMatches(self, folders, items, buffer, windowInfo, immediate=False):
+    def __checkTextMatches(self, snapshot, folders, items, buffer, windowInfo, immediate=False):
         """
         Check for an abbreviation/predictive match among the given folder and items
         (scripts, phrases).
@@ -345,16 +379,18 @@ class Service:
         """
         itemMatches = []
         folderMatches = []
+        windowFilters = snapshot.window_filters
 
-        for item in items:
-            if item.check_input(buffer, windowInfo):
+        # Same as check_input(), using the cached window filter results
+        for item in windowFilters.filter(items, windowInfo):
+            if TriggerMode.ABBREVIATION in item.modes and item._should_trigger_abbreviation(buffer):
                 if not item.prompt and immediate:
                     return item, None
                 else:
                     itemMatches.append(item)
 
-        for folder in folders:
-            if folder.check_input(buffer, windowInfo):
+        for folder in windowFilters.filter(folders, windowInfo):
+            if TriggerMode.ABBREVIATION in folder.modes and folder._should_trigger_abbreviation(buffer):
                 folderMatches.append(folder)
                 break # There should never be more than one folder match anyway
 
@@ -376,7 +412,7 @@ class Service:
         return windowInfo[0] != "Set Abbreviations" and self.is_running()
 
     def __processItem(self, item, buffer=''):
-        self.inputStack.clear()
+        self.__clear_input()
         self.lastStackState = ''
 
         if isinstance(item, autokey.model.phrase.Phrase):
@@ -415,13 +451,14 @@ class PhraseRunner:
 
     def __init__(self, service: Service):
         self.service = service
-        self.macroManager = MacroManager(service.scriptRunner.engine)
+        self.executor = service.executor
+        self.macroManager = MacroManager(service.scriptRunner.engine, service.executor)
         self.lastExpansion = None
         self.lastPhrase = None
         self.lastBuffer = None
         self.contains_special_keys = False
 
-    @threaded
+    @executed(Executor.OUTPUT)
     #@synchronized(iomediator.SEND_LOCK)
     def execute(self, phrase: autokey.model.phrase.Phrase, buffer=''):
         mediator = self.service.mediator  # type: IoMediator
@@ -487,56 +524,81 @@ class PhraseRunner:
 
 class ScriptRunner:
 
-    def __init__(self, mediator: IoMediator, app):
+    # Number of finished script runs whose resource usage is kept
+    MAX_RUN_RECORDS = 1000
+
+    def __init__(self, mediator: IoMediator, app, executor: Executor):
         self.mediator = mediator
         self.app = app
+        self.executor = executor
+        self.code_cache = CodeCache(os.path.join(autokey.common.CACHE_DIR, "__pycache__"))
+        # Worker processes for scripts, used if enabled in the settings. Started on the first sandboxed run.
+        self.sandbox = SandboxPool(Executor.SCRIPT_WORKERS)
         self.error_records = []  # type: typing.List[autokey.model.ScriptErrorRecord]
-        self.scope = globals()
-        self.scope["highlevel"] = autokey.scripting.highlevel
-        self.scope["keyboard"] = autokey.scripting.Keyboard(mediator)
-        self.scope["mouse"] = autokey.scripting.Mouse(mediator)
-        self.scope["system"] = autokey.scripting.System()
-        self.scope["window"] = autokey.scripting.Window(mediator)
-        self.scope["engine"] = autokey.scripting.Engine(app.configManager, self)
-
-        self.scope["dialog"] = autokey.scripting.Dialog()
-        self.scope["clipboard"] = autokey.scripting.Clipboard(app)
-
-        self.engine = self.scope["engine"]
+        self.run_records = collections.deque(maxlen=self.MAX_RUN_RECORDS)  # type: typing.Deque[ScriptRunRecord]
+        self.supervisor = ScriptSupervisor()
+        self.engine = autokey.scripting.Engine(app.configManager, self)
+        self._base_scope = {
+            "__name__": "__main__",
+            "__builtins__": builtins,
+            # Scripts used to run in a copy of the globals of this module, and many use time without importing it
+            "time": time,
+            "highlevel": autokey.scripting.highlevel,
+            "keyboard": autokey.scripting.Keyboard(mediator),
+            "mouse": autokey.scripting.Mouse(mediator),
+            "system": autokey.scripting.System(),
+            "window": autokey.scripting.Window(mediator),
+            "engine": self.engine,
+            "dialog": autokey.scripting.Dialog(),
+            "clipboard": autokey.scripting.Clipboard(app),
+        }
+        # Read-only view of the names available to every script
+        self.scope = types.MappingProxyType(self._base_scope)
 
     def clear_error_records(self):
         self.error_records.clear()
 
-    @threaded
+    def get_script_usage(self) -> typing.Dict[str, float]:
+        """Returns the CPU time in seconds used by the recorded runs of each script."""
+        usage = collections.Counter()  # type: typing.Counter[str]
+        for record in list(self.run_records):
+            usage[record.script_name] += record.cpu_time
+        return dict(usage)
+
+    @executed(Executor.SCRIPTS)
     def execute_script(self, script: autokey.model.script.Script, buffer=''):
         logger.debug("Script runner executing: %r, usageCount: %r", script, script.usageCount)
 
-        scope = self.scope.copy()
-        scope["store"] = script.store
+        scope = self._create_scope(store=script.store)
 
         backspaces, trigger_character = script.process_buffer(buffer)
         self.mediator.send_backspace(backspaces)
 
         self._set_triggered_abbreviation(scope, buffer, trigger_character)
         if script.path is not None:
-            # Overwrite __file__ to contain the path to the user script instead of the path to this service.py file.
             scope["__file__"] = script.path
         self._execute(scope, script)
 
         self.mediator.send_string(trigger_character)
 
-    @threaded
+    @executed(Executor.SCRIPTS)
     def execute_path(self, path: pathlib.Path):
         logger.debug("Script runner executing: {}".format(path))
-        scope = self.scope.copy()
-        # Overwrite __file__ to contain the path to the user script instead of the path to this service.py file.
-        scope["__file__"] = str(path.resolve())
+        scope = self._create_scope(__file__=str(path.resolve()))
         self._execute(scope, path)
 
-    def _record_error(self, script: typing.Union[autokey.model.script.Script, pathlib.Path], start_time: time.time):
+    def _create_scope(self, **variables) -> dict:
+        """Return a new global namespace for a script run, holding the scripting API and the given variables."""
+        return {**self._base_scope, **variables}
+
+    def _record_error(self, script: typing.Union[autokey.model.script.Script, pathlib.Path], start_time: time.time,
+                      traceback_str: str=None):
         error_time = datetime.datetime.now().time()
-        logger.exception("Script error")
-        traceback_str = traceback.format_exc()
+        if traceback_str is None:
+            logger.exception("Script error")
+            traceback_str = traceback.format_exc()
+        else:
+            logger.error("Script error\n{}".format(traceback_str))
         error_record = autokey.model.script.ScriptErrorRecord(
                 script=script, error_traceback=traceback_str, start_time=start_time, error_time=error_time
         )
@@ -545,18 +607,56 @@ class ScriptRunner:
 
     def _execute(self, scope, script: typing.Union[autokey.model.script.Script, pathlib.Path]):
         start_time = datetime.datetime.now().time()
+        if isinstance(script, autokey.model.script.Script):
+            run = self.supervisor.start(script.description, script.timeout)
+        else:
+            run = self.supervisor.start(str(script))
+        outcome = ScriptRunRecord.FINISHED
+        worker_usage = None
         # noinspection PyBroadException
         try:
-            compiled_code = self._compile_script(script)
-            exec(compiled_code, scope)
+            try:
+                if ConfigManager.SETTINGS[cm_constants.SCRIPT_SANDBOX]:
+                    script_code, script_name = ScriptRunner._get_script_source_code_and_name(script)
+                    worker_usage = self.sandbox.run(script_name, script_code, scope, run)
+                else:
+                    compiled_code = self._compile_script(script)
+                    exec(compiled_code, scope)
+            finally:
+                self.supervisor.finish(run, worker_usage)
+        except ScriptCancelled:
+            # Raised in this thread, possibly while finishing the run
+            self.supervisor.finish(run, worker_usage)
+            outcome = self._record_cancellation(script, run, start_time)
+        except SandboxScriptError as e:
+            if run.cancel_reason is not None:
+                outcome = self._record_cancellation(script, run, start_time)
+            else:
+                run.usage = e.usage or run.usage
+                outcome = ScriptRunRecord.ERROR
+                self._record_error(script, start_time, str(e))
         except Exception:  # Catch everything raised by the User code. Those Exceptions must not crash the thread.
             traceback.print_exc()
+            outcome = ScriptRunRecord.ERROR
             self._record_error(script, start_time)
+        self.run_records.append(ScriptRunRecord(
+            script, outcome, start_time, run.wall_time, run.usage.cpu_time, run.usage.peak_memory))
+        logger.debug("Script {} {} after {:.3f} s, using {:.3f} s CPU time and {} KiB additional memory".format(
+            run.script_name, outcome, run.wall_time, run.usage.cpu_time, run.usage.peak_memory))
+
+    def _record_cancellation(self, script: typing.Union[autokey.model.script.Script, pathlib.Path],
+                             run: ScriptRun, start_time: datetime.time) -> str:
+        if run.cancel_reason == ScriptRunRecord.TIMEOUT:
+            # A timeout indicates a bug in the script, so report it like an error
+            self._record_error(script, start_time, "Script timed out after {:g} seconds\n{}".format(
+                run.timeout, traceback.format_exc()))
+        else:
+            logger.info("Script {} cancelled".format(run.script_name))
+        return run.cancel_reason
 
-    @staticmethod
-    def _compile_script(script: typing.Union[autokey.model.script.Script, pathlib.Path]):
+    def _compile_script(self, script: typing.Union[autokey.model.script.Script, pathlib.Path]):
         script_code, script_name = ScriptRunner._get_script_source_code_and_name(script)
-        compiled_code = compile(script_code, script_name, 'exec')
+        compiled_code = self.code_cache.compile(script_code, script_name)
         return compiled_code
 
     @staticmethod
@@ -590,12 +690,10 @@ class ScriptRunner:
             engine._set_triggered_abbreviation(triggered_abbreviation, trigger_character)
 
     def run_subscript(self, script: typing.Union[autokey.model.script.Script, pathlib.Path]):
-        scope = self.scope.copy()
         if isinstance(script, autokey.model.script.Script):
-            scope["store"] = script.store
-            scope["__file__"] = str(script.path)
+            scope = self._create_scope(store=script.store, __file__=str(script.path))
         else:
-            scope["__file__"] = str(script.resolve())
+            scope = self._create_scope(__file__=str(script.resolve()))
 
         compiled_code = self._compile_script(script)
         exec(compiled_code, scope)
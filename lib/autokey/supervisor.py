@@ -0,0 +1,161 @@
+# Copyright (C) 2024 AutoKey contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Supervision of running user scripts: resource accounting, timeouts and cancellation.
+"""
+
+import ctypes
+import datetime
+import itertools
+import resource
+import threading
+import time
+import typing
+
+from autokey.model.script import ScriptRunRecord
+
+logger = __import__("autokey.logger").logger.get_logger(__name__)
+
+
+class ScriptCancelled(BaseException):
+    """
+    Raised in the thread running a script to stop it. It is not derived from Exception, so that the usual
+    "except Exception" blocks in user scripts do not swallow it.
+    """
+
+
+class ResourceUsage(typing.NamedTuple("ResourceUsage", (
+        ("cpu_time", float),
+        ("peak_memory", int)))):
+    """
+    Resources used by a script run. cpu_time is in seconds. peak_memory is the amount in KiB by which the run raised
+    the peak resident memory of the process running it. For scripts running in the daemon, this is shared with
+    everything else running at the same time.
+    """
+
+
+class ScriptRun:
+    """A running script, which can be cancelled from any thread."""
+
+    def __init__(self, run_id: int, script_name: str, timeout: float):
+        self.run_id = run_id
+        self.script_name = script_name
+        self.timeout = timeout
+        self.start_time = datetime.datetime.now().time()
+        self.thread_id = threading.get_ident()
+        # Reason the run was cancelled for, ScriptRunRecord.CANCELLED or ScriptRunRecord.TIMEOUT
+        self.cancel_reason = None  # type: typing.Optional[str]
+        # Stops the script. Replaced while the script runs in a sandbox worker.
+        self._cancel_handler = self._raise_in_thread  # type: typing.Optional[typing.Callable[[], None]]
+        self._lock = threading.Lock()
+        self._finished = False
+        self._timer = None  # type: typing.Optional[threading.Timer]
+        self._started = time.monotonic()
+        self._thread_time = time.thread_time()
+        self._peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.wall_time = 0.0
+        self.usage = ResourceUsage(0.0, 0)
+
+    def set_cancel_handler(self, handler: typing.Optional[typing.Callable[[], None]]):
+        with self._lock:
+            self._cancel_handler = handler
+
+    def cancel(self, reason: str=ScriptRunRecord.CANCELLED) -> bool:
+        """Stop the script. Returns False if it already finished or was cancelled before."""
+        with self._lock:
+            if self._finished or self.cancel_reason is not None:
+                return False
+            self.cancel_reason = reason
+            if self._cancel_handler is not None:
+                self._cancel_handler()
+        logger.info("Cancelling script {} ({})".format(self.script_name, reason))
+        return True
+
+    def _raise_in_thread(self):
+        # The exception is raised as soon as the thread executes Python code again. Blocking calls are not
+        # interrupted, but the scripting API only blocks for short periods at a time.
+        ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(self.thread_id), ctypes.py_object(ScriptCancelled))
+
+    def start_timer(self):
+        if self.timeout:
+            self._timer = threading.Timer(self.timeout, self.cancel, (ScriptRunRecord.TIMEOUT,))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def finish(self, worker_usage: typing.Optional[ResourceUsage]=None):
+        """
+        Mark the run as finished and take the resource usage. Must be called in the thread running the script.
+        Calling it again has no effect.
+        """
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+            if self._timer is not None:
+                self._timer.cancel()
+            # Discard a cancellation requested right before the script finished, if it was not raised yet
+            ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(self.thread_id), None)
+        self.wall_time = time.monotonic() - self._started
+        cpu_time = time.thread_time() - self._thread_time
+        peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - self._peak_memory
+        if worker_usage is not None:
+            # The thread of the daemon only served the calls of the script to the scripting API
+            cpu_time += worker_usage.cpu_time
+            peak_memory = worker_usage.peak_memory
+        self.usage = ResourceUsage(cpu_time, peak_memory)
+
+
+class ScriptSupervisor:
+    """
+    Keeps track of the running scripts, enforces their timeouts and cancels them on request.
+    """
+
+    def __init__(self):
+        self._runs = {}  # type: typing.Dict[int, ScriptRun]
+        self._run_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def start(self, script_name: str, timeout: float=0) -> ScriptRun:
+        """
+        Register a script run in the calling thread. A timeout of 0 means the script may run forever.
+        The returned run must be finished with finish().
+        """
+        with self._lock:
+            run = ScriptRun(next(self._run_ids), script_name, timeout)
+            self._runs[run.run_id] = run
+        run.start_timer()
+        return run
+
+    def finish(self, run: ScriptRun, worker_usage: typing.Optional[ResourceUsage]=None):
+        run.finish(worker_usage)
+        with self._lock:
+            self._runs.pop(run.run_id, None)
+
+    def get_running(self) -> typing.List[ScriptRun]:
+        with self._lock:
+            return list(self._runs.values())
+
+    def cancel(self, run_id: int) -> bool:
+        with self._lock:
+            run = self._runs.get(run_id)
+        return run is not None and run.cancel()
+
+    def cancel_script(self, script_name: str) -> int:
+        """Cancel all runs of the script with the given name. Returns the number of cancelled runs."""
+        return sum(run.cancel() for run in self.get_running() if run.script_name == script_name)
+
+    def cancel_all(self) -> int:
+        return sum(run.cancel() for run in self.get_running())
@@ -84,6 +84,12 @@ class AbstractSysInterface(ABC, metaclass=ABCMeta):
     def send_key(self, key_name):
         return
     @abstractmethod
+    def send_key_repeat(self, key_name, count):
+        """
+        Send the given key count times, as a single operation.
+        """
+        return
+    @abstractmethod
     def send_modified_key(self, key_name, modifiers):
         return
     @abstractmethod
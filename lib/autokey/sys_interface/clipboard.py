@@ -13,10 +13,24 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import concurrent.futures
+import mimetypes
+import os
+import queue
+import select
+import threading
+import time
+import typing
 from abc import ABC, ABCMeta, abstractmethod
+from pathlib import Path
+
+from Xlib import X, Xatom, display
+from Xlib.error import ConnectionClosedError
+from Xlib.protocol import event as xevent
 
 from autokey import common
 from autokey.scripting import Clipboard as APIClipboard
+from autokey.scripting.abstract_clipboard import AbstractClipboard as APIAbstractClipboard
 
 logger = __import__("autokey.logger").logger.get_logger(__name__)
 
@@ -48,8 +62,40 @@ class AbstractClipboard(ABC):
 
 class Clipboard(AbstractClipboard):
 
-    def __init__(self):
-        self.cb = APIClipboard()
+    def __init__(self, app=None, backend: APIAbstractClipboard=None):
+        """
+        :param app: The application instance, used by the clipboard of the UI toolkit
+        :param backend: The clipboard to use instead of the one of the UI toolkit, e.g. an L{XClipboard}
+        """
+        self.cb = backend if backend is not None else APIClipboard(app)
+        # Requests of other applications for the text placed in the clipboard (False) and selection (True)
+        self._requests = {False: 0, True: 0}
+        self._request_condition = threading.Condition()
+        # Only some backends see when other applications request the text they own
+        self.reports_requests = hasattr(self.cb, "request_listener")
+        if self.reports_requests:
+            self.cb.request_listener = self._report_request
+        # Backends that can't tell which application requested the text also report the requests of clipboard
+        # managers, which read new content as soon as it is set
+        self.identifies_requestors = getattr(self.cb, "identifies_requestors", False)
+
+    def _report_request(self, selection: bool):
+        with self._request_condition:
+            self._requests[selection] += 1
+            self._request_condition.notify_all()
+
+    def get_request_count(self, selection: bool=False) -> int:
+        """Returns the number of times the text placed in the clipboard or selection was requested."""
+        with self._request_condition:
+            return self._requests[selection]
+
+    def wait_for_request(self, count: int, selection: bool=False, timeout: float=None) -> bool:
+        """
+        Wait until the text placed in the clipboard or selection was requested more than count times, e.g. because
+        the application it is pasted into read it. Returns False if that did not happen within the timeout in seconds.
+        """
+        with self._request_condition:
+            return self._request_condition.wait_for(lambda: self._requests[selection] > count, timeout)
 
     @property
     def text(self):
@@ -64,3 +110,361 @@ class Clipboard(AbstractClipboard):
     @selection.setter
     def selection(self, new_content: str):
         self.cb.fill_selection(new_content)
+
+    def close(self):
+        """Stop the thread of the backend, if it has one."""
+        if isinstance(self.cb, XClipboard):
+            self.cb.close()
+
+
+class _Content(typing.NamedTuple("_Content", (
+        ("time", int),
+        ("text", typing.Optional[str]),
+        ("targets", typing.Dict[int, typing.Tuple[int, bytes]])))):
+    """
+    Content owned by the XClipboard: the server time at which the selection was acquired, the text, if any, and the
+    property type and data served for each target atom.
+    """
+
+
+class _Transfer:
+    """An incremental (INCR) transfer of content to a requestor window."""
+
+    def __init__(self, requestor, property_type: int, data: bytes, deadline: float):
+        self.requestor = requestor
+        self.property_type = property_type
+        self.data = data
+        self.offset = 0
+        self.deadline = deadline
+
+
+class XClipboard(APIAbstractClipboard):
+    """
+    Read/write access to the X selection and clipboard through a connection to the X server of its own.
+
+    A dedicated thread owns the selections and serves the requests of other applications, including incremental
+    (INCR) transfers of large content. So unlike the clipboards of the UI toolkits, it neither waits for nor blocks
+    the main loop of the UI.
+    """
+
+    # Content larger than this is transferred incrementally, in chunks of at most this size
+    MAX_CHUNK_SIZE = 256 * 1024
+    # Requests are reported for the application having the input focus only
+    identifies_requestors = True
+    # Seconds to wait for the owner of a selection when reading it, and for each step of an incremental transfer
+    TIMEOUT = 2
+
+    def __init__(self):
+        self.request_listener = None  # type: typing.Optional[typing.Callable[[bool], None]]
+        """
+        Called with True for the selection and False for the clipboard whenever an application requests the content
+        placed there, e.g. to paste it. Requests are only reported if they come from the application having the input
+        focus, so that clipboard managers copying the new content are not taken for pasting it.
+        """
+        self._display = display.Display()
+        self._display.set_error_handler(self._on_error)
+        self._window = self._display.screen().root.create_window(
+            -10, -10, 1, 1, 0, X.CopyFromParent, event_mask=X.PropertyChangeMask)
+        self._display.flush()
+        # Content of bigger requests is sent incrementally
+        self._chunk_size = min(self.MAX_CHUNK_SIZE, self._display.display.info.max_request_length * 4 - 32)
+        self._atoms = {}  # type: typing.Dict[str, int]
+        self._owned = {}  # type: typing.Dict[int, _Content]
+        self._transfers = {}  # type: typing.Dict[typing.Tuple[int, int], _Transfer]
+        self._commands = queue.Queue()
+        self._shutdown = False
+        # Writing to the wakeup pipe interrupts the select() call of the clipboard thread, see _next_event()
+        self._wakeup_read, self._wakeup_write = os.pipe()
+        self._thread = threading.Thread(target=self._run, name="Clipboard-thread", daemon=True)
+        self._thread.start()
+
+    def fill_clipboard(self, contents: str):
+        self._call(self._own, "CLIPBOARD", contents, self._text_targets(contents))
+
+    def get_clipboard(self):
+        text = self._call(self._read_text, "CLIPBOARD")
+        if text is None:
+            logger.warning("No text found on clipboard")
+            return ""
+        return text
+
+    def fill_selection(self, contents: str):
+        self._call(self._own, "PRIMARY", contents, self._text_targets(contents))
+
+    def get_selection(self):
+        text = self._call(self._read_text, "PRIMARY")
+        if text is None:
+            logger.warning("No text found in X selection")
+            return ""
+        return text
+
+    def set_clipboard_image(self, path: str):
+        image_path = Path(path).expanduser()
+        if not image_path.exists():
+            raise OSError("Image file not found")
+        mime_type = mimetypes.guess_type(str(image_path))[0]
+        if mime_type is None or not mime_type.startswith("image/"):
+            raise ValueError("Not an image file: {}".format(path))
+        self._call(self._own, "CLIPBOARD", None, {mime_type: (mime_type, image_path.read_bytes())})
+
+    def close(self):
+        """Stop the clipboard thread and close the connection. Selections owned are given up."""
+        self._shutdown = True
+        self._wake()
+        self._thread.join()
+        self._display.close()
+        os.close(self._wakeup_read)
+        os.close(self._wakeup_write)
+
+    @staticmethod
+    def _text_targets(text: str) -> typing.Dict[str, typing.Tuple[str, bytes]]:
+        """Returns the type and data served for the targets of the given text, by target name."""
+        utf8 = text.encode("utf-8")
+        latin1 = text.encode("latin-1", errors="replace")
+        return {
+            "UTF8_STRING": ("UTF8_STRING", utf8),
+            "text/plain;charset=utf-8": ("text/plain;charset=utf-8", utf8),
+            "TEXT": ("UTF8_STRING", utf8),
+            "STRING": ("STRING", latin1),
+            "text/plain": ("text/plain", latin1),
+        }
+
+    # Everything below runs in the clipboard thread
+
+    def _call(self, function: typing.Callable, *args):
+        """Run the function in the clipboard thread and return its result."""
+        if self._shutdown:
+            raise RuntimeError("The clipboard thread is not running")
+        future = concurrent.futures.Future()
+        self._commands.put_nowait((future, function, args))
+        self._wake()
+        return future.result()
+
+    def _wake(self):
+        try:
+            os.write(self._wakeup_write, b"\0")
+        except OSError:
+            # Pipe already closed during shutdown
+            pass
+
+    def _run(self):
+        while not self._shutdown:
+            try:
+                self._run_commands()
+                event = self._next_event(self._get_transfer_deadline())
+                if event is not None:
+                    self._handle_event(event)
+                self._expire_transfers()
+            except ConnectionClosedError:
+                logger.exception("Connection to the X server closed, the clipboard stops working")
+                break
+            except Exception:
+                logger.exception("Error in the clipboard thread")
+        self._shutdown = True
+        # Don't leave callers waiting for commands that will never run
+        while not self._commands.empty():
+            self._commands.get_nowait()[0].cancel()
+
+    def _run_commands(self):
+        while not self._commands.empty():
+            future, function, args = self._commands.get_nowait()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(function(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+    def _next_event(self, deadline: typing.Optional[float]):
+        """
+        Returns the next X event, or None if the deadline given as time.monotonic() value passed or the thread was
+        woken up before one arrived.
+        """
+        while not self._display.pending_events():
+            timeout = None if deadline is None else max(0, deadline - time.monotonic())
+            readable, _, _ = select.select([self._display, self._wakeup_read], [], [], timeout)
+            if self._wakeup_read in readable:
+                os.read(self._wakeup_read, 512)
+                return None
+            if not readable:
+                return None
+        return self._display.next_event()
+
+    def _wait_for(self, predicate: typing.Callable[[typing.Any], bool], timeout: float):
+        """
+        Handle the X events until one matching the predicate arrives, and return it. Returns None if none arrived
+        within the timeout in seconds.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            event = self._next_event(deadline)
+            if event is None:
+                continue
+            if predicate(event):
+                return event
+            self._handle_event(event)
+        return None
+
+    def _handle_event(self, event):
+        if event.type == X.SelectionRequest:
+            self._serve(event)
+        elif event.type == X.SelectionClear:
+            content = self._owned.get(event.atom)
+            # Ignore the loss of a previous ownership
+            if content is not None and event.time >= content.time:
+                del self._owned[event.atom]
+        elif event.type == X.PropertyNotify and event.state == X.PropertyDelete:
+            self._continue_transfer(event.window.id, event.atom)
+
+    def _on_error(self, error, request):
+        # Requestor windows may be gone by the time the request is served
+        logger.debug("X error in the clipboard thread: {}".format(error))
+
+    def _atom(self, name: str) -> int:
+        if name not in self._atoms:
+            self._atoms[name] = self._display.get_atom(name)
+        return self._atoms[name]
+
+    def _get_server_time(self) -> int:
+        """Returns the current server time, which is the time of an event caused by appending nothing to a property."""
+        time_property = self._atom("_AUTOKEY_TIMESTAMP")
+        self._window.change_property(time_property, Xatom.STRING, 8, b"", X.PropModeAppend)
+        self._display.flush()
+        event = self._wait_for(
+            lambda event: event.type == X.PropertyNotify and event.window.id == self._window.id
+            and event.atom == time_property,
+            self.TIMEOUT)
+        return X.CurrentTime if event is None else event.time
+
+    def _own(self, selection_name: str, text: typing.Optional[str],
+             targets: typing.Dict[str, typing.Tuple[str, bytes]]):
+        selection = self._atom(selection_name)
+        acquired = self._get_server_time()
+        self._window.set_selection_owner(selection, acquired)
+        if self._display.get_selection_owner(selection).id != self._window.id:
+            logger.warning("Could not acquire the {} selection".format(selection_name))
+            self._owned.pop(selection, None)
+            return
+        self._owned[selection] = _Content(acquired, text, {
+            self._atom(target): (self._atom(property_type), data)
+            for target, (property_type, data) in targets.items()})
+
+    def _serve(self, request):
+        """Answer the request of another application for the content of a selection owned."""
+        content = self._owned.get(request.selection)
+        # Obsolete clients don't name a property to store the content in
+        property_atom = request.property or request.target
+        requestor = request.requestor
+        served = False
+        if content is None or (request.time != X.CurrentTime and request.time < content.time):
+            property_atom = X.NONE
+        elif request.target == self._atom("TARGETS"):
+            targets = [self._atom("TARGETS"), self._atom("TIMESTAMP")] + list(content.targets)
+            requestor.change_property(property_atom, Xatom.ATOM, 32, targets)
+        elif request.target == self._atom("TIMESTAMP"):
+            requestor.change_property(property_atom, Xatom.INTEGER, 32, [content.time])
+        elif request.target in content.targets:
+            property_type, data = content.targets[request.target]
+            if len(data) > self._chunk_size:
+                # The transfer starts when the requestor deletes the INCR property
+                requestor.change_attributes(event_mask=X.PropertyChangeMask)
+                requestor.change_property(property_atom, self._atom("INCR"), 32, [len(data)])
+                self._transfers[(requestor.id, property_atom)] = _Transfer(
+                    requestor, property_type, data, time.monotonic() + self.TIMEOUT)
+            else:
+                requestor.change_property(property_atom, property_type, 8, data)
+            served = True
+        else:
+            property_atom = X.NONE
+        requestor.send_event(xevent.SelectionNotify(
+            time=request.time, requestor=requestor.id, selection=request.selection, target=request.target,
+            property=property_atom))
+        self._display.flush()
+        if served and self.request_listener is not None and self._is_focused_client(requestor.id):
+            self.request_listener(request.selection == Xatom.PRIMARY)
+
+    def _is_focused_client(self, window_id: int) -> bool:
+        """Returns True if the window belongs to the application having the input focus, or the focus is unknown."""
+        focus = self._display.get_input_focus().focus
+        if focus.id in (X.NONE, X.PointerRoot):
+            return True
+        # Resource IDs of the same client share the bits outside of the mask
+        mask = self._display.display.info.resource_id_mask
+        return window_id & ~mask == focus.id & ~mask
+
+    def _continue_transfer(self, window_id: int, property_atom: int):
+        """Send the next chunk of an incremental transfer, after the requestor deleted the previous one."""
+        transfer = self._transfers.get((window_id, property_atom))
+        if transfer is None:
+            return
+        chunk = transfer.data[transfer.offset:transfer.offset + self._chunk_size]
+        transfer.requestor.change_property(property_atom, transfer.property_type, 8, chunk)
+        transfer.offset += len(chunk)
+        transfer.deadline = time.monotonic() + self.TIMEOUT
+        if not chunk:
+            # The empty chunk ends the transfer
+            self._end_transfer(window_id, property_atom)
+        self._display.flush()
+
+    def _end_transfer(self, window_id: int, property_atom: int):
+        transfer = self._transfers.pop((window_id, property_atom))
+        if not any(requestor_id == window_id for requestor_id, _ in self._transfers):
+            transfer.requestor.change_attributes(event_mask=X.NoEventMask)
+
+    def _get_transfer_deadline(self) -> typing.Optional[float]:
+        return min((transfer.deadline for transfer in self._transfers.values()), default=None)
+
+    def _expire_transfers(self):
+        now = time.monotonic()
+        for key, transfer in list(self._transfers.items()):
+            if transfer.deadline <= now:
+                logger.debug("Incremental transfer to window {} timed out".format(hex(key[0])))
+                self._end_transfer(*key)
+
+    def _read_text(self, selection_name: str) -> typing.Optional[str]:
+        selection = self._atom(selection_name)
+        content = self._owned.get(selection)
+        if content is not None:
+            return content.text
+        for target, encoding in (("UTF8_STRING", "utf-8"), ("STRING", "latin-1")):
+            data = self._convert(selection, self._atom(target))
+            if data is not None:
+                return data.decode(encoding, errors="replace")
+        return None
+
+    def _convert(self, selection: int, target: int) -> typing.Optional[bytes]:
+        """Returns the content of a selection owned by another application, converted to the target."""
+        data_property = self._atom("_AUTOKEY_SELECTION")
+        self._window.convert_selection(selection, target, data_property, X.CurrentTime)
+        self._display.flush()
+        notify = self._wait_for(
+            lambda event: event.type == X.SelectionNotify and event.requestor.id == self._window.id
+            and event.selection == selection and event.target == target,
+            self.TIMEOUT)
+        if notify is None or notify.property == X.NONE:
+            return None
+        prop = self._pop_property(data_property)
+        if prop is None:
+            return None
+        if prop.property_type != self._atom("INCR"):
+            return bytes(prop.value)
+        # Deleting the INCR property asks for the first chunk, deleting each chunk for the next one
+        chunks = []
+        while True:
+            event = self._wait_for(
+                lambda event: event.type == X.PropertyNotify and event.window.id == self._window.id
+                and event.atom == data_property and event.state == X.PropertyNewValue,
+                self.TIMEOUT)
+            if event is None:
+                logger.warning("Incremental transfer of the selection timed out")
+                return None
+            prop = self._pop_property(data_property)
+            if prop is None or not prop.value:
+                return b"".join(chunks)
+            chunks.append(bytes(prop.value))
+
+    def _pop_property(self, property_atom: int):
+        prop = self._window.get_full_property(property_atom, X.AnyPropertyType)
+        self._window.delete_property(property_atom)
+        self._display.flush()
+        return prop
@@ -0,0 +1,407 @@
+# Copyright (C) 2024 AutoKey contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Window management through the Extended Window Manager Hints (EWMH) of the running window manager.
+
+This does in-process what C{wmctrl} and C{xrandr} do, using an existing python-xlib display connection, so that the
+scripting API does not have to start a process for every window operation.
+See https://specifications.freedesktop.org/wm-spec/latest/ for the protocol.
+"""
+
+import typing
+
+from Xlib import X, Xatom, error
+from Xlib.protocol import event
+
+from autokey.sys_interface.window_registry import WindowRegistry
+
+logger = __import__("autokey.logger").logger.get_logger(__name__)
+
+# Value of _NET_WM_DESKTOP for windows shown on all desktops
+ALL_DESKTOPS = 0xFFFFFFFF
+# Source indication of the client messages. Pagers and similar tools use 2, which window managers always obey.
+SOURCE_PAGER = 2
+# _NET_WM_STATE actions
+STATE_ACTIONS = {"remove": 0, "add": 1, "toggle": 2}
+
+
+class ClientWindow(typing.NamedTuple("ClientWindow", (
+        ("id", int),
+        ("desktop", int),
+        ("x", int),
+        ("y", int),
+        ("width", int),
+        ("height", int),
+        ("hostname", str),
+        ("title", str),
+        ("wm_class", str),
+        ("pid", int)))):
+    """A top-level window managed by the window manager, as listed by C{wmctrl -lGx}."""
+
+    @property
+    def hexid(self) -> str:
+        """The window ID in the format used by wmctrl"""
+        return "0x{:08x}".format(self.id)
+
+
+class EwmhWindowManager:
+    """
+    Queries and controls the top-level windows through the EWMH properties and client messages, like C{wmctrl}.
+
+    Windows are matched the way wmctrl matches them: by case-insensitive substring of the title or the window class,
+    by window ID, or using the special title C{:ACTIVE:}.
+
+    If a window registry is given, windows are looked up in the registry once it is seeded by an L{EwmhWindowTracker}.
+    """
+
+    def __init__(self, display, registry: typing.Optional[WindowRegistry]=None):
+        self.display = display
+        self.root = display.screen().root
+        self.registry = registry
+        self._supported = False
+
+    def is_supported(self) -> bool:
+        """Returns True if the running window manager publishes the client list."""
+        if not self._supported:
+            # Only positive results are kept, as the window manager may be started or replaced later on
+            self._supported = self._get_cardinals(self.root, "_NET_CLIENT_LIST", Xatom.WINDOW) is not None
+        return self._supported
+
+    def _use_registry(self) -> bool:
+        return self.registry is not None and self.registry.seeded
+
+    def get_client_ids(self) -> typing.List[int]:
+        if self._use_registry():
+            return self.registry.get_ids()
+        return self.query_client_ids()
+
+    def query_client_ids(self) -> typing.List[int]:
+        """Reads the client list from the X server."""
+        return list(self._get_cardinals(self.root, "_NET_CLIENT_LIST", Xatom.WINDOW) or ())
+
+    def get_clients(self) -> typing.List[ClientWindow]:
+        """Returns all managed windows, in the order of the client list."""
+        if self._use_registry():
+            return self.registry.get_windows()
+        clients = []
+        for window_id in self.get_client_ids():
+            client = self.get_client(window_id)
+            if client is not None:
+                clients.append(client)
+        return clients
+
+    def get_client(self, window_id: int) -> typing.Optional[ClientWindow]:
+        """Returns the given window, or None if it does not exist any more."""
+        if self._use_registry():
+            return self.registry.get(window_id)
+        return self.query_client(window_id)
+
+    def query_client(self, window_id: int) -> typing.Optional[ClientWindow]:
+        """Reads the given window from the X server. Returns None if it does not exist any more."""
+        client, offset = self.query_client_and_offset(window_id)
+        return client
+
+    def query_client_and_offset(
+            self, window_id: int) -> typing.Tuple[typing.Optional[ClientWindow], typing.Tuple[int, int]]:
+        """
+        Like L{query_client}, but also returns the position of the window relative to its parent, usually the frame
+        of the window manager.
+        """
+        window = self.display.create_resource_object("window", window_id)
+        try:
+            geometry = window.get_geometry()
+            # Like wmctrl, report the position of the window relative to its frame translated to root coordinates
+            position = self.root.translate_coords(window, geometry.x, geometry.y)
+            hostname = window.get_wm_client_machine()
+            if isinstance(hostname, bytes):
+                hostname = hostname.decode("utf-8", "replace")
+            client = ClientWindow(
+                id=window_id,
+                desktop=self.get_desktop(window_id),
+                x=position.x,
+                y=position.y,
+                width=geometry.width,
+                height=geometry.height,
+                hostname=hostname or "N/A",
+                title=self.get_title(window_id),
+                wm_class=self.get_class(window_id),
+                pid=self.get_pid(window_id)
+            )
+            return client, (geometry.x, geometry.y)
+        except error.XError:
+            logger.debug("Window 0x{:08x} vanished while reading its properties".format(window_id))
+            return None, (0, 0)
+
+    def get_title(self, window_id: int) -> str:
+        window = self.display.create_resource_object("window", window_id)
+        prop = window.get_full_property(self.display.get_atom("_NET_WM_NAME"), self.display.get_atom("UTF8_STRING"))
+        if prop is not None and prop.value:
+            value = prop.value
+        else:
+            value = window.get_wm_name()
+        # based on python3-xlib version, the value may be a bytes object, then decoding is necessary.
+        if isinstance(value, bytes):
+            value = value.decode("utf-8", "replace")
+        return value or ""
+
+    def get_class(self, window_id: int) -> str:
+        wm_class = self.display.create_resource_object("window", window_id).get_wm_class()
+        if wm_class:
+            return "{}.{}".format(wm_class[0], wm_class[1])
+        return ""
+
+    def get_pid(self, window_id: int) -> int:
+        """Returns the process ID of the given window, 0 if it is unknown."""
+        window = self.display.create_resource_object("window", window_id)
+        pid = self._get_cardinals(window, "_NET_WM_PID", Xatom.CARDINAL)
+        return pid[0] if pid else 0
+
+    def get_desktop(self, window_id: int) -> int:
+        """Returns the desktop of the given window, -1 if it is shown on all desktops or unknown."""
+        window = self.display.create_resource_object("window", window_id)
+        desktop = self._get_cardinals(window, "_NET_WM_DESKTOP", Xatom.CARDINAL)
+        if not desktop or desktop[0] == ALL_DESKTOPS:
+            return -1
+        return desktop[0]
+
+    def get_current_desktop(self) -> int:
+        desktop = self._get_cardinals(self.root, "_NET_CURRENT_DESKTOP", Xatom.CARDINAL)
+        return desktop[0] if desktop else 0
+
+    def get_active_window(self) -> typing.Optional[int]:
+        active = self._get_cardinals(self.root, "_NET_ACTIVE_WINDOW", Xatom.WINDOW)
+        return active[0] if active and active[0] != X.NONE else None
+
+    def find_window(self, title: str, match_class: bool=False, by_id: bool=False) -> typing.Optional[int]:
+        """
+        Returns the ID of the first window matching the given title, or None if there is no such window.
+
+        :param title: Case-insensitive substring of the window title, the window ID or C{:ACTIVE:}
+        :param match_class: If True, match the window class instead of the title
+        :param by_id: If True, the title is the window ID, in hexadecimal or decimal notation
+        """
+        if title == ":ACTIVE:":
+            return self.get_active_window()
+        client_ids = self.get_client_ids()
+        if by_id:
+            try:
+                window_id = int(title, 0)
+            except ValueError:
+                return None
+            return window_id if window_id in client_ids else None
+        wanted = title.casefold()
+        if self._use_registry():
+            for client in self.registry.get_windows():
+                if wanted in (client.wm_class if match_class else client.title).casefold():
+                    return client.id
+            return None
+        get_name = self.get_class if match_class else self.get_title
+        for window_id in client_ids:
+            try:
+                if wanted in get_name(window_id).casefold():
+                    return window_id
+            except error.XError:
+                continue
+        return None
+
+    def activate(self, window_id: int, switch_desktop: bool=False):
+        """
+        Activate the given window. If switch_desktop is True, switch to the desktop of the window, otherwise move the
+        window to the current desktop.
+        """
+        desktop = self.get_desktop(window_id)
+        if desktop != -1:
+            if switch_desktop:
+                self.switch_desktop(desktop)
+            else:
+                self.move_to_desktop(window_id, self.get_current_desktop())
+        self._send_message(window_id, "_NET_ACTIVE_WINDOW", (SOURCE_PAGER, X.CurrentTime))
+
+    def close(self, window_id: int):
+        self._send_message(window_id, "_NET_CLOSE_WINDOW", (X.CurrentTime, SOURCE_PAGER))
+
+    def move_resize(self, window_id: int, x: int=-1, y: int=-1, width: int=-1, height: int=-1):
+        """Move and resize the given window. Values of -1 are left unchanged."""
+        # The low byte is the gravity, 0 uses the gravity of the window.
+        flags = SOURCE_PAGER << 12
+        for bit, value in enumerate((x, y, width, height), 8):
+            if value != -1:
+                flags |= 1 << bit
+        # Negative values are sent in two's complement, as the data is packed as unsigned
+        values = (value & 0xFFFFFFFF for value in (x, y, width, height))
+        self._send_message(window_id, "_NET_MOVERESIZE_WINDOW", (flags, *values))
+
+    def move_to_desktop(self, window_id: int, desktop: int):
+        self._send_message(window_id, "_NET_WM_DESKTOP", (desktop, SOURCE_PAGER))
+
+    def switch_desktop(self, desktop: int):
+        self._send_message(self.root.id, "_NET_CURRENT_DESKTOP", (desktop, X.CurrentTime))
+
+    def set_state(self, window_id: int, action: str, prop: str):
+        """
+        Change the state of the given window, like C{wmctrl -b}.
+
+        :param action: One of add, remove or toggle
+        :param prop: One or two comma separated state names, like C{maximized_vert,maximized_horz}
+        :raise ValueError: If the action or properties are invalid
+        """
+        if action not in STATE_ACTIONS:
+            raise ValueError("Invalid window state action: {}".format(action))
+        names = prop.split(",")
+        if not 1 <= len(names) <= 2:
+            raise ValueError("Expected one or two window state properties, got: {}".format(prop))
+        atoms = [self.display.get_atom("_NET_WM_STATE_" + name.strip().upper()) for name in names]
+        if len(atoms) == 1:
+            atoms.append(0)
+        self._send_message(window_id, "_NET_WM_STATE", (STATE_ACTIONS[action], *atoms, SOURCE_PAGER))
+
+    def get_monitors(self) -> typing.Optional[typing.List[typing.Tuple[int, int, int, int]]]:
+        """
+        Returns the width, height, x and y offset of the active monitors in the order listed by
+        C{xrandr --listactivemonitors}, or None if the X server does not support RandR 1.5.
+        """
+        if not self.display.has_extension("RANDR"):
+            return None
+        try:
+            reply = self.root.get_monitors(True)
+        except (AttributeError, error.XError):
+            logger.debug("Unable to query the monitors through RandR", exc_info=True)
+            return None
+        return [(monitor.width_in_pixels, monitor.height_in_pixels, monitor.x, monitor.y)
+                for monitor in reply.monitors]
+
+    def _get_cardinals(self, window, name: str, property_type: int) -> typing.Optional[typing.List[int]]:
+        prop = window.get_full_property(self.display.get_atom(name), property_type)
+        return None if prop is None else list(prop.value)
+
+    def _send_message(self, window_id: int, message_type: str, data: typing.Sequence[int]):
+        message = event.ClientMessage(
+            window=window_id,
+            client_type=self.display.get_atom(message_type),
+            data=(32, (list(data) + [0] * 5)[:5])
+        )
+        self.root.send_event(message, event_mask=X.SubstructureRedirectMask | X.SubstructureNotifyMask)
+        self.display.flush()
+
+
+class EwmhWindowTracker:
+    """
+    Keeps a window registry current, using the events of a display connection that are passed to L{handle_event}.
+
+    The client list on the root window tells which windows exist. The property and structure events of each listed
+    window report changes of its title, class, desktop and geometry.
+    """
+
+    # Events selected on the listed windows
+    CLIENT_EVENT_MASK = X.PropertyChangeMask | X.StructureNotifyMask
+    # Window properties held in the registry
+    CLIENT_PROPERTIES = ("_NET_WM_NAME", "WM_NAME", "WM_CLASS", "_NET_WM_DESKTOP", "WM_CLIENT_MACHINE", "_NET_WM_PID")
+
+    def __init__(self, display, registry: WindowRegistry):
+        self.ewmh = EwmhWindowManager(display)
+        self.display = display
+        self.registry = registry
+        self._client_list_atom = display.get_atom("_NET_CLIENT_LIST")
+        self._client_atoms = {display.get_atom(name) for name in self.CLIENT_PROPERTIES}
+        # Position of each window relative to its parent, by window ID, to apply configure events without queries
+        self._offsets = {}  # type: typing.Dict[int, typing.Tuple[int, int]]
+
+    def start(self) -> bool:
+        """
+        Seed the registry. The root window must have the property change events selected on the same connection.
+        Does nothing if the window manager does not publish the client list.
+        Returns True if the windows are tracked, i.e. window changes are reported by events.
+        """
+        try:
+            if not self.ewmh.is_supported():
+                logger.info("The window manager does not support EWMH, not tracking windows")
+                return False
+            window_ids = self.ewmh.get_client_ids()
+            for window_id in window_ids:
+                self._select_events(window_id)
+            clients = []
+            for window_id in window_ids:
+                client, self._offsets[window_id] = self.ewmh.query_client_and_offset(window_id)
+                if client is not None:
+                    clients.append((window_id, client))
+            self.registry.seed(clients)
+        except error.XError:
+            logger.warning("Unable to read the window list", exc_info=True)
+            return False
+        return True
+
+    def handle_event(self, event) -> bool:
+        """Apply the given X event to the registry. Returns True if the registry was changed."""
+        if not self.registry.seeded:
+            return False
+        if event.type == X.PropertyNotify and event.window.id == self.ewmh.root.id:
+            return event.atom == self._client_list_atom and self._sync_client_list()
+        # Ignore the events of other windows, like the frames of the window manager
+        if self.registry.get(event.window.id) is None:
+            return False
+        if event.type == X.PropertyNotify:
+            if event.atom in self._client_atoms:
+                self._refresh(event.window.id)
+                return True
+        elif event.type == X.ConfigureNotify:
+            # Windows that are dragged or resized report their geometry continuously, so don't query the X server
+            self._configure(event)
+            return True
+        elif event.type == X.DestroyNotify:
+            self.registry.remove(event.window.id)
+            self._offsets.pop(event.window.id, None)
+            return True
+        return False
+
+    def _sync_client_list(self) -> bool:
+        window_ids = self.ewmh.query_client_ids()
+        known = set(self.registry.get_ids())
+        removed = known.difference(window_ids)
+        for window_id in removed:
+            self.registry.remove(window_id)
+            self._offsets.pop(window_id, None)
+        added = [window_id for window_id in window_ids if window_id not in known]
+        for window_id in added:
+            self._select_events(window_id)
+            self._refresh(window_id)
+        return bool(added or removed)
+
+    def _refresh(self, window_id: int):
+        client, self._offsets[window_id] = self.ewmh.query_client_and_offset(window_id)
+        if client is None:
+            self.registry.remove(window_id)
+            self._offsets.pop(window_id, None)
+        else:
+            self.registry.update(window_id, client)
+
+    def _configure(self, event):
+        """Apply the geometry of a configure event to the registry."""
+        window_id = event.window.id
+        client = self.registry.get(window_id)
+        offset_x, offset_y = self._offsets.get(window_id, (0, 0))
+        # The reported position is the root position of the window plus its position relative to its parent
+        if event.send_event:
+            # Sent by the window manager on moves, with the root position of the window
+            x, y = event.x + offset_x, event.y + offset_y
+        else:
+            # The position relative to the parent, whose position is unchanged
+            x, y = client.x + 2 * (event.x - offset_x), client.y + 2 * (event.y - offset_y)
+            self._offsets[window_id] = (event.x, event.y)
+        self.registry.update(window_id, client._replace(x=x, y=y, width=event.width, height=event.height))
+
+    def _select_events(self, window_id: int):
+        window = self.display.create_resource_object("window", window_id)
+        window.change_attributes(event_mask=self.CLIENT_EVENT_MASK, onerror=error.CatchError(error.BadWindow))
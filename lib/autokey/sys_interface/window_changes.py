@@ -0,0 +1,72 @@
+# Copyright (C) 2024 AutoKey contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Lets scripts wait for window conditions, like a window having the focus, without polling the window manager.
+"""
+
+import threading
+import time
+import typing
+
+
+class WindowChangeNotifier:
+    """
+    Wakes up the threads waiting for a window condition whenever the window interface reports a change of the active
+    window, its title or the window list.
+
+    Window interfaces enable the notifier while they deliver these notifications. Otherwise, waiting falls back to
+    polling the condition.
+    """
+
+    # Seconds between checks of the condition if no notifications are delivered
+    POLL_INTERVAL = 0.3
+
+    def __init__(self):
+        self.enabled = False
+        self._condition = threading.Condition()
+        self._changes = 0
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def notify(self):
+        with self._condition:
+            self._changes += 1
+            self._condition.notify_all()
+
+    def wait_for(self, predicate: typing.Callable[[], typing.Any], timeout: float) -> bool:
+        """
+        Wait until the predicate returns a true value, checking it initially and after each notification.
+        Returns False if the condition is still not met when the timeout in seconds has elapsed.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._condition:
+                # Changes reported while the predicate is checked are not lost, as they increase the counter
+                seen = self._changes
+            if predicate():
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if self.enabled:
+                with self._condition:
+                    self._condition.wait_for(lambda: self._changes != seen, remaining)
+            else:
+                time.sleep(min(self.POLL_INTERVAL, remaining))
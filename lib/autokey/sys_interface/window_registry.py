@@ -0,0 +1,72 @@
+# Copyright (C) 2024 AutoKey contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+In-memory list of the top-level windows, kept current from the window change events of the display server.
+"""
+
+import threading
+import typing
+
+# A window record. The X11 backend stores autokey.sys_interface.ewmh.ClientWindow tuples, the GNOME backend the
+# window descriptions sent by the extension.
+Window = typing.Any
+
+
+class WindowRegistry:
+    """
+    The top-level windows with their title, class, geometry and desktop, by window ID.
+
+    The registry is owned by the IoMediator and filled by the window interface, which seeds it once and then applies
+    the changes reported by the display server. Until it is seeded, readers have to query the windows themselves.
+    """
+
+    def __init__(self):
+        self._windows = {}  # type: typing.Dict[int, Window]
+        self._lock = threading.Lock()
+        self.seeded = False
+
+    def seed(self, windows: typing.Iterable[typing.Tuple[int, Window]]):
+        """Replace all windows by the given (window ID, window) pairs."""
+        with self._lock:
+            self._windows = dict(windows)
+            self.seeded = True
+
+    def reset(self):
+        """Forget all windows, e.g. because the connection to the display server was lost."""
+        with self._lock:
+            self._windows = {}
+            self.seeded = False
+
+    def update(self, window_id: int, window: Window):
+        with self._lock:
+            self._windows[window_id] = window
+
+    def remove(self, window_id: int):
+        with self._lock:
+            self._windows.pop(window_id, None)
+
+    def get(self, window_id: int) -> typing.Optional[Window]:
+        with self._lock:
+            return self._windows.get(window_id)
+
+    def get_ids(self) -> typing.List[int]:
+        with self._lock:
+            return list(self._windows)
+
+    def get_windows(self) -> typing.List[Window]:
+        """Returns all windows, in the order in which they were added."""
+        with self._lock:
+            return list(self._windows.values())
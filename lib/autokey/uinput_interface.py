@@ -45,6 +45,9 @@ class UInputInterface(threading.Thread, GnomeMouseReadInterface, AbstractSysInte
     """
 
     inv_map = {}
+    # Number of characters typed by send_string() between two pauses. Each pause lasts the configured delay times
+    # the number of events written since the previous one, so the total typing time matches a pause after every event.
+    SEND_BATCH_SIZE = 8
     char_map = {
         "/":"KEY_SLASH", "'":"KEY_APOSTROPHE", ",":"KEY_COMMA", ".":"KEY_DOT", ";":"KEY_SEMICOLON",
         "[":"KEY_LEFTBRACE", "]":"KEY_RIGHTBRACE", "\\":"KEY_BACKSLASH", "=":"KEY_EQUAL", "-":"KEY_MINUS", "`": "KEY_GRAVE",
@@ -188,6 +191,9 @@ class UInputInterface(threading.Thread, GnomeMouseReadInterface, AbstractSysInte
         #self.keyboard = None
         #self.mouse = None
         self.capabilities = None
+        # evdev key codes of the AutoKey hotkeys, see __get_hotkey_codes()
+        self.__hotkey_index = None
+        self.__hotkey_codes = {}
         time.sleep(1)
 
         # Event loop
@@ -226,6 +232,10 @@ class UInputInterface(threading.Thread, GnomeMouseReadInterface, AbstractSysInte
         self.inv_map = self.__reverse_mapping(e.keys)
         self.inv_autokey_map = self.__reverse_mapping(self.autokey_map)
         logger.debug("Inverted Map:", self.inv_map)
+        # evdev code and shift state of the characters, see __lookup_key()
+        self.__key_table = {}
+        for char in "\t\n" + "".join(map(chr, range(32, 127))):
+            self.__lookup_key(char)
 
         # Event listener
         self.listenerThread = threading.Thread(target=self.__flush_events_loop)
@@ -554,8 +564,28 @@ class UInputInterface(threading.Thread, GnomeMouseReadInterface, AbstractSysInte
             self.__send_key(string)
             return
 
-        for key in string:
-            self.__send_key(key)
+        logger.debug("Sending string: {!r}".format(string))
+        delay = self.get_delay()
+        shifted = False
+        events = 0
+        for count, key in enumerate(string, 1):
+            code, shift = self.__lookup_key(key)
+            # Keep shift pressed for consecutive shifted characters
+            if shift != shifted:
+                self.__write_key_event(self.shift_key, int(shift))
+                shifted = shift
+                events += 1
+            self.__write_key_event(code, 1)
+            self.__write_key_event(code, 0)
+            events += 2
+            # Give the compositor time to read the events before the kernel buffer of the device fills up
+            if count % self.SEND_BATCH_SIZE == 0:
+                time.sleep(delay * events)
+                events = 0
+        if shifted:
+            self.__write_key_event(self.shift_key, 0)
+            events += 1
+        time.sleep(delay * events)
 
     def paste_string(self, string, paste_command: SendMode):
         raise NotImplementedError
@@ -564,6 +594,27 @@ class UInputInterface(threading.Thread, GnomeMouseReadInterface, AbstractSysInte
     def send_key(self, key_name):
         self.__send_key(key_name)
 
+    @queue_method(queue)
+    def send_key_repeat(self, key_name, count):
+        logger.debug("Sending key {} {} times".format(key_name, count))
+        code, shifted = self.__lookup_key(key_name)
+        delay = self.get_delay()
+        events = 0
+        if shifted:
+            self.__write_key_event(self.shift_key, 1)
+            events += 1
+        for sent in range(1, count + 1):
+            self.__write_key_event(code, 1)
+            self.__write_key_event(code, 0)
+            events += 2
+            if sent % self.SEND_BATCH_SIZE == 0:
+                time.sleep(delay * events)
+                events = 0
+        if shifted:
+            self.__write_key_event(self.shift_key, 0)
+            events += 1
+        time.sleep(delay * events)
+
     @queue_method(queue)
     def send_evdev_code(self, type_, code, value):
         self.ui.write(type_, code, value)
@@ -574,27 +625,44 @@ class UInputInterface(threading.Thread, GnomeMouseReadInterface, AbstractSysInte
         """
         self.ui.write(type_, code, value)
 
+    def __lookup_key(self, key):
+        """
+        Returns the evdev code of the given key and whether shift has to be pressed to type it.
+        Single characters are looked up in the precomputed table, which is extended on demand.
+        """
+        try:
+            return self.__key_table[key]
+        except (KeyError, TypeError):
+            pass
+        evdev_keycode, shifted = self.translate_to_evdev(key)
+        result = (self.inv_map[e.keys[evdev_keycode]], shifted)
+        if type(key) == str and len(key) == 1:
+            self.__key_table[key] = result
+        return result
+
+    def __write_key_event(self, code, value):
+        self.ui.write(e.EV_MSC, e.MSC_SCAN, code)
+        self.ui.write(e.EV_KEY, code, value)
+        self.ui.write(e.EV_SYN, 0, 0)
+
     def __send_key(self, key, shifted=False, syn=True):
         # print(f"Writing {key}")
-        evdev_keycode, shifted_ = self.translate_to_evdev(key)
-        #print(key, evdev_keycode, shifted_)
-        evdev_key = e.keys[evdev_keycode]
+        code, shifted_ = self.__lookup_key(key)
         if shifted_:
             shifted=True
 
-        #print(f"Keycode: {evdev_keycode}, Key: {evdev_key}", shifted_, shifted)
-        logger.debug("Sending key: {}, Shifted: {}, Untranslated: {}".format(evdev_key, shifted_, key))
+        logger.debug("Sending key: {}, Shifted: {}, Untranslated: {}".format(e.keys[code], shifted_, key))
         if shifted:
             self.ui.write(e.EV_MSC, e.MSC_SCAN, self.shift_key)
             self.ui.write(e.EV_KEY, self.shift_key, 1)
             self.syn_raw()
 
-        self.ui.write(e.EV_MSC, e.MSC_SCAN, self.inv_map[evdev_key])
-        self.ui.write(e.EV_KEY, self.inv_map[evdev_key], 1)
+        self.ui.write(e.EV_MSC, e.MSC_SCAN, code)
+        self.ui.write(e.EV_KEY, code, 1)
         if syn : self.syn_raw()
 
-        self.ui.write(e.EV_MSC, e.MSC_SCAN, self.inv_map[evdev_key])
-        self.ui.write(e.EV_KEY, self.inv_map[evdev_key], 0)
+        self.ui.write(e.EV_MSC, e.MSC_SCAN, code)
+        self.ui.write(e.EV_KEY, code, 0)
         if syn : self.syn_raw()
 
         if shifted:
@@ -603,7 +671,6 @@ class UInputInterface(threading.Thread, GnomeMouseReadInterface, AbstractSysInte
             self.syn_raw()
 
     def get_delay(self):
-        #TODO does this need to be cached?
         return float(cm.ConfigManager.SETTINGS[cm_constants.DELAY])/1000
 
     @queue_method(queue)
@@ -624,24 +691,15 @@ class UInputInterface(threading.Thread, GnomeMouseReadInterface, AbstractSysInte
         self.__release_key(keyName, True)
 
     def __release_key(self, key, syn=False):
-        evdev_keycode, shifted_ = self.translate_to_evdev(key)
-        #print(key, evdev_keycode, shifted_)
-        evdev_key = e.keys[evdev_keycode]
-        if shifted_:
-            shifted=True
-
-        self.ui.write(e.EV_MSC, e.MSC_SCAN, self.inv_map[evdev_key])
-        self.ui.write(e.EV_KEY, self.inv_map[evdev_key], 0)
+        code, _ = self.__lookup_key(key)
+        self.ui.write(e.EV_MSC, e.MSC_SCAN, code)
+        self.ui.write(e.EV_KEY, code, 0)
         if syn: self.syn_raw()
 
     def  __press_key(self, key, syn=False):
-        evdev_keycode, shifted_ = self.translate_to_evdev(key)
-        #print(key, evdev_keycode, shifted_)
-        evdev_key = e.keys[evdev_keycode]
-        if shifted_:
-            shifted=True
-        self.ui.write(e.EV_MSC, e.MSC_SCAN, self.inv_map[evdev_key])
-        self.ui.write(e.EV_KEY, self.inv_map[evdev_key], 1)
+        code, _ = self.__lookup_key(key)
+        self.ui.write(e.EV_MSC, e.MSC_SCAN, code)
+        self.ui.write(e.EV_KEY, code, 1)
         if syn: self.syn_raw()
 
 
@@ -703,7 +761,6 @@ class UInputInterface(threading.Thread, GnomeMouseReadInterface, AbstractSysInte
 
     @queue_method(queue)
     def handle_keypress(self, keyCode):
-        window_info = self.mediator.windowInterface.get_window_info()
         event_type = evdev.categorize(keyCode)
         logger.debug("handle_keypress: KeyState:{}, Un:{}".format(event_type.keystate, event_type.keycode))
         if self.isModifier(event_type.keycode):
@@ -823,35 +880,42 @@ class UInputInterface(threading.Thread, GnomeMouseReadInterface, AbstractSysInte
         if len(key_list) < 2:
             return False
 
-        #  Convert the key_list from a list of tuples to a simple list of key codes:
-        key_list = [ x[1] for x in key_list ]
-        key_list.sort()
+        #  Convert the key_list from a list of tuples to a sorted tuple of key codes:
+        key_codes = tuple(sorted(x[1] for x in key_list))
 
-        #  Check each AutoKey hotkey contained in the configuration
-        for item in self.app.configManager.hotKeys + self.app.configManager.globalHotkeys:
+        #  Only the hotkeys using exactly these keys can match
+        window_info = None
+        for item in self.__get_hotkey_codes().get(key_codes, []):
 
             #  If this hotkey has a window filter which doesn't match the active
             #  window it can't be a match, iterate the loop.
             if item.windowInfoRegex != None:
-                window_info = self.mediator.windowInterface.get_window_info()
+                if window_info is None:
+                    window_info = self.mediator.windowInterface.get_window_info()
                 if not item.windowInfoRegex.match(window_info.wm_title):
                     continue
 
-            #  Convert this hotkey from a list of tuples to a simple list of
-            #  key codes so that we can compare it to the key_list
-            hotkey_codes = [self.translate_to_evdev(item.hotKey)]
-            for modifier in item.modifiers:
-                hotkey_codes.append(self.translate_to_evdev(modifier))
-            hotkey_codes = [ x[0] for x in hotkey_codes ]
-            hotkey_codes.sort()
-
-            #  Check if the hotkey_codes match the key_list we received
-            #logger.debug(f"Will block hotkey if key_list: {key_list} == hotkey_codes: {hotkey_codes}")
-            if key_list == hotkey_codes:
-                return True
+            return True
 
         return False
 
+    def __get_hotkey_codes(self):
+        """
+        Return a dict mapping the sorted evdev key codes of each AutoKey hotkey to the hotkeys using them. The dict
+        is built from the hotkey index of the configuration manager and rebuilt whenever that index is replaced.
+        """
+        snapshot = self.app.configManager.matchingSnapshot
+        if self.__hotkey_index is not snapshot.hotkey_index:
+            hotkey_codes = {}
+            for item in snapshot.hotkey_index.items + snapshot.global_hotkeys:
+                codes = [self.translate_to_evdev(item.hotKey)]
+                for modifier in item.modifiers:
+                    codes.append(self.translate_to_evdev(modifier))
+                hotkey_codes.setdefault(tuple(sorted(x[0] for x in codes)), []).append(item)
+            self.__hotkey_codes = hotkey_codes
+            self.__hotkey_index = snapshot.hotkey_index
+        return self.__hotkey_codes
+
     # def clear_queue(self):
     #     """Clear the current queue of events."""
     #     while not self.queue.empty():
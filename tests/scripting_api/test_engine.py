@@ -445,3 +445,22 @@ def test_run_script():
         dummy_folder = autokey.model.folder.Folder("dummy")
         script = get_autokey_dir() + "/tests/scripting_api/set_return_kwargs.py"
         assert_that(engine.run_script(script, arg1="arg 1"), is_(equal_to("arg 1")))
+
+
+def test_return_values_are_kept_per_thread(create_engine):
+    import threading
+    engine, folder = create_engine
+    results = {}
+    barrier = threading.Barrier(2)
+
+    def set_and_get(value):
+        engine.set_return_value(value)
+        barrier.wait(5)
+        results[value] = engine._get_return_value()
+
+    threads = [threading.Thread(target=set_and_get, args=(value,)) for value in ("first", "second")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert_that(results, is_(equal_to({"first": "first", "second": "second"})))
@@ -6,6 +6,7 @@ from hamcrest import *
 
 from autokey.scripting import Window
 from autokey.scripting.window import XRANDR_MONITOR_REGEX, WMCTRL_GEOM_REGEX
+from autokey.sys_interface.window_changes import WindowChangeNotifier
 
 import re
 
@@ -38,7 +39,9 @@ get_window_list_output_1 = [
 # get_window_list_output_2 = 
 
 def create_window():
-    win = Window(MagicMock())
+    mediator = MagicMock()
+    mediator.windowInterface.window_changes = WindowChangeNotifier()
+    win = Window(mediator)
     return win
 
 def test_window_wait_for_focus() -> Window:
@@ -0,0 +1,111 @@
+# Copyright (C) 2024 AutoKey contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import collections
+import itertools
+
+import pytest
+from hamcrest import *
+
+from autokey.model.abbreviation_matcher import AbbreviationMatcher, InputState
+from autokey.model.triggermode import TriggerMode
+from autokey.sys_interface.abstract_interface import WindowInfo
+from tests.test_phrase import create_phrase
+
+
+def create_phrases():
+    return [
+        create_phrase("plain", "xp@"),
+        create_phrase("immediate", "tri", trigger_immediately=True),
+        create_phrase("ignore case", "Br", ignore_case=True),
+        create_phrase("two abbreviations", ["ab", "abc"]),
+        create_phrase("shared suffix", "bc"),
+        create_phrase("hotkey only", "xp@", trigger_modes=[TriggerMode.HOTKEY]),
+    ]
+
+
+@pytest.mark.parametrize("typed, expected", [
+    ("xp@ ", ["plain"]),
+    ("xp@", []),
+    (" tri", ["immediate"]),
+    ("tri ", []),
+    (" bR.", ["ignore case"]),
+    (" BR.", ["ignore case"]),
+    ("abc ", ["two abbreviations", "shared suffix"]),
+    ("ab ", ["two abbreviations"]),
+    ("", []),
+])
+def test_match_returns_candidates_in_order(typed: str, expected: list):
+    matcher = AbbreviationMatcher(create_phrases())
+    assert_that(
+        [item.description for item in matcher.match(typed)],
+        is_(equal_to(expected))
+    )
+
+
+def test_match_accepts_input_stack():
+    matcher = AbbreviationMatcher(create_phrases())
+    stack = collections.deque("some text xp@\n", maxlen=150)
+    assert_that([item.description for item in matcher.match(stack)], is_(equal_to(["plain"])))
+
+
+def create_input_state(phrases, typed: str) -> InputState:
+    state = InputState(150)
+    state.reset(AbbreviationMatcher(phrases), typed)
+    return state
+
+
+def test_candidates_contain_every_triggering_item():
+    """The matchers may return false candidates, but must never miss an item that check_input() accepts."""
+    phrases = create_phrases()
+    phrases.append(create_phrase("inside word", "ri", trigger_immediately=True))
+    phrases[-1].triggerInside = True
+    matcher = AbbreviationMatcher(phrases)
+    window_info = WindowInfo("", "")
+    for length in range(1, 5):
+        for chars in itertools.product(" xp@tribBcaR.", repeat=length):
+            typed = "".join(chars)
+            candidates = matcher.match(typed)
+            state_candidates = create_input_state(phrases, typed).candidates()
+            for phrase in phrases:
+                if phrase.check_input(typed, window_info):
+                    message = "Missed {!r} for input {!r}".format(phrase.description, typed)
+                    assert_that(candidates, has_item(phrase), message)
+                    assert_that(state_candidates, has_item(phrase), message)
+
+
+@pytest.mark.parametrize("typed", [
+    "axp@ ",  # Abbreviation inside a word
+    "xp@a",  # Word character used as the trigger character
+    "xtri",  # Immediate abbreviation inside a word
+])
+def test_candidates_check_surrounding_characters(typed: str):
+    assert_that(create_input_state(create_phrases(), typed).candidates(), is_(empty()))
+
+
+def test_pop_rewinds_state():
+    state = create_input_state(create_phrases(), "xp@ ")
+    assert_that([item.description for item in state.candidates()], is_(equal_to(["plain"])))
+    state.pop()
+    state.push(".")
+    assert_that([item.description for item in state.candidates()], is_(equal_to(["plain"])))
+    state.pop()
+    state.pop()
+    state.push("@")
+    state.push("a")
+    assert_that(state.candidates(), is_(empty()))
+    state.clear()
+    state.pop()
+    assert_that(state.candidates(), is_(empty()))
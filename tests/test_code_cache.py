@@ -0,0 +1,83 @@
+# Copyright (C) 2024 AutoKey contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+from unittest.mock import patch
+
+from hamcrest import *
+
+from autokey.code_cache import CodeCache
+
+SOURCE = "result = 6 * 7\n"
+NAME = "/home/user/.config/autokey/data/My Scripts/answer.py"
+
+
+def run(code) -> dict:
+    scope = {}
+    exec(code, scope)
+    return scope
+
+
+def test_code_is_reused_in_memory():
+    cache = CodeCache()
+    code = cache.compile(SOURCE, NAME)
+    assert_that(run(code)["result"], is_(equal_to(42)))
+    assert_that(cache.compile(SOURCE, NAME), is_(same_instance(code)))
+    assert_that(cache.compile("result = 1\n", NAME), is_not(same_instance(code)))
+
+
+def test_memory_is_bounded():
+    cache = CodeCache()
+    for number in range(CodeCache.MAX_ENTRIES * 2):
+        cache.compile("result = {}\n".format(number), NAME)
+    assert_that(cache._entries, has_length(CodeCache.MAX_ENTRIES))
+
+
+def test_code_is_persisted(tmp_path):
+    CodeCache(str(tmp_path)).compile(SOURCE, NAME)
+    assert_that(os.listdir(str(tmp_path)), has_length(1))
+    with patch("autokey.code_cache.compile", side_effect=AssertionError("Compiled again")):
+        code = CodeCache(str(tmp_path)).compile(SOURCE, NAME)
+    assert_that(run(code)["result"], is_(equal_to(42)))
+    assert_that(code.co_filename, is_(equal_to(NAME)))
+
+
+def test_corrupted_file_is_ignored(tmp_path):
+    CodeCache(str(tmp_path)).compile(SOURCE, NAME)
+    for file_name in os.listdir(str(tmp_path)):
+        with open(os.path.join(str(tmp_path), file_name), "r+b") as cache_file:
+            cache_file.truncate(10)
+    assert_that(run(CodeCache(str(tmp_path)).compile(SOURCE, NAME))["result"], is_(equal_to(42)))
+
+
+def test_invalidate_removes_entries(tmp_path):
+    cache = CodeCache(str(tmp_path))
+    code = cache.compile(SOURCE, NAME)
+    cache.compile(SOURCE, "other.py")
+    cache.invalidate(NAME)
+    assert_that(os.listdir(str(tmp_path)), has_length(1))
+    assert_that(cache.compile(SOURCE, NAME), is_not(same_instance(code)))
+
+
+def test_previous_versions_are_removed_from_disk(tmp_path):
+    cache = CodeCache(str(tmp_path))
+    cache.compile(SOURCE, NAME)
+    cache.compile(SOURCE, "other.py")
+    for number in range(3):
+        cache.compile("result = {}\n".format(number), NAME)
+    assert_that(os.listdir(str(tmp_path)), has_length(2))
+    with patch("autokey.code_cache.compile", side_effect=AssertionError("Compiled again")):
+        code = CodeCache(str(tmp_path)).compile("result = 2\n", NAME)
+    assert_that(run(code)["result"], is_(equal_to(2)))
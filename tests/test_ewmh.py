@@ -0,0 +1,304 @@
+# Copyright (C) 2024 AutoKey contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import types
+from unittest.mock import MagicMock, patch
+
+import pytest
+from hamcrest import *
+
+from Xlib import X
+
+from autokey.sys_interface.ewmh import EwmhWindowManager, EwmhWindowTracker, SOURCE_PAGER
+from autokey.sys_interface.window_changes import WindowChangeNotifier
+from autokey.sys_interface.window_registry import WindowRegistry
+from autokey.scripting.window import Window
+
+ROOT = 0x100
+
+
+class FakeWindow:
+    """A window of the FakeDisplay, with its properties stored in the display."""
+
+    def __init__(self, display, window_id):
+        self.display = display
+        self.id = window_id
+
+    def _props(self):
+        return self.display.windows[self.id]
+
+    def get_full_property(self, atom, property_type):
+        value = self._props().get(self.display.atom_names[atom])
+        return None if value is None else types.SimpleNamespace(value=value)
+
+    def get_wm_name(self):
+        return self._props().get("WM_NAME")
+
+    def get_wm_class(self):
+        return self._props().get("WM_CLASS")
+
+    def get_wm_client_machine(self):
+        return self._props().get("WM_CLIENT_MACHINE")
+
+    def get_geometry(self):
+        x, y, width, height = self._props()["geometry"]
+        return types.SimpleNamespace(x=x, y=y, width=width, height=height)
+
+    def translate_coords(self, src_window, x, y):
+        return types.SimpleNamespace(x=x, y=y)
+
+    def send_event(self, event, event_mask=0):
+        self.display.sent.append(event)
+
+    def change_attributes(self, event_mask, onerror=None):
+        self.display.event_masks[self.id] = event_mask
+
+
+class FakeDisplay:
+
+    def __init__(self, windows):
+        self.windows = windows
+        self.atoms = {}
+        self.atom_names = {}
+        self.sent = []
+        self.event_masks = {}
+
+    def screen(self):
+        return types.SimpleNamespace(root=FakeWindow(self, ROOT))
+
+    def create_resource_object(self, kind, window_id):
+        return FakeWindow(self, window_id)
+
+    def get_atom(self, name):
+        if name not in self.atoms:
+            self.atoms[name] = len(self.atoms) + 1000
+            self.atom_names[self.atoms[name]] = name
+        return self.atoms[name]
+
+    def has_extension(self, name):
+        return False
+
+    def flush(self):
+        pass
+
+    def sent_messages(self):
+        """Returns the sent client messages as (window, message type, data) tuples."""
+        return [(event.window, self.atom_names[event.client_type], list(event.data[1])) for event in self.sent]
+
+
+def create_display():
+    return FakeDisplay({
+        ROOT: {
+            "_NET_CLIENT_LIST": [0x4c00007, 0x5600007, 0x5800001],
+            "_NET_ACTIVE_WINDOW": [0x5600007],
+            "_NET_CURRENT_DESKTOP": [1],
+        },
+        0x4c00007: {
+            "_NET_WM_NAME": "System Monitor", "WM_CLASS": ("gnome-system-monitor", "Gnome-system-monitor"),
+            "WM_CLIENT_MACHINE": "samdesktop", "_NET_WM_DESKTOP": [0], "geometry": (2164, 608, 752, 599),
+        },
+        0x5600007: {
+            "WM_NAME": "AutoKey", "WM_CLASS": ("autokey-qt", "Autokey-qt"),
+            "WM_CLIENT_MACHINE": "samdesktop", "_NET_WM_DESKTOP": [0xFFFFFFFF], "geometry": (660, 209, 960, 540),
+        },
+        0x5800001: {
+            "_NET_WM_NAME": "Terminal", "WM_CLASS": ("xterm", "XTerm"), "_NET_WM_DESKTOP": [2],
+            "geometry": (0, 0, 800, 600),
+        },
+    })
+
+
+def create_window(display):
+    mediator = MagicMock()
+    mediator.windowInterface.ewmh = EwmhWindowManager(display)
+    mediator.windowInterface.window_changes = WindowChangeNotifier()
+    return Window(mediator)
+
+
+@pytest.mark.parametrize("title, match_class, by_id, expected", [
+    ("system", False, False, 0x4c00007),
+    ("AUTOKEY", False, False, 0x5600007),
+    ("xterm", True, False, 0x5800001),
+    ("xterm", False, False, None),
+    ("0x05600007", False, True, 0x5600007),
+    (str(0x5800001), False, True, 0x5800001),
+    ("0x01234567", False, True, None),
+    ("not a number", False, True, None),
+    (":ACTIVE:", False, False, 0x5600007),
+])
+def test_find_window_matches_like_wmctrl(title, match_class, by_id, expected):
+    ewmh = EwmhWindowManager(create_display())
+    assert_that(ewmh.find_window(title, match_class, by_id), is_(equal_to(expected)))
+
+
+def test_get_window_list_keeps_wmctrl_format():
+    window = create_window(create_display())
+    with patch.object(Window, "_run_wmctrl") as wmctrl:
+        # The AutoKey window is shown on all desktops, and skipped like by the wmctrl output parsing
+        assert_that(window.get_window_list(), contains_exactly(
+            ("0x04c00007", "0", "samdesktop", "System Monitor"),
+            ("0x05800001", "2", "N/A", "Terminal"),
+        ))
+        assert_that(window.get_window_hex("Term"), is_(equal_to("0x05800001")))
+        wmctrl.assert_not_called()
+
+
+@pytest.mark.parametrize("title, by_hex, expected", [
+    ("System Monitor", False, [2164, 608, 752, 599]),
+    ("System", False, None),
+    (":ACTIVE:", False, [660, 209, 960, 540]),
+    ("0x05800001", True, [0, 0, 800, 600]),
+])
+def test_get_window_geometry(title, by_hex, expected):
+    window = create_window(create_display())
+    assert_that(window.get_window_geometry(title, by_hex), is_(equal_to(expected)))
+
+
+def test_resize_move_sends_only_given_values():
+    display = create_display()
+    window = create_window(display)
+    window.resize_move("Terminal", 10, -1, 400)
+    flags = 0x100 | 0x400 | SOURCE_PAGER << 12
+    assert_that(display.sent_messages(), contains_exactly(
+        (0x5800001, "_NET_MOVERESIZE_WINDOW", [flags, 10, 0xFFFFFFFF, 400, 0xFFFFFFFF])))
+
+
+def test_activate_moves_window_to_current_desktop():
+    display = create_display()
+    window = create_window(display)
+    window.activate("Terminal")
+    window.activate("system", switchDesktop=True)
+    assert_that(display.sent_messages(), contains_exactly(
+        (0x5800001, "_NET_WM_DESKTOP", [1, SOURCE_PAGER, 0, 0, 0]),
+        (0x5800001, "_NET_ACTIVE_WINDOW", [SOURCE_PAGER, X.CurrentTime, 0, 0, 0]),
+        (ROOT, "_NET_CURRENT_DESKTOP", [0, X.CurrentTime, 0, 0, 0]),
+        (0x4c00007, "_NET_ACTIVE_WINDOW", [SOURCE_PAGER, X.CurrentTime, 0, 0, 0]),
+    ))
+
+
+def test_set_property():
+    display = create_display()
+    window = create_window(display)
+    window.set_property(":ACTIVE:", "add", "maximized_vert,maximized_horz")
+    window.set_property("Terminal", "toggle", "above")
+    assert_that(display.sent_messages(), contains_exactly(
+        (0x5600007, "_NET_WM_STATE", [1, display.atoms["_NET_WM_STATE_MAXIMIZED_VERT"],
+                                      display.atoms["_NET_WM_STATE_MAXIMIZED_HORZ"], SOURCE_PAGER, 0]),
+        (0x5800001, "_NET_WM_STATE", [2, display.atoms["_NET_WM_STATE_ABOVE"], 0, SOURCE_PAGER, 0]),
+    ))
+    with pytest.raises(ValueError):
+        window.set_property("Terminal", "flip", "above")
+
+
+def test_unknown_window_sends_nothing():
+    display = create_display()
+    window = create_window(display)
+    window.close("No such window")
+    window.close("0x05600007", by_hex=True)
+    assert_that(display.sent_messages(), contains_exactly(
+        (0x5600007, "_NET_CLOSE_WINDOW", [X.CurrentTime, SOURCE_PAGER, 0, 0, 0])))
+
+
+def test_falls_back_to_wmctrl_without_ewmh_support():
+    display = create_display()
+    del display.windows[ROOT]["_NET_CLIENT_LIST"]
+    window = create_window(display)
+    with patch.object(Window, "_run_wmctrl", return_value=(0, "")) as wmctrl:
+        window.close("Terminal")
+        window.activate(":SELECT:")
+    assert_that(display.sent, is_(empty()))
+    assert_that(wmctrl.call_count, is_(equal_to(2)))
+
+
+def property_event(display, window_id, name):
+    return types.SimpleNamespace(
+        type=X.PropertyNotify, window=FakeWindow(display, window_id), atom=display.get_atom(name))
+
+
+def test_tracker_keeps_registry_current():
+    display = create_display()
+    registry = WindowRegistry()
+    tracker = EwmhWindowTracker(display, registry)
+    tracker.start()
+    assert_that([client.title for client in registry.get_windows()],
+                contains_exactly("System Monitor", "AutoKey", "Terminal"))
+    assert_that(display.event_masks, has_length(3))
+
+    # Title change of a listed window
+    display.windows[0x5800001]["_NET_WM_NAME"] = "vim"
+    assert_that(tracker.handle_event(property_event(display, 0x5800001, "_NET_WM_NAME")), is_(True))
+    assert_that(registry.get(0x5800001).title, is_(equal_to("vim")))
+    # Events of unlisted windows, like frames, are ignored
+    frame_event = types.SimpleNamespace(type=X.ConfigureNotify, window=FakeWindow(display, 0x200))
+    assert_that(tracker.handle_event(frame_event), is_(False))
+
+    # A window is closed and another one opened
+    display.windows[0x6000001] = {"_NET_WM_NAME": "Calculator", "geometry": (1, 2, 3, 4)}
+    display.windows[ROOT]["_NET_CLIENT_LIST"] = [0x4c00007, 0x5800001, 0x6000001]
+    assert_that(tracker.handle_event(property_event(display, ROOT, "_NET_CLIENT_LIST")), is_(True))
+    assert_that(registry.get_ids(), contains_exactly(0x4c00007, 0x5800001, 0x6000001))
+    assert_that(display.event_masks, has_key(0x6000001))
+    assert_that(tracker.handle_event(property_event(display, ROOT, "_NET_ACTIVE_WINDOW")), is_(False))
+
+    destroy_event = types.SimpleNamespace(type=X.DestroyNotify, window=FakeWindow(display, 0x6000001))
+    assert_that(tracker.handle_event(destroy_event), is_(True))
+    assert_that(registry.get(0x6000001), is_(none()))
+
+
+def test_window_queries_are_served_from_registry():
+    display = create_display()
+    registry = WindowRegistry()
+    EwmhWindowTracker(display, registry).start()
+    mediator = MagicMock()
+    mediator.windowInterface.ewmh = EwmhWindowManager(display, registry)
+    window = Window(mediator)
+    # Changes not reported by events are not visible, which shows that the X server is not queried
+    display.windows[0x5800001]["_NET_WM_NAME"] = "vim"
+    assert_that(window.get_window_hex("Terminal"), is_(equal_to("0x05800001")))
+    assert_that(window.get_window_geometry("Terminal"), is_(equal_to([0, 0, 800, 600])))
+    window.close("terminal")
+    assert_that(display.sent_messages(), contains_exactly(
+        (0x5800001, "_NET_CLOSE_WINDOW", [X.CurrentTime, SOURCE_PAGER, 0, 0, 0])))
+
+
+def test_tracker_reports_whether_windows_are_tracked():
+    display = create_display()
+    assert_that(EwmhWindowTracker(display, WindowRegistry()).start(), is_(True))
+    del display.windows[ROOT]["_NET_CLIENT_LIST"]
+    registry = WindowRegistry()
+    assert_that(EwmhWindowTracker(display, registry).start(), is_(False))
+    assert_that(registry.seeded, is_(False))
+
+
+def configure_event(display, window_id, x, y, width, height, send_event):
+    return types.SimpleNamespace(type=X.ConfigureNotify, window=FakeWindow(display, window_id), x=x, y=y,
+                                 width=width, height=height, send_event=send_event)
+
+
+def test_tracker_applies_configure_events_without_queries():
+    display = create_display()
+    registry = WindowRegistry()
+    tracker = EwmhWindowTracker(display, registry)
+    tracker.start()
+    display.windows[0x4c00007]["_NET_WM_NAME"] = "Changed without event"
+    # The window manager reports moves with the root position of the window, which is offset within its frame
+    assert_that(tracker.handle_event(configure_event(display, 0x4c00007, 100, 50, 752, 599, True)), is_(True))
+    client = registry.get(0x4c00007)
+    assert_that((client.x, client.y, client.width, client.height), is_(equal_to((2264, 658, 752, 599))))
+    # Resizes are reported with the position relative to the frame
+    assert_that(tracker.handle_event(configure_event(display, 0x4c00007, 2164, 608, 400, 300, False)), is_(True))
+    client = registry.get(0x4c00007)
+    assert_that((client.x, client.y, client.width, client.height), is_(equal_to((2264, 658, 400, 300))))
+    assert_that(client.title, is_(equal_to("System Monitor")))
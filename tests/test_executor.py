@@ -0,0 +1,130 @@
+# Copyright (C) 2024 AutoKey contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+
+import pytest
+from hamcrest import *
+
+from autokey.executor import Executor
+from autokey.model.concurrency import ConcurrencyPolicy
+
+
+def wait_until_idle(executor: Executor):
+    done = threading.Event()
+    for lane in executor.lanes:
+        executor.submit(lane, lambda: None)
+    executor.submit(Executor.OUTPUT, done.set)
+    assert_that(done.wait(5), is_(True), "Executor did not finish its jobs")
+
+
+def test_output_lane_runs_jobs_in_order():
+    executor = Executor()
+    results = []
+    for number in range(20):
+        executor.submit(Executor.OUTPUT, results.append, number)
+    wait_until_idle(executor)
+    assert_that(results, is_(equal_to(list(range(20)))))
+    assert_that(executor.get_stats(), has_entries(output_queued=0, output_running=0, output_completed=22))
+    executor.shutdown()
+
+
+@pytest.mark.parametrize("policy, expected", [
+    (ConcurrencyPolicy.QUEUE, ["first", "second", "third"]),
+    (ConcurrencyPolicy.DROP, ["first"]),
+    (ConcurrencyPolicy.REPLACE, ["first", "third"]),
+])
+def test_concurrency_policy(policy: ConcurrencyPolicy, expected: list):
+    executor = Executor()
+    results = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def job(name):
+        started.set()
+        release.wait(5)
+        results.append(name)
+
+    executor.submit(Executor.OUTPUT, job, "first", key="item", policy=policy)
+    started.wait(5)
+    executor.submit(Executor.OUTPUT, job, "second", key="item", policy=policy)
+    executor.submit(Executor.OUTPUT, job, "third", key="item", policy=policy)
+    release.set()
+    wait_until_idle(executor)
+    assert_that(results, is_(equal_to(expected)))
+    executor.shutdown()
+
+
+def test_job_errors_do_not_stop_the_lane():
+    executor = Executor()
+    results = []
+    executor.submit(Executor.SCRIPTS, lambda: 1 / 0)
+    executor.submit(Executor.OUTPUT, results.append, "after error")
+    wait_until_idle(executor)
+    assert_that(results, contains_exactly("after error"))
+    executor.shutdown()
+
+
+def test_call_returns_result_or_exception():
+    executor = Executor()
+    assert_that(executor.call(Executor.MACROS, sum, [1, 2, 3]).result(5), is_(equal_to(6)))
+    with pytest.raises(ZeroDivisionError):
+        executor.call(Executor.MACROS, lambda: 1 / 0).result(5)
+    executor.shutdown()
+    assert_that(executor.call(Executor.MACROS, sum, [1]).cancelled(), is_(True))
+
+
+def test_shutdown_waits_for_running_jobs():
+    executor = Executor()
+    started = threading.Event()
+    results = []
+
+    def job():
+        started.set()
+        time.sleep(0.2)
+        results.append("finished")
+
+    executor.submit(Executor.OUTPUT, job)
+    started.wait(5)
+    executor.submit(Executor.OUTPUT, results.append, "queued")
+    executor.shutdown()
+    assert_that(results, contains_exactly("finished"))
+
+
+def test_shutdown_timeout_leaves_endless_jobs_running():
+    executor = Executor()
+    started = threading.Event()
+    release = threading.Event()
+    executor.submit(Executor.SCRIPTS, lambda: (started.set(), release.wait(5)))
+    started.wait(5)
+    start = time.monotonic()
+    executor.shutdown(timeout=0.1)
+    assert_that(time.monotonic() - start, is_(less_than(2)))
+    release.set()
+
+
+def test_full_script_lane_logs_waiting_jobs(caplog):
+    executor = Executor()
+    release = threading.Event()
+    for number in range(Executor.SCRIPT_WORKERS):
+        executor.submit(Executor.SCRIPTS, release.wait, 5, key="watcher {}".format(number))
+    # Wait for the workers to pick up the jobs
+    while executor.get_stats()["scripts_running"] < Executor.SCRIPT_WORKERS:
+        time.sleep(0.01)
+    executor.submit(Executor.SCRIPTS, lambda: None, key="waiting")
+    assert_that(caplog.text, contains_string("waiting waits behind 0 queued jobs"))
+    release.set()
+    executor.shutdown()
@@ -0,0 +1,67 @@
+# Copyright (C) 2024 AutoKey contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from unittest.mock import MagicMock
+
+import pytest
+from hamcrest import *
+
+import autokey.model.phrase
+from autokey.model.hotkey_index import HotkeyIndex
+from autokey.model.key import Key
+from autokey.sys_interface.abstract_interface import WindowInfo
+
+
+def create_hotkey_phrase(name: str, modifiers: list, key: str) -> autokey.model.phrase.Phrase:
+    phrase = autokey.model.phrase.Phrase(name, "content")
+    phrase.set_hotkey(modifiers, key)
+    phrase.parent = MagicMock()
+    phrase.parent.get_applicable_regex.return_value = None
+    return phrase
+
+
+def create_phrases():
+    return [
+        create_hotkey_phrase("ctrl+a", [Key.CONTROL], "a"),
+        create_hotkey_phrase("left ctrl+a", [Key.LEFTCONTROL], "a"),
+        create_hotkey_phrase("ctrl+shift+b", [Key.SHIFT, Key.CONTROL], "b"),
+        create_hotkey_phrase("super+a", [Key.SUPER], "a"),
+    ]
+
+
+@pytest.mark.parametrize("modifiers, key, expected", [
+    ([Key.CONTROL], "a", ["ctrl+a"]),
+    ([Key.LEFTCONTROL], "a", ["ctrl+a", "left ctrl+a"]),
+    ([Key.RIGHTCONTROL], "a", ["ctrl+a"]),
+    ([Key.CONTROL, Key.SHIFT], "b", ["ctrl+shift+b"]),
+    ([Key.LEFTSHIFT, Key.LEFTCONTROL], "b", ["ctrl+shift+b"]),
+    ([Key.LEFTSHIFT, Key.RIGHTCONTROL], "b", []),
+    ([], "a", []),
+    ([Key.CONTROL], "b", []),
+])
+def test_get_returns_candidates_in_order(modifiers: list, key: str, expected: list):
+    index = HotkeyIndex(create_phrases())
+    assert_that([item.description for item in index.get(modifiers, key)], is_(equal_to(expected)))
+
+
+def test_index_agrees_with_check_hotkey_has_properties():
+    phrases = create_phrases()
+    index = HotkeyIndex(phrases)
+    window_info = WindowInfo("", "")
+    modifier_choices = [[], [Key.CONTROL], [Key.LEFTCONTROL], [Key.RIGHTSUPER], [Key.LEFTCONTROL, Key.LEFTSHIFT]]
+    for modifiers in modifier_choices:
+        for key in ("a", "b"):
+            expected = [p for p in phrases if p.check_hotkey_has_properties(modifiers, key, window_info)]
+            assert_that(index.get(modifiers, key), is_(equal_to(expected)))
@@ -12,6 +12,8 @@
 
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
+import types
+
 import Xlib
 
 import pytest
@@ -20,6 +22,8 @@ import unittest
 from unittest.mock import Mock, MagicMock, patch
 
 from autokey.model.key import Key
+from autokey.sys_interface.abstract_interface import WindowInfo
+from autokey.sys_interface.window_registry import WindowRegistry
 import autokey.interface
 
 class EventCapturer():
@@ -111,6 +115,22 @@ class TestXrecord():
             self.cancel()
         assert_that(self.ec.get_result(), is_(equal_to(expected)), failmsg)
 
+    @pytest.mark.parametrize(
+    "inpt, count, expected, failmsg", [
+        ["a", 3,
+         [(38, 0, 'p'), (38, 0, 'r')] * 3,
+         "Xinterface doesn't repeat a key properly",],
+        ["a", 0,
+         [],
+         "Xinterface doesn't handle a zero repeat count properly",],
+    ])
+    def test_send_key_repeat(self, inpt, count, expected, failmsg):
+        with self.event_capture_patch, self.check_workaround_patch:
+            self.ifc.send_key_repeat(inpt, count)
+            # Need to cancel early. But cancel in tearDown as well in case this test fails.
+            self.cancel()
+        assert_that(self.ec.get_result(), is_(equal_to(expected)), failmsg)
+
     @pytest.mark.parametrize(
     "inpt, mods, expected, failmsg", [
         ["a", ["<ctrl>"],
@@ -128,3 +148,50 @@ class TestXrecord():
             # Need to cancel early. But cancel in tearDown as well in case this test fails.
             self.cancel()
         assert_that(self.ec.get_result(), is_(equal_to(expected)), failmsg)
+
+
+class TestXWindowInfoCache():
+
+    def setup_method(self):
+        self.registry = WindowRegistry()
+        self.registry.seed([(0x5600007, "AutoKey")])
+        with patch("autokey.interface.display.Display"):
+            self.ifc = autokey.interface.XWindowInterface(self.registry)
+        self.client = self.create_window(0x5600007, "AutoKey", ("autokey-qt", "Autokey-qt"))
+
+    @staticmethod
+    def create_window(window_id, title, wm_class, parent=0):
+        window = MagicMock()
+        window.id = window_id
+        window.get_property.return_value = types.SimpleNamespace(value=title) if title else None
+        window.get_wm_class.return_value = wm_class
+        window.query_tree.return_value = types.SimpleNamespace(parent=parent)
+        return window
+
+    def test_info_of_registered_window_is_cached(self):
+        assert_that(self.ifc.get_window_info(self.client), is_(equal_to(WindowInfo("AutoKey", "autokey-qt.Autokey-qt"))))
+        self.client.get_property.return_value = types.SimpleNamespace(value="Renamed")
+        reads = self.client.get_wm_class.call_count
+        assert_that(self.ifc.get_window_title(self.client), is_(equal_to("AutoKey")))
+        assert_that(self.client.get_wm_class.call_count, is_(equal_to(reads)))
+
+        self.ifc.invalidate_window_info(0x5600007)
+        assert_that(self.ifc.get_window_title(self.client), is_(equal_to("Renamed")))
+
+    def test_info_read_from_unregistered_window_is_not_cached(self):
+        # The focus is on a child window without properties, so the title and class come from an unregistered frame
+        frame = self.create_window(0x200, "Frame", ("frame", "Frame"))
+        child = self.create_window(0x5600010, None, None, parent=frame)
+        assert_that(self.ifc.get_window_title(child), is_(equal_to("Frame")))
+        frame.get_property.return_value = types.SimpleNamespace(value="Renamed")
+        assert_that(self.ifc.get_window_title(child), is_(equal_to("Renamed")))
+
+    def test_invalidation_during_lookup_prevents_caching(self):
+        def rename(*args):
+            self.ifc.invalidate_window_info(0x5600007)
+            return ("autokey-qt", "Autokey-qt")
+        self.client.get_wm_class.side_effect = rename
+        self.ifc.get_window_info(self.client)
+        self.client.get_wm_class.side_effect = None
+        self.client.get_property.return_value = types.SimpleNamespace(value="Renamed")
+        assert_that(self.ifc.get_window_title(self.client), is_(equal_to("Renamed")))
@@ -13,6 +13,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
+import threading
 import typing
 
 import pytest
@@ -22,6 +23,8 @@ from hamcrest import *
 import autokey.iomediator.constants as iomediator_constants
 from autokey.iomediator.iomediator import IoMediator
 import autokey.model.key
+from autokey.model.phrase import SendMode
+from autokey.sys_interface.clipboard import Clipboard
 
 
 def generate_tests_for_key_split_re():
@@ -101,3 +104,119 @@ def test_send_string_modified(inpt: str, result: typing.List[str], mods: typing.
         is_(equal_to(mods)),
         failmsg
     )
+
+
+def test_send_string_paced():
+    interface = unittest.mock.Mock(wraps=MockInterface())
+    # 60 characters per second are handed to the interface in chunks of 3 characters
+    IoMediator._send_string("abcdefgh<enter>ij", interface, 60)
+    assert_that(interface.get_result(), is_(equal_to("abc|def|gh|<enter>|ij")))
+
+
+class PastingClipboard:
+    """Clipboard that records its content and reports the requests of the application pasting it."""
+
+    def __init__(self, reports_requests=True, identifies_requestors=True):
+        self.reports_requests = reports_requests
+        self.identifies_requestors = identifies_requestors
+        self.requests = {False: 0, True: 0}
+        self.text = "backup"
+        self.selection = "selection backup"
+        self.pasted = []
+
+    def paste(self, selection=False):
+        self.pasted.append(self.selection if selection else self.text)
+        self.requests[selection] += 1
+
+    def get_request_count(self, selection=False):
+        return self.requests[selection]
+
+    def wait_for_request(self, count, selection=False, timeout=None):
+        return self.requests[selection] > count
+
+
+def create_pasting_mediator(clipboard):
+    mediator = IoMediator.__new__(IoMediator)
+    mediator.clipboard = clipboard
+    mediator.interface = unittest.mock.Mock()
+    mediator.interface.get_mouse_position.return_value = (10, 20)
+    return mediator
+
+
+def test_send_string_clipboard_restores_after_paste():
+    clipboard = PastingClipboard()
+    mediator = create_pasting_mediator(clipboard)
+    mediator.send_string = unittest.mock.Mock(side_effect=lambda string: clipboard.paste())
+    with unittest.mock.patch("time.sleep") as sleep:
+        mediator.send_string_clipboard("pasted", SendMode.CB_CTRL_V)
+    assert_that(clipboard.pasted, contains_exactly("pasted"))
+    assert_that(clipboard.text, is_(equal_to("backup")))
+    sleep.assert_not_called()
+
+
+def test_send_string_selection_restores_after_paste():
+    clipboard = PastingClipboard()
+    mediator = create_pasting_mediator(clipboard)
+    mediator.interface.send_mouse_click.side_effect = lambda *args: clipboard.paste(True)
+    mediator.send_string_selection("pasted")
+    assert_that(clipboard.pasted, contains_exactly("pasted"))
+    assert_that(clipboard.selection, is_(equal_to("selection backup")))
+
+
+def test_send_string_clipboard_waits_fixed_delay_without_request_reports():
+    clipboard = PastingClipboard(reports_requests=False)
+    mediator = create_pasting_mediator(clipboard)
+    mediator.send_string = unittest.mock.Mock()
+    with unittest.mock.patch("time.sleep") as sleep:
+        mediator.send_string_clipboard("pasted", SendMode.CB_CTRL_V)
+    sleep.assert_called_once_with(IoMediator.CLIPBOARD_RESTORE_DELAY)
+    assert_that(clipboard.text, is_(equal_to("backup")))
+
+
+def test_send_string_clipboard_waits_minimum_delay_without_known_requestors():
+    # A clipboard manager reading the new content can't be told apart from the paste
+    clipboard = PastingClipboard(identifies_requestors=False)
+    mediator = create_pasting_mediator(clipboard)
+    mediator.send_string = unittest.mock.Mock(side_effect=lambda string: clipboard.paste())
+    with unittest.mock.patch("time.sleep") as sleep:
+        mediator.send_string_clipboard("pasted", SendMode.CB_CTRL_V)
+    sleep.assert_called_once()
+    assert_that(sleep.call_args[0][0], is_(close_to(IoMediator.CLIPBOARD_RESTORE_DELAY, 0.05)))
+    assert_that(clipboard.text, is_(equal_to("backup")))
+
+
+def test_clipboard_wait_for_request():
+    with unittest.mock.patch("autokey.sys_interface.clipboard.APIClipboard") as api_clipboard:
+        clipboard = Clipboard()
+    report_request = api_clipboard.return_value.request_listener
+    assert_that(clipboard.reports_requests, is_(True))
+    count = clipboard.get_request_count()
+    assert_that(clipboard.wait_for_request(count, timeout=0.01), is_(False))
+    threading.Timer(0.05, report_request, (False,)).start()
+    assert_that(clipboard.wait_for_request(count, timeout=5), is_(True))
+    # Requests for the selection are counted separately
+    assert_that(clipboard.wait_for_request(0, selection=True, timeout=0.01), is_(False))
+
+
+def test_typed_text_verification_waits_for_slow_copy():
+    class SlowCopyClipboard:
+        """The copy of the typed text arrives after some reads."""
+        def __init__(self):
+            self.reads = 0
+            self.written = []
+
+        @property
+        def text(self):
+            self.reads += 1
+            return "typed text" if self.reads > 4 else ""
+
+        @text.setter
+        def text(self, value):
+            self.written.append(value)
+
+    mediator = create_pasting_mediator(SlowCopyClipboard())
+    mediator.typingRates = unittest.mock.Mock()
+    with unittest.mock.patch("time.sleep"):
+        mediator._IoMediator__verify_typed_text("typed text", "editor")
+    mediator.typingRates.report_verified.assert_called_once_with("editor")
+    mediator.typingRates.report_dropped.assert_not_called()
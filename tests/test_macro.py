@@ -17,6 +17,7 @@ import typing
 import pathlib
 import os
 import sys
+import time
 from datetime import date
 
 from unittest.mock import MagicMock, patch
@@ -30,6 +31,7 @@ import autokey.model.folder
 import autokey.service
 from autokey.service import PhraseRunner
 from autokey.configmanager.configmanager import ConfigManager
+import autokey.configmanager.configmanager_constants
 from autokey.scripting import Engine
 
 from autokey.macro import *
@@ -235,6 +237,161 @@ def test_system_macro():
                 "system macro fails")
 
 
+def test_macros_in_clipboard_contents_are_inserted_literally():
+    engine, folder = create_engine()
+    engine.run_system_command_from_macro = MagicMock()
+    engine.run_script_from_macro = MagicMock()
+    contents = "<system command='echo PWNED'> <script name='test' args=>"
+    with patch.object(ClipboardMacro, "expand", return_value=contents):
+        assert_that(expandMacro(engine, "a <clipboard> b"), is_(equal_to("a {} b".format(contents))))
+    engine.run_system_command_from_macro.assert_not_called()
+    engine.run_script_from_macro.assert_not_called()
+
+
+def test_macros_in_system_macro_output_are_inserted_literally(monkeypatch):
+    engine, folder = create_engine()
+    engine.run_system_command_from_macro = MagicMock(wraps=engine.run_system_command_from_macro)
+    engine.run_script_from_macro = MagicMock()
+    # The output comes from the environment, so that its angle brackets are not part of the phrase itself
+    output = "<system command='echo PWNED'> <script name='test' args=>"
+    monkeypatch.setenv("AUTOKEY_TEST_OUTPUT", output)
+    assert_that(expandMacro(engine, "<system command='echo \"$AUTOKEY_TEST_OUTPUT\"'>"), is_(equal_to(output)))
+    assert_that(engine.run_system_command_from_macro.call_count, is_(equal_to(1)))
+    engine.run_script_from_macro.assert_not_called()
+
+
 # def test_nested_macro_raises_error():
 #     contents="<date format=<cursor>>"
 #     # TODO
+
+
+@unittest.mock.patch('datetime.datetime', FakeDate)
+def test_parsed_phrase_is_cached():
+    from datetime import datetime
+    FakeDate.now = classmethod(lambda cls: datetime(2019, 1, 1))
+    engine, folder = create_engine()
+    manager = MacroManager(engine)
+    phrase = "<date format=%y> and <date format=%m>"
+    assert_that(manager.process_expansion_macros(phrase), is_(equal_to("19 and 01")))
+    assert_that(manager.process_expansion_macros(phrase), is_(equal_to("19 and 01")))
+    assert_that(manager.parse.cache_info().hits, is_(equal_to(1)))
+    # A changed phrase is parsed again
+    assert_that(manager.process_expansion_macros(phrase + "!"), is_(equal_to("19 and 01!")))
+    assert_that(manager.parse.cache_info().misses, is_(equal_to(2)))
+
+
+def test_phrase_without_macros_is_not_parsed():
+    engine, folder = create_engine()
+    manager = MacroManager(engine)
+    assert_that(manager.process_expansion_macros("No macro"), is_(equal_to("No macro")))
+    assert_that(manager.parse.cache_info().misses, is_(equal_to(0)))
+
+
+@pytest.mark.parametrize("test_input, expected, error_msg", [
+    ("<enter>one<cursor>two<tab>", "<enter>onetwo<tab>" + "<left>" * 8,
+     "Keys around macros are not kept"),
+    (r"one \<two\> <cursor>", r"one \<two\> ", "Escaped brackets outside of macros are not kept as written"),
+    ("<cursor><system command='echo two'>", "two" + "<left>" * 3,
+     "Cursor position does not use the expanded text of later macros"),
+])
+def test_literal_text_and_keys_around_macros(test_input, expected, error_msg):
+    engine, folder = create_engine()
+    assert_that(expandMacro(engine, test_input), is_(equal_to(expected)), error_msg)
+
+
+def test_invalid_macro_arguments_raise_on_every_expansion():
+    engine, folder = create_engine()
+    manager = MacroManager(engine)
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            manager.process_expansion_macros("<date>")
+
+
+def test_system_macros_run_concurrently():
+    engine, folder = create_engine()
+    test = "<system command='sleep 0.5; echo one'> <system command='sleep 0.5; echo two'>"
+    start = time.monotonic()
+    assert_that(expandMacro(engine, test), is_(equal_to("one two")))
+    assert_that(time.monotonic() - start, is_(less_than(0.9)))
+
+
+def test_macro_timeout_inserts_placeholder():
+    engine, folder = create_engine()
+    test = "<system command='echo fast'> <system command='sleep 2; echo slow'>"
+    with patch.dict(ConfigManager.SETTINGS, {autokey.configmanager.configmanager_constants.MACRO_TIMEOUT: 0.5}):
+        assert_that(expandMacro(engine, test),
+                    is_(equal_to("fast " + MacroManager.TIMEOUT_PLACEHOLDER)))
+
+
+def test_slow_macros_are_waited_for_by_default():
+    engine, folder = create_engine()
+    # Blocks longer than the timeout of the test above, e.g. like a script macro waiting for a dialog
+    test = "<system command='echo fast'> <system command='sleep 1; echo slow'>"
+    assert_that(ConfigManager.SETTINGS[autokey.configmanager.configmanager_constants.MACRO_TIMEOUT], is_(0))
+    assert_that(expandMacro(engine, test), is_(equal_to("fast slow")))
+
+
+def test_macro_failure_is_raised():
+    engine, folder = create_engine()
+    with pytest.raises(FileNotFoundError):
+        expandMacro(engine, "<file name=/nonexistent/file> <system command='echo two'>")
+
+
+def test_file_macro_cache_is_invalidated_by_changes(tmp_path):
+    engine, folder = create_engine()
+    manager = MacroManager(engine)
+    signature = tmp_path / "signature.txt"
+    signature.write_text("first")
+    test = "<file name={} cache=true>".format(signature)
+    assert_that(manager.process_expansion_macros(test), is_(equal_to("first")))
+    assert_that(manager.process_expansion_macros(test), is_(equal_to("first")))
+    assert_that(manager.result_cache.hits, is_(equal_to(1)))
+    signature.write_text("second, longer")
+    assert_that(manager.process_expansion_macros(test), is_(equal_to("second, longer")))
+
+
+def test_system_macro_output_is_cached():
+    engine, folder = create_engine()
+    manager = MacroManager(engine)
+    test = "<system command='date +%s%N' ttl=60>"
+    first = manager.process_expansion_macros(test)
+    assert_that(manager.process_expansion_macros(test), is_(equal_to(first)))
+    assert_that(manager.result_cache.get_stats(), has_entries(hits=1, misses=1))
+    # Without caching, the command runs every time
+    assert_that(manager.process_expansion_macros(test.replace("ttl=60", "ttl=60 cache=no")), is_not(equal_to(first)))
+
+
+def test_system_macro_output_is_refreshed_in_background():
+    engine, folder = create_engine()
+    manager = MacroManager(engine)
+    test = "<system command='date +%s%N' ttl=2>"
+    first = manager.process_expansion_macros(test)
+    time.sleep(1.7)
+    # Served from the cache, while the command runs again
+    assert_that(manager.process_expansion_macros(test), is_(equal_to(first)))
+    for _ in range(25):
+        time.sleep(0.01)
+        if manager.process_expansion_macros(test) != first:
+            break
+    assert_that(manager.process_expansion_macros(test), is_not(equal_to(first)))
+    assert_that(manager.result_cache.misses, is_(equal_to(1)))
+
+
+def test_invalid_cache_arguments_raise():
+    engine, folder = create_engine()
+    with pytest.raises(ValueError):
+        expandMacro(engine, "<system command='true' cache=maybe>")
+    with pytest.raises(ValueError):
+        expandMacro(engine, "<system command='true' ttl=soon>")
+
+
+def test_result_cache_evicts_least_recently_used():
+    cache = MacroResultCache()
+    cache.MAX_SIZE = 10
+    cache.put("first", "12345")
+    cache.put("second", "12345")
+    assert_that(cache.get("first"), is_(not_none()))
+    cache.put("third", "1")
+    assert_that(cache.get("second"), is_(none()))
+    assert_that(cache.get("first").value, is_(equal_to("12345")))
+    assert_that(cache.get_stats(), has_entries(entries=2, size=6))
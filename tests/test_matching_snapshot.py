@@ -0,0 +1,47 @@
+# Copyright (C) 2024 AutoKey contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+from hamcrest import *
+
+import autokey.model.folder
+from autokey.model.key import Key
+from autokey.model.matching_snapshot import MatchingSnapshot
+from autokey.sys_interface.abstract_interface import WindowInfo
+from tests.test_hotkey_index import create_hotkey_phrase
+from tests.test_phrase import create_phrase
+
+
+def create_snapshot(folders, hotkey_items, items):
+    return MatchingSnapshot.build([], [], hotkey_items, folders, items)
+
+
+def test_snapshot_matches_items():
+    folder = autokey.model.folder.Folder("folder")
+    abbreviation = create_phrase("abbreviation", "abbr")
+    hotkey = create_hotkey_phrase("hotkey", [Key.CONTROL], "a")
+    snapshot = create_snapshot([folder], [hotkey], [abbreviation, hotkey])
+    assert_that(snapshot.abbreviation_matcher.match("abbr "), contains_exactly(abbreviation))
+    assert_that(snapshot.hotkey_index.get([Key.CONTROL], "a"), contains_exactly(hotkey))
+    assert_that(snapshot.window_filters.filter(snapshot.all_items, WindowInfo("", "")), has_length(2))
+
+
+def test_snapshot_is_not_affected_by_later_changes():
+    items = [create_phrase("abbreviation", "abbr")]
+    snapshot = create_snapshot([], [], items)
+    items.append(create_phrase("added", "abbr"))
+    assert_that(snapshot.all_items, has_length(1))
+    with pytest.raises(AttributeError):
+        snapshot.all_items = tuple(items)
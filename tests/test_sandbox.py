@@ -0,0 +1,100 @@
+# Copyright (C) 2024 AutoKey contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import types
+
+import pytest
+from hamcrest import *
+
+from autokey.model.script import ScriptRunRecord
+from autokey.sandbox import SandboxPool, SandboxScriptError
+from autokey.supervisor import ScriptSupervisor
+
+
+class FakeStore(dict):
+
+    def set_value(self, key, value):
+        self[key] = value
+
+    def get_value(self, key):
+        return self.get(key)
+
+
+@pytest.fixture
+def pool():
+    pool = SandboxPool(1)
+    yield pool
+    pool.shutdown()
+
+
+def test_calls_are_executed_in_the_daemon(pool):
+    store = FakeStore(count=41)
+    pool.run("<string>", 'store.set_value("count", store.get_value("count") + 1)', {"store": store})
+    assert_that(store["count"], is_(equal_to(42)))
+
+
+def test_highlevel_functions_are_executed_in_the_daemon(pool):
+    store = FakeStore()
+    highlevel = types.SimpleNamespace(visgrep=lambda *args: [(10, 20)])
+    pool.run("<string>", 'store.set_value("match", highlevel.visgrep("screen.png", "pattern.png"))',
+             {"store": store, "highlevel": highlevel})
+    assert_that(store["match"], is_(equal_to([(10, 20)])))
+
+
+def test_script_error_is_raised_with_worker_traceback(pool):
+    with pytest.raises(SandboxScriptError) as exc_info:
+        pool.run("/tmp/failing.py", "raise ValueError('Expected failure')", {})
+    assert_that(str(exc_info.value), contains_string("ValueError: Expected failure"))
+    assert_that(str(exc_info.value), contains_string("/tmp/failing.py"))
+
+
+def test_daemon_side_exceptions_are_raised_in_the_script(pool):
+    store = FakeStore()
+    source = "try:\n    store.missing()\nexcept AttributeError:\n    store.set_value('caught', True)\n"
+    pool.run("<string>", source, {"store": store})
+    assert_that(store["caught"], is_(True))
+
+
+def test_workers_are_reused(pool):
+    store = FakeStore()
+    pool.run("<string>", "import os\nstore.set_value('pid', os.getpid())", {"store": store})
+    first_pid = store["pid"]
+    pool.run("<string>", "import os\nstore.set_value('pid', os.getpid())", {"store": store})
+    assert_that(store["pid"], is_(equal_to(first_pid)))
+
+
+def test_terminated_worker_is_replaced(pool):
+    with pytest.raises(SandboxScriptError):
+        pool.run("<string>", "import os\nos._exit(1)", {})
+    store = FakeStore()
+    pool.run("<string>", "store.set_value('alive', True)", {"store": store})
+    assert_that(store["alive"], is_(True))
+
+
+def test_resource_usage_is_reported(pool):
+    usage = pool.run("<string>", "sum(range(200000))", {})
+    assert_that(usage.cpu_time, is_(greater_than(0)))
+
+
+def test_cancelling_terminates_the_worker(pool):
+    supervisor = ScriptSupervisor()
+    run = supervisor.start("endless", timeout=0.5)
+    with pytest.raises(SandboxScriptError):
+        pool.run("<string>", "while True: pass", {}, run)
+    supervisor.finish(run)
+    assert_that(run.cancel_reason, is_(equal_to(ScriptRunRecord.TIMEOUT)))
+    store = FakeStore()
+    pool.run("<string>", "store.set_value('alive', True)", {"store": store})
+    assert_that(store["alive"], is_(True))
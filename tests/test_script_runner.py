@@ -0,0 +1,134 @@
+# Copyright (C) 2024 AutoKey contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import pathlib
+import threading
+import time
+import timeit
+from unittest.mock import MagicMock, patch
+
+import pytest
+from hamcrest import *
+
+import autokey.model.script
+from autokey.model.script import ScriptRunRecord
+import autokey.service
+from autokey.executor import Executor
+from autokey.service import ScriptRunner
+
+
+@pytest.fixture
+def script_runner() -> ScriptRunner:
+    with patch("autokey.scripting.Clipboard", create=True), patch("autokey.scripting.Dialog", create=True), \
+            patch("autokey.scripting.Window", create=True), \
+            patch("autokey.service.CodeCache"):
+        runner = ScriptRunner(MagicMock(), MagicMock(), Executor())
+    runner.code_cache = autokey.service.CodeCache()
+    return runner
+
+
+def test_scope_contains_only_the_scripting_api(script_runner: ScriptRunner):
+    assert_that(script_runner.scope, has_entries(engine=script_runner.engine, __name__="__main__"))
+    assert_that(script_runner.scope, not_(has_key("ScriptRunner")))
+    assert_that(script_runner.scope, not_(has_key("logger")))
+    assert_that(vars(autokey.service), not_(has_key("keyboard")))
+
+
+def test_scope_is_read_only(script_runner: ScriptRunner):
+    with pytest.raises(TypeError):
+        script_runner.scope["keyboard"] = None
+
+
+def test_script_globals_are_not_shared(script_runner: ScriptRunner, tmp_path: pathlib.Path):
+    first = tmp_path / "first.py"
+    first.write_text("leaked = True\n")
+    script = autokey.model.script.Script("second", "store.set_value('leaked', 'leaked' in globals())\n")
+    script_runner.run_subscript(first)
+    script_runner.run_subscript(script)
+    assert_that(script.store.get_value("leaked"), is_(False))
+    assert_that(script_runner.scope, not_(has_key("leaked")))
+
+
+@pytest.mark.skipif("AUTOKEY_BENCHMARK" not in os.environ, reason="Benchmark, enable with AUTOKEY_BENCHMARK=1")
+def test_script_dispatch_benchmark(script_runner: ScriptRunner):
+    """
+    Measures the per-run overhead of running a script, i.e. setting up its scope and executing its cached code.
+    Run with AUTOKEY_BENCHMARK=1 and -s to see the results, compared with the previous approach of copying the
+    globals of the service module.
+    """
+    script = autokey.model.script.Script("empty", "pass\n")
+    code = script_runner._compile_script(script)
+    module_globals = vars(autokey.service)
+    repeat = 20000
+
+    def globals_copy_dispatch():
+        scope = module_globals.copy()
+        scope["store"] = script.store
+        exec(code, scope)
+
+    def slim_dispatch():
+        exec(code, script_runner._create_scope(store=script.store))
+
+    globals_copy = min(timeit.repeat(globals_copy_dispatch, number=repeat, repeat=5)) / repeat
+    slim = min(timeit.repeat(slim_dispatch, number=repeat, repeat=5)) / repeat
+    print("\nScript dispatch overhead: {:.2f} µs, with a copy of the service globals: {:.2f} µs".format(
+        slim * 1e6, globals_copy * 1e6))
+
+
+def run_in_thread(function, *args) -> threading.Thread:
+    thread = threading.Thread(target=function, args=args, daemon=True)
+    thread.start()
+    return thread
+
+
+def wait_until_running(script_runner: ScriptRunner):
+    for _ in range(200):
+        if script_runner.supervisor.get_running():
+            return
+        time.sleep(0.01)
+    raise AssertionError("The script did not start")
+
+
+def test_run_usage_is_recorded(script_runner: ScriptRunner):
+    script = autokey.model.script.Script("busy", "sum(range(200000))\n")
+    script_runner._execute(script_runner._create_scope(store=script.store), script)
+    record = script_runner.run_records[-1]
+    assert_that(record.script_name, is_(equal_to("busy")))
+    assert_that(record.outcome, is_(equal_to(ScriptRunRecord.FINISHED)))
+    assert_that(record.cpu_time, is_(greater_than(0)))
+    assert_that(record.wall_time, is_(greater_than(0)))
+    assert_that(script_runner.get_script_usage(), has_entries(busy=record.cpu_time))
+
+
+def test_script_is_cancelled_on_timeout(script_runner: ScriptRunner):
+    # The script must not be able to swallow the cancellation
+    script = autokey.model.script.Script("loop", "while True:\n    try:\n        pass\n    except Exception:\n        pass\n")
+    script.timeout = 0.2
+    script_runner._execute(script_runner._create_scope(store=script.store), script)
+    assert_that(script_runner.run_records[-1].outcome, is_(equal_to(ScriptRunRecord.TIMEOUT)))
+    assert_that(script_runner.error_records, has_length(1))
+    assert_that(script_runner.supervisor.get_running(), is_(empty()))
+
+
+def test_script_is_cancelled_on_request(script_runner: ScriptRunner):
+    script = autokey.model.script.Script("sleeper", "while True:\n    time.sleep(0.01)\n")
+    thread = run_in_thread(script_runner._execute, script_runner._create_scope(store=script.store), script)
+    wait_until_running(script_runner)
+    assert_that(script_runner.supervisor.cancel_script("sleeper"), is_(equal_to(1)))
+    thread.join(5)
+    assert_that(thread.is_alive(), is_(False))
+    assert_that(script_runner.run_records[-1].outcome, is_(equal_to(ScriptRunRecord.CANCELLED)))
+    assert_that(script_runner.error_records, is_(empty()))
@@ -0,0 +1,58 @@
+# Copyright (C) 2024 AutoKey contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+
+import pytest
+from hamcrest import *
+
+from autokey.model.script import ScriptRunRecord
+from autokey.supervisor import ScriptCancelled, ScriptSupervisor
+
+
+def test_cancel_raises_in_script_thread():
+    supervisor = ScriptSupervisor()
+    run = supervisor.start("test")
+    assert_that(supervisor.get_running(), contains_exactly(run))
+    with pytest.raises(ScriptCancelled):
+        assert_that(supervisor.cancel(run.run_id), is_(True))
+        while True:
+            pass
+    supervisor.finish(run)
+    assert_that(run.cancel_reason, is_(equal_to(ScriptRunRecord.CANCELLED)))
+    assert_that(supervisor.get_running(), is_(empty()))
+
+
+def test_finished_run_cannot_be_cancelled():
+    supervisor = ScriptSupervisor()
+    run = supervisor.start("test", timeout=0.01)
+    supervisor.finish(run)
+    assert_that(run.cancel(), is_(False))
+    assert_that(supervisor.cancel(run.run_id), is_(False))
+    # Neither the cancellation nor the stopped timer raise anything later
+    threading.Event().wait(0.05)
+    assert_that(run.cancel_reason, is_(none()))
+
+
+def test_cancel_script_cancels_all_runs_of_the_script():
+    supervisor = ScriptSupervisor()
+    runs = [supervisor.start(name) for name in ("first", "second", "first")]
+    for run in runs:
+        run.set_cancel_handler(None)
+    assert_that(supervisor.cancel_script("first"), is_(equal_to(2)))
+    assert_that([run.cancel_reason for run in runs], contains_exactly("cancelled", None, "cancelled"))
+    assert_that(supervisor.cancel_all(), is_(equal_to(1)))
+    for run in runs:
+        supervisor.finish(run)
@@ -0,0 +1,54 @@
+# Copyright (C) 2024 AutoKey contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from hamcrest import *
+
+from autokey.iomediator.typing_rate import TypingRateController
+
+
+def test_unknown_application_is_not_limited():
+    controller = TypingRateController({})
+    controller.report_verified("xterm")
+    assert_that(controller.rate("xterm"), is_(equal_to(0)))
+    assert_that(controller.rates, is_(empty()))
+
+
+def test_drops_slow_down():
+    rates = {}
+    controller = TypingRateController(rates)
+    controller.report_dropped("electron")
+    assert_that(rates, has_entry("electron", TypingRateController.INITIAL_RATE))
+    controller.report_dropped("electron")
+    assert_that(controller.rate("electron"), is_(equal_to(TypingRateController.INITIAL_RATE / 2)))
+    for _ in range(20):
+        controller.report_dropped("electron")
+    assert_that(controller.rate("electron"), is_(equal_to(TypingRateController.MIN_RATE)))
+
+
+def test_settles_below_dropping_rate():
+    controller = TypingRateController({"electron": 200})
+    controller.report_dropped("electron")
+    for _ in range(TypingRateController.SPEED_UP_AFTER * 50):
+        controller.report_verified("electron")
+    assert_that(controller.rate("electron"), is_(greater_than(100)))
+    assert_that(controller.rate("electron"), is_(less_than(200)))
+
+
+def test_speeds_up_to_full_speed():
+    rates = {"terminal": TypingRateController.MAX_RATE * 0.9}
+    controller = TypingRateController(rates)
+    for _ in range(TypingRateController.SPEED_UP_AFTER):
+        controller.report_verified("terminal")
+    assert_that(rates, is_(empty()))
@@ -0,0 +1,100 @@
+# Copyright (C) 2024 AutoKey contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+from hamcrest import *
+
+from autokey.sys_interface.window_changes import WindowChangeNotifier
+from autokey.scripting.window import Window
+
+
+def change_later(notifier, state, delay=0.05):
+    def change():
+        state["done"] = True
+        notifier.notify()
+    timer = threading.Timer(delay, change)
+    timer.start()
+    return timer
+
+
+def test_waiter_wakes_up_on_notification():
+    notifier = WindowChangeNotifier()
+    notifier.enable()
+    state = {"done": False}
+    checks = []
+
+    def predicate():
+        checks.append(None)
+        return state["done"]
+
+    change_later(notifier, state)
+    start = time.monotonic()
+    assert_that(notifier.wait_for(predicate, 5), is_(True))
+    assert_that(time.monotonic() - start, is_(less_than(1)))
+    # Checked once initially and once after the notification, no polling in between
+    assert_that(checks, has_length(2))
+
+
+def test_wait_times_out():
+    notifier = WindowChangeNotifier()
+    notifier.enable()
+    start = time.monotonic()
+    assert_that(notifier.wait_for(lambda: False, 0.1), is_(False))
+    assert_that(time.monotonic() - start, is_(greater_than_or_equal_to(0.1)))
+    assert_that(notifier.wait_for(lambda: True, 0), is_(True))
+
+
+def test_disabled_notifier_polls():
+    notifier = WindowChangeNotifier()
+    state = {"done": False}
+    threading.Timer(0.05, state.update, kwargs={"done": True}).start()
+    assert_that(notifier.wait_for(lambda: state["done"], 5), is_(True))
+
+
+def test_window_wait_for_exist_uses_window_interface_notifications():
+    mediator = MagicMock()
+    mediator.windowInterface.window_changes = WindowChangeNotifier()
+    mediator.windowInterface.window_changes.enable()
+    window = Window(mediator)
+    state = {"done": False}
+
+    def get_window_list():
+        windows = [("0x04c00007", "0", "samdesktop", "System Monitor")]
+        if state["done"]:
+            windows.append(("0x05600007", "0", "samdesktop", "AutoKey"))
+        return windows
+
+    with patch.object(window, "get_window_list", side_effect=get_window_list):
+        change_later(mediator.windowInterface.window_changes, state)
+        assert_that(window.wait_for_exist("AutoKey", 5), is_(True))
+        assert_that(window.wait_for_exist("0x05600007", 0, by_hex=True), is_(True))
+        assert_that(window.wait_for_exist("Terminal", 0), is_(False))
+
+
+def test_window_wait_for_focus():
+    mediator = MagicMock()
+    mediator.windowInterface.window_changes = WindowChangeNotifier()
+    mediator.windowInterface.window_changes.enable()
+    mediator.windowInterface.get_window_title.return_value = "Terminal"
+    window = Window(mediator)
+    timer = threading.Timer(0.05, lambda: (
+        setattr(mediator.windowInterface.get_window_title, "return_value", "Mozilla Firefox"),
+        mediator.windowInterface.window_changes.notify()))
+    timer.start()
+    assert_that(window.wait_for_focus("Mozilla.*", 5), is_(True))
+    assert_that(window.wait_for_focus("Mail", 0.05), is_(False))
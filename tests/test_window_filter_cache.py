@@ -0,0 +1,62 @@
+# Copyright (C) 2024 AutoKey contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+from hamcrest import *
+
+import autokey.model.folder
+import autokey.model.phrase
+from autokey.model.window_filter_cache import WindowFilterCache
+from autokey.sys_interface.abstract_interface import WindowInfo
+
+
+def create_items():
+    folder = autokey.model.folder.Folder("folder")
+    folder.set_window_titles("Firefox")
+    folder.set_filter_recursive(True)
+    items = [folder]
+    for name, regex in (("inherits", None), ("own filter", ".*Terminal"), ("same filter", "Firefox")):
+        phrase = autokey.model.phrase.Phrase(name, "content")
+        phrase.set_window_titles(regex)
+        folder.add_item(phrase)
+        items.append(phrase)
+    unfiltered = autokey.model.phrase.Phrase("unfiltered", "content")
+    unfiltered.parent = None
+    items.append(unfiltered)
+    return items
+
+
+@pytest.mark.parametrize("window_info", [
+    WindowInfo("Mozilla Firefox", "Navigator.Firefox"),
+    WindowInfo("Firefox", "navigator"),
+    WindowInfo("xterm", "xterm"),
+    WindowInfo("Gnome Terminal", "gnome-terminal"),
+    WindowInfo("", ""),
+])
+def test_filter_agrees_with_items(window_info: WindowInfo):
+    items = create_items()
+    cache = WindowFilterCache(items)
+    expected = [item for item in items if item._should_trigger_window_title(window_info)]
+    assert_that(cache.filter(items, window_info), is_(equal_to(expected)))
+    # Second lookup is served from the cache
+    assert_that(cache.filter(items, window_info), is_(equal_to(expected)))
+
+
+def test_cache_is_bounded():
+    items = create_items()
+    cache = WindowFilterCache(items)
+    for number in range(WindowFilterCache.MAX_WINDOWS * 2):
+        cache.matching_items(WindowInfo("Firefox {}".format(number), ""))
+    assert_that(len(cache._matches), is_(less_than_or_equal_to(WindowFilterCache.MAX_WINDOWS)))
@@ -0,0 +1,222 @@
+# Copyright (C) 2024 AutoKey contributors
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import collections
+import os
+import types
+from unittest.mock import patch
+
+import pytest
+from hamcrest import *
+
+from Xlib import X, Xatom
+
+from autokey.sys_interface.clipboard import XClipboard
+
+# Clients own the resource IDs sharing the bits outside of the resource ID mask
+RESOURCE_ID_MASK = 0x1FFFFF
+OWN_WINDOW = 0x2600001
+EDITOR_WINDOW = 0x3400007
+CLIPBOARD_MANAGER_WINDOW = 0x4800002
+
+
+class FakeWindow:
+
+    def __init__(self, display, window_id):
+        self.display = display
+        self.id = window_id
+        self.properties = {}
+        self.event_mask = X.NoEventMask
+
+    def change_property(self, property_atom, property_type, property_format, data, mode=X.PropModeReplace):
+        self.properties[property_atom] = types.SimpleNamespace(
+            property_type=property_type, format=property_format, value=data)
+        if self.id == OWN_WINDOW:
+            self.display.queue_event(X.PropertyNotify, window=self, atom=property_atom, state=X.PropertyNewValue)
+
+    def get_full_property(self, property_atom, property_type):
+        return self.properties.get(property_atom)
+
+    def delete_property(self, property_atom):
+        self.properties.pop(property_atom, None)
+
+    def change_attributes(self, event_mask):
+        self.event_mask = event_mask
+
+    def set_selection_owner(self, selection, time):
+        self.display.owners[selection] = self
+
+    def convert_selection(self, selection, target, property_atom, time):
+        # Another application owns the selection and answers with text in UTF-8
+        if target == self.display.get_atom("UTF8_STRING"):
+            self.change_property(property_atom, target, 8, "Grüße".encode("utf-8"))
+        else:
+            property_atom = X.NONE
+        self.display.queue_event(
+            X.SelectionNotify, requestor=self, selection=selection, target=target, property=property_atom)
+
+    def send_event(self, event):
+        self.display.sent.append((self.id, event))
+
+    def create_window(self, *args, **keys):
+        return self.display.own_window
+
+
+class FakeDisplay:
+
+    def __init__(self):
+        self.atoms = {"PRIMARY": Xatom.PRIMARY}
+        self.events = collections.deque()
+        self.owners = {}
+        self.sent = []
+        self.time = 1000
+        self.own_window = FakeWindow(self, OWN_WINDOW)
+        self.display = types.SimpleNamespace(
+            info=types.SimpleNamespace(max_request_length=65535, resource_id_mask=RESOURCE_ID_MASK))
+        # Never readable, the events are delivered through pending_events()
+        self._read, self._write = os.pipe()
+
+    def queue_event(self, event_type, **fields):
+        self.time += 1
+        self.events.append(types.SimpleNamespace(type=event_type, time=self.time, **fields))
+
+    def get_atom(self, name):
+        return self.atoms.setdefault(name, len(self.atoms) + 100)
+
+    def screen(self):
+        return types.SimpleNamespace(root=FakeWindow(self, 0x100))
+
+    def set_error_handler(self, handler):
+        pass
+
+    def get_selection_owner(self, selection):
+        return self.owners.get(selection, FakeWindow(self, X.NONE))
+
+    def get_input_focus(self):
+        return types.SimpleNamespace(focus=FakeWindow(self, EDITOR_WINDOW + 2))
+
+    def pending_events(self):
+        return len(self.events)
+
+    def next_event(self):
+        return self.events.popleft()
+
+    def fileno(self):
+        return self._read
+
+    def flush(self):
+        pass
+
+    def close(self):
+        os.close(self._read)
+        os.close(self._write)
+
+
+@pytest.fixture
+def x_clipboard():
+    fake_display = FakeDisplay()
+    with patch("autokey.sys_interface.clipboard.display.Display", return_value=fake_display):
+        clipboard = XClipboard()
+    clipboard.requests = []
+    clipboard.request_listener = clipboard.requests.append
+    yield clipboard
+    clipboard.close()
+
+
+def request(clipboard, requestor_id, selection, target, time=X.CurrentTime):
+    """Deliver a SelectionRequest to the clipboard thread. Returns the requestor window."""
+    fake_display = clipboard._display
+    requestor = FakeWindow(fake_display, requestor_id)
+    event = types.SimpleNamespace(
+        type=X.SelectionRequest, time=time, owner=fake_display.own_window, requestor=requestor,
+        selection=fake_display.get_atom(selection), target=fake_display.get_atom(target),
+        property=fake_display.get_atom("PASTE"))
+    clipboard._call(clipboard._handle_event, event)
+    return requestor
+
+
+def get_notified_property(clipboard):
+    requestor_id, notify = clipboard._display.sent[-1]
+    return notify.property
+
+
+def test_serves_text_and_reports_paste(x_clipboard):
+    x_clipboard.fill_clipboard("Grüße")
+    fake_display = x_clipboard._display
+    editor = request(x_clipboard, EDITOR_WINDOW, "CLIPBOARD", "UTF8_STRING")
+    assert_that(get_notified_property(x_clipboard), is_(equal_to(fake_display.get_atom("PASTE"))))
+    assert_that(editor.properties[fake_display.get_atom("PASTE")].value, is_(equal_to("Grüße".encode("utf-8"))))
+    assert_that(x_clipboard.requests, contains_exactly(False))
+
+    # Reading the own content does not ask the X server
+    assert_that(x_clipboard.get_clipboard(), is_(equal_to("Grüße")))
+    assert_that(fake_display.sent, has_length(1))
+
+
+def test_requests_of_other_applications_are_not_reported(x_clipboard):
+    x_clipboard.fill_clipboard("text")
+    x_clipboard.fill_selection("selected")
+    manager = request(x_clipboard, CLIPBOARD_MANAGER_WINDOW, "CLIPBOARD", "STRING")
+    assert_that(manager.properties, has_length(1))
+    request(x_clipboard, CLIPBOARD_MANAGER_WINDOW, "PRIMARY", "STRING")
+    # Targets are no paste
+    request(x_clipboard, EDITOR_WINDOW, "CLIPBOARD", "TARGETS")
+    assert_that(x_clipboard.requests, is_(empty()))
+    request(x_clipboard, EDITOR_WINDOW, "PRIMARY", "STRING")
+    assert_that(x_clipboard.requests, contains_exactly(True))
+
+
+def test_lists_targets_and_refuses_others(x_clipboard):
+    fake_display = x_clipboard._display
+    request(x_clipboard, EDITOR_WINDOW, "CLIPBOARD", "UTF8_STRING")
+    assert_that(get_notified_property(x_clipboard), is_(equal_to(X.NONE)))
+
+    x_clipboard.fill_clipboard("text")
+    editor = request(x_clipboard, EDITOR_WINDOW, "CLIPBOARD", "TARGETS")
+    targets = editor.properties[fake_display.get_atom("PASTE")].value
+    assert_that(targets, has_items(*(fake_display.get_atom(target) for target in (
+        "TARGETS", "TIMESTAMP", "UTF8_STRING", "STRING", "text/plain", "text/plain;charset=utf-8"))))
+    request(x_clipboard, EDITOR_WINDOW, "CLIPBOARD", "image/png")
+    assert_that(get_notified_property(x_clipboard), is_(equal_to(X.NONE)))
+    # Requests from before the clipboard was acquired are refused
+    request(x_clipboard, EDITOR_WINDOW, "CLIPBOARD", "STRING", time=1)
+    assert_that(get_notified_property(x_clipboard), is_(equal_to(X.NONE)))
+
+
+def test_large_content_is_transferred_incrementally(x_clipboard):
+    fake_display = x_clipboard._display
+    paste = fake_display.get_atom("PASTE")
+    with patch.object(x_clipboard, "_chunk_size", 4):
+        x_clipboard.fill_clipboard("0123456789")
+        editor = request(x_clipboard, EDITOR_WINDOW, "CLIPBOARD", "UTF8_STRING")
+        assert_that(editor.properties[paste].property_type, is_(equal_to(fake_display.get_atom("INCR"))))
+        assert_that(editor.properties[paste].value, contains_exactly(10))
+        assert_that(editor.event_mask, is_(equal_to(X.PropertyChangeMask)))
+        received = []
+        for _ in range(4):
+            # The requestor deletes the property to ask for the next chunk
+            editor.delete_property(paste)
+            delete_event = types.SimpleNamespace(
+                type=X.PropertyNotify, window=editor, atom=paste, state=X.PropertyDelete)
+            x_clipboard._call(x_clipboard._handle_event, delete_event)
+            received.append(editor.properties[paste].value)
+    assert_that(received, contains_exactly(b"0123", b"4567", b"89", b""))
+    assert_that(x_clipboard._transfers, is_(empty()))
+    assert_that(editor.event_mask, is_(equal_to(X.NoEventMask)))
+
+
+def test_reads_selection_of_other_applications(x_clipboard):
+    assert_that(x_clipboard.get_selection(), is_(equal_to("Grüße")))